@@ -2,11 +2,12 @@
 Base Agent class for the SERFOR multi-agent system
 """
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Iterable
 from instantneo import InstantNeo, SkillManager
 from dotenv import load_dotenv
 import os
 from utils.logger import get_logger
+from .prompt_compiler import PromptCompiler, PromptSection, count_static_tokens, count_tokens
 
 load_dotenv()
 
@@ -26,37 +27,52 @@ class BaseAgent(ABC):
         self.name = name
         self.role_setup = role_setup
         self.logger = get_logger()
+        self.prompt_compiler = PromptCompiler(stage=name.lower())
 
         # Initialize InstantNeo agent
-        self.agent = InstantNeo(
-            provider=provider,
-            api_key=os.getenv("OPENAI_API_KEY"),
-            model=model,
-            temperature=temperature,
-            role_setup=role_setup,
-            skills=skills,
-            max_tokens=max_token
-        )
+        self._agent_options = {
+            "provider": provider,
+            "api_key": os.getenv("OPENAI_API_KEY"),
+            "model": model,
+            "temperature": temperature,
+            "role_setup": role_setup,
+            "skills": skills,
+            "max_tokens": max_token
+        }
+        self.agent = self._new_agent()
+
+    def _new_agent(self) -> InstantNeo:
+        """A new InstantNeo instance with this agent's configuration"""
+        return InstantNeo(**self._agent_options)
 
     @abstractmethod
     def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """Process input and return structured output"""
         pass
 
+    def compile_prompt(self, sections: Iterable[PromptSection]) -> str:
+        """Assemble prompt sections within this agent's token budget"""
+        return self.prompt_compiler.compile(sections, system_prompt=self.role_setup).text
+
     def run(self, prompt: str, **kwargs) -> str:
         """Direct interface to the underlying InstantNeo agent with logging"""
         # Log agent start with prompts
-        self.logger.log_agent_start(self.name, self.role_setup, prompt)
+        started_at = self.logger.log_agent_start(self.name, self.role_setup, prompt)
+        self.logger.log_prompt_size(self.name, count_static_tokens(self.role_setup), count_tokens(prompt))
 
         try:
-            response = self.agent.run(prompt, **kwargs)
+            response = self._run_agent(prompt, **kwargs)
             # Log agent end with response
-            self.logger.log_agent_end(self.name, response)
+            self.logger.log_agent_end(self.name, response, started_at=started_at)
             return response
         except Exception as e:
-            self.logger.log_agent_end(self.name, "", error=str(e))
+            self.logger.log_agent_end(self.name, "", error=str(e), started_at=started_at)
             raise
 
+    def _run_agent(self, prompt: str, **kwargs) -> str:
+        """Send the prompt to the InstantNeo agent"""
+        return self.agent.run(prompt, **kwargs)
+
     def get_info(self) -> Dict[str, str]:
         """Return agent information"""
         return {
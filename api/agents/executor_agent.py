@@ -1,15 +1,37 @@
 """
 Executor Agent - Executes database queries and data operations
 """
+from dataclasses import dataclass, field
 from typing import Dict, Any, Optional, List
 from .base_agent import BaseAgent
 from .task_manager import TaskManager, ExecutionTask, TaskStatus
-from .prompts.executor_prompt import ROLE_SETUP, TASK_PROMPT_BASE, TASK_PROMPTS
-from .utils import format_schema_for_prompt
-from instantneo import SkillManager
-import time
+from .prompts.executor_prompt import ROLE_SETUP, TASK_PROMPT_BASE, TASK_PROMPTS, RETRY_PROMPT, RETRY_HINTS, DOMAIN_TOPICS
+from .prompts.domain_knowledge import select_fragments
+from .prompt_compiler import PromptSection, knowledge_section
+from .utils import format_schema_for_prompt, extract_views_from_sql
+from database.results import QueryResult, ErrorClass
+from database.timeouts import statement_timeout
+from database.result_store import active_result_store
+from instantneo import InstantNeo, SkillManager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import contextvars
+import os
+import re
+import threading
 from utils.logger import get_logger
 
+# Queries with JOINs go through the complex-query skill, as the task prompt instructs the LLM
+_JOIN_PATTERN = re.compile(r'\bJOIN\b', re.IGNORECASE)
+
+
+@dataclass
+class RequestContext:
+    """Schema and entities of the request a task belongs to (passed down, never kept on the shared agent)"""
+    schema_info: Dict[str, Any] = field(default_factory=dict)
+    schema_details: str = ""
+    entities: List[str] = field(default_factory=list)
+
+
 class ExecutorAgent(BaseAgent):
     """Agent that executes database operations using specialized skills with task management"""
 
@@ -42,6 +64,26 @@ class ExecutorAgent(BaseAgent):
             skills=skills
         )
 
+        # How many independent tasks may run at the same time
+        self.max_parallel_tasks = max(1, int(os.getenv("EXECUTOR_MAX_PARALLEL_TASKS", "4")))
+
+        # InstantNeo keeps per-run state (e.g. async_execution), so concurrent
+        # tasks each borrow their own instance; at most one per running task
+        self._idle_agents: List[InstantNeo] = [self.agent]
+        self._agents_lock = threading.Lock()
+
+    def _run_agent(self, prompt: str, **kwargs) -> str:
+        """Run the prompt on an InstantNeo instance no other task is using"""
+        with self._agents_lock:
+            agent = self._idle_agents.pop() if self._idle_agents else None
+        if agent is None:
+            agent = self._new_agent()
+        try:
+            return agent.run(prompt, **kwargs)
+        finally:
+            with self._agents_lock:
+                self._idle_agents.append(agent)
+
     def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Execute tasks using the task manager
@@ -56,8 +98,12 @@ class ExecutorAgent(BaseAgent):
         user_query = input_data.get("user_query", "")
         schema_info = input_data.get("schema_info", {})
 
-        # Store formatted schema for use in task prompts
-        self.schema_details = format_schema_for_prompt(schema_info)
+        # Schema and request entities for the task prompts of this request
+        context = RequestContext(
+            schema_info=schema_info,
+            schema_details=format_schema_for_prompt(schema_info),
+            entities=input_data.get("entities", [])
+        )
 
         if not task_manager:
             return {
@@ -66,88 +112,134 @@ class ExecutorAgent(BaseAgent):
                 "agent": self.name
             }
 
-        # Execute tasks loop
-        execution_results = []
-        max_iterations = 50  # Prevent infinite loops
-
-        for iteration in range(max_iterations):
-            # Get next executable task
-            current_task = task_manager.get_next_executable_task()
-
-            if not current_task:
-                # No more tasks to execute
-                break
-
-            print(f"🔄 Ejecutando tarea {iteration + 1}: {current_task.description}")
+        # Execute tasks as their dependencies complete, independent ones concurrently
+        with statement_timeout("executor"):
+            execution_results = self._run_task_graph(task_manager, context)
 
-            # Execute the task
-            result = self.execute_single_task(current_task)
-            execution_results.append(result)
-
-            # Check if execution is complete
-            if task_manager.is_execution_complete():
-                break
-
-            # Small delay to prevent overwhelming the system
-            time.sleep(0.1)
+        # Note: Recovery is now handled automatically via retry context in generate_task_prompt
 
-        # Get final summary
         execution_summary = task_manager.get_execution_summary()
-
-        # Note: Recovery is now handled automatically via retry context in generate_task_prompt
+        store = active_result_store()
+        if store:
+            # Queries run vs. answered from an identical / wider query of this request
+            execution_summary["sql_reuse"] = store.queries.get_stats()
 
         return {
             "status": "executed",
             "user_query": user_query,
             "execution_results": execution_results,
-            "execution_summary": task_manager.get_execution_summary(),
+            "execution_summary": execution_summary,
             "task_manager_state": task_manager.to_dict(),
             "agent": self.name
         }
 
-    def execute_single_task(self, task: ExecutionTask) -> Dict[str, Any]:
+    def _run_task_graph(self, task_manager: TaskManager, request: RequestContext) -> List[Dict[str, Any]]:
+        """
+        Run every executable task, up to max_parallel_tasks at a time.
+
+        A task is submitted as soon as the task manager reports it ready, so
+        independent queries (e.g. one per view) overlap their LLM and SQL
+        latency; each LLM call gets its own InstantNeo instance (see
+        _run_agent). Results are returned in plan order.
+        """
+        max_attempts = 50  # Prevent infinite loops
+        execution_results = []
+        submitted = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel_tasks, thread_name_prefix="executor") as pool:
+            running = {}
+            while True:
+                while len(running) < self.max_parallel_tasks and submitted < max_attempts:
+                    current_task = task_manager.get_next_executable_task()
+                    if not current_task:
+                        break
+                    submitted += 1
+                    print(f"🔄 Ejecutando tarea {submitted}: {current_task.description}")
+                    # Mark in progress before handing it to a worker
+                    current_task.start_execution()
+                    # Workers see the request's context (e.g. its result store)
+                    context = contextvars.copy_context()
+                    running[pool.submit(context.run, self.execute_single_task, current_task, request)] = current_task
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.pop(future)
+                    execution_results.append(future.result())
+
+        # Plan order (stable, so retries stay after the attempt they follow)
+        plan_order = {task.id: index for index, task in enumerate(task_manager.tasks)}
+        execution_results.sort(key=lambda result: plan_order.get(result.get("task_id"), len(plan_order)))
+        return execution_results
+
+    def execute_single_task(self, task: ExecutionTask, request: Optional[RequestContext] = None) -> Dict[str, Any]:
         """
         Execute a single task
 
         Args:
             task: The task to execute
+            request: Schema and entities of the task's request
 
         Returns:
             Dictionary with task execution result
         """
-        task.start_execution()
+        if task.status != TaskStatus.IN_PROGRESS:
+            task.start_execution()
 
         try:
-            # Generate execution prompt based on task type
-            prompt = self.generate_task_prompt(task)
-
-            # Execute using the agent
-            response = self.run(prompt)
-
-            # Check if the response indicates an error
-            if self._is_error_response(response):
-                error_message = f"Task execution failed: {response}"
-                task.complete_failure(error_message)
+            if self._can_execute_directly(task):
+                # The planner already wrote the SQL: run it without an LLM round trip
+                response = self._execute_query_directly(task.parameters["query"])
+            else:
+                # Generate execution prompt based on task type
+                prompt = self.generate_task_prompt(task, request)
+
+                # Execute using the agent
+                response = self.run(prompt)
+
+            query_result = QueryResult.coerce(response)
+            if query_result is None and task.action_type == "query":
+                # The LLM answered in text instead of running the query
+                query_result = QueryResult.failure(
+                    f"No se ejecutó la consulta: {str(response)[:300]}",
+                    ErrorClass.NO_RESULT
+                )
+
+            if query_result is not None and not query_result.success:
+                error_message = f"[{query_result.error_class.value}] {query_result.error}"
+                if query_result.query_attempted:
+                    error_message += f"\nQuery: {query_result.query_attempted}"
+                if query_result.max_retries is not None:
+                    task.max_retries = min(task.max_retries, query_result.max_retries)
+                task.complete_failure(
+                    error_message,
+                    retryable=query_result.retryable,
+                    error_class=query_result.error_class.value
+                )
                 print(f"❌ Tarea fallida: {task.description} - {error_message}")
-                
+
                 return {
                     "task_id": task.id,
                     "status": "failed",
                     "description": task.description,
                     "error": error_message,
-                    "response": response,
+                    "error_class": query_result.error_class.value,
+                    "response": query_result,
                     "retry_count": task.retry_count
                 }
 
             # Mark task as completed successfully
-            task.complete_success(response)
+            result = query_result if query_result is not None else response
+            task.complete_success(result)
             print(f"✅ Tarea completada: {task.description}")
 
             return {
                 "task_id": task.id,
                 "status": "success",
                 "description": task.description,
-                "result": response,
+                "result": result,
                 "execution_time": (task.completed_at - task.started_at).total_seconds() if task.completed_at and task.started_at else 0
             }
 
@@ -164,60 +256,82 @@ class ExecutorAgent(BaseAgent):
                 "retry_count": task.retry_count
             }
 
-    def _is_error_response(self, response: str) -> bool:
-        """Check if the response indicates an error"""
-        error_indicators = [
-            "error",
-            "Error",
-            "ERROR",
-            "failed",
-            "Failed",
-            "FAILED",
-            "exception",
-            "Exception",
-            "not JSON serializable",
-            "query validation failed",
-            "connection failed",
-            "no se puede",
-            "no se pudo",
-            "falló",
-            "fallo"
-        ]
+    def _can_execute_directly(self, task: ExecutionTask) -> bool:
+        """
+        First attempts of query tasks with SQL run directly; retries after a SQL
+        error and other action types still go through the LLM.
+        """
+        query = task.parameters.get("query")
+        return (
+            task.action_type == "query"
+            and task.retry_count == 0
+            and isinstance(query, str)
+            and bool(query.strip())
+        )
+
+    def _execute_query_directly(self, query: str) -> QueryResult:
+        """Run the planner's SQL with the same skill the LLM would have called"""
+        from database.skills import execute_select_query, execute_complex_query
 
-        return any(indicator in response for indicator in error_indicators)
+        self.logger.log_agent_activity("executor", "direct_query_execution")
+        if _JOIN_PATTERN.search(query):
+            return execute_complex_query(query)
+        return execute_select_query(query)
 
-    def generate_task_prompt(self, task: ExecutionTask) -> str:
+    def generate_task_prompt(self, task: ExecutionTask, request: Optional[RequestContext] = None) -> str:
         """Generate appropriate prompt for task execution with schema context"""
-        # Include schema in prompt
-        schema_context = getattr(self, 'schema_details', '')
-
-        base_prompt = TASK_PROMPT_BASE.format(
-            description=task.description,
-            action_type=task.action_type,
-            parameters=task.parameters,
-            schema_details=schema_context
+        request = request or RequestContext()
+        # Views this task touches: their columns and business rules (fall back to the whole schema / request entities)
+        task_views = extract_views_from_sql(task.parameters.get("query", ""))
+        if task_views:
+            schema_context = format_schema_for_prompt(request.schema_info, task_views)
+        else:
+            schema_context = request.schema_details
+
+        fragments = select_fragments(
+            task_views or request.entities,
+            DOMAIN_TOPICS
         )
 
+        sections = [
+            PromptSection(
+                "task",
+                TASK_PROMPT_BASE.format(
+                    description=task.description,
+                    action_type=task.action_type,
+                    parameters=task.parameters
+                ),
+                required=True
+            ),
+            PromptSection("schema", schema_context, priority=95, static=True),
+            knowledge_section("domain_knowledge", fragments)
+        ]
+
         # Add retry context if this is not the first attempt
         if task.retry_count > 0:
-            base_prompt += f"""
-⚠️ INTENTO #{task.retry_count + 1} - ERROR ANTERIOR:
-{task.error_message}
-
-Usa SOLO las columnas que existen en el schema de arriba.
-"""
+            sections.append(PromptSection(
+                "retry_context",
+                RETRY_PROMPT.format(
+                    attempt=task.retry_count + 1,
+                    error_message=task.error_message,
+                    hint=RETRY_HINTS.get(task.error_class, RETRY_HINTS["default"])
+                ),
+                required=True
+            ))
 
         # Get action-specific prompt or default
         action_suffix = TASK_PROMPTS.get(task.action_type, TASK_PROMPTS["default"])
+        sections.append(PromptSection("action", action_suffix, required=True, static=True))
 
-        return base_prompt + "\n" + action_suffix
+        return self.compile_prompt(sections)
 
-    def attempt_recovery(self, task_manager: TaskManager) -> List[Dict[str, Any]]:
+    def attempt_recovery(self, task_manager: TaskManager, request: Optional[RequestContext] = None) -> List[Dict[str, Any]]:
         """
         Attempt to recover from failed tasks
 
         Args:
             task_manager: The task manager with failed tasks
+            request: Schema and entities of the request
 
         Returns:
             List of recovery execution results
@@ -234,7 +348,7 @@ Usa SOLO las columnas que existen en el schema de arriba.
             task_manager.add_task(recovery_task)
 
             # Execute recovery task
-            result = self.execute_single_task(recovery_task)
+            result = self.execute_single_task(recovery_task, request)
             recovery_results.append(result)
 
         return recovery_results
\ No newline at end of file
@@ -0,0 +1,341 @@
+"""
+Few-Shot Index - Local BM25 index of past successful question → plan pairs
+"""
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from database.results import QueryResult
+
+# Palabras vacías: no ayudan a distinguir consultas entre sí
+STOPWORDS = frozenset({
+    "a", "al", "con", "cual", "cuales", "cuando", "cuanto", "cuantos", "cuanta", "cuantas",
+    "de", "del", "donde", "el", "en", "es", "esta", "este", "estos", "hay", "la", "las",
+    "lo", "los", "me", "mi", "mis", "muestra", "muestrame", "o", "para", "por", "que",
+    "quien", "quienes", "se", "sin", "son", "su", "sus", "tiene", "tienen", "todo", "todos",
+    "un", "una", "uno", "unos", "y", "dame", "dime", "lista", "listar", "sobre"
+})
+
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Normalize a question into index terms: lowercase, no accents, no
+    stopwords and a light plural stemming (plantaciones → plantacion).
+    """
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+
+    terms = []
+    for word in _WORD_PATTERN.findall(text):
+        if word in STOPWORDS or (len(word) < 2 and not word.isdigit()):
+            continue
+        if len(word) > 5 and word.endswith("es"):
+            word = word[:-2]
+        elif len(word) > 4 and word.endswith("s"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def normalize_question(question: str) -> str:
+    """Key used to deduplicate examples of the same question"""
+    return " ".join(tokenize(question))
+
+
+@dataclass
+class FewShotExample:
+    """A question whose plan executed successfully"""
+    question: str
+    steps: List[Dict[str, Any]]
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    def render(self) -> str:
+        """Render the example as it is shown to the planner"""
+        plan = json.dumps({"steps": self.steps}, ensure_ascii=False)
+        return f"Pregunta: {self.question}\nPlan: {plan}"
+
+
+class _Postings:
+    """Doc ids and term frequencies of one term, in NumPy arrays grown by doubling"""
+
+    __slots__ = ("ids", "freqs", "size")
+
+    def __init__(self):
+        self.ids = np.empty(4, dtype=np.intp)
+        self.freqs = np.empty(4, dtype=np.float32)
+        self.size = 0
+
+    def append(self, doc_id: int, freq: int):
+        if self.size == len(self.ids):
+            self.ids = np.resize(self.ids, 2 * self.size)
+            self.freqs = np.resize(self.freqs, 2 * self.size)
+        self.ids[self.size] = doc_id
+        self.freqs[self.size] = freq
+        self.size += 1
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.ids[:self.size], self.freqs[:self.size]
+
+
+class FewShotIndex:
+    """
+    In-memory BM25 index over past questions, persisted as JSONL.
+
+    Postings are stored per term as NumPy arrays of (doc ids, term
+    frequencies) and document lengths in one array, so a lookup scores the
+    postings of the query terms vectorized with the current average length;
+    nothing is precomputed that an insert could invalidate (1-3 ms with
+    100k examples, see tests/test_few_shot_index.py).
+
+    The file is shared by every worker: each lookup reads what other
+    workers appended since the last one (or everything again if the file was
+    replaced), and the file is rewritten without repeated questions on load
+    and whenever they outnumber the distinct ones. An example appended by
+    another worker while the file is being rewritten can be lost; it is
+    stored again the next time that question succeeds.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path or os.getenv("FEW_SHOT_INDEX_PATH", "database/few_shot_examples.jsonl")
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._reset()
+        self._sync()
+
+    def __len__(self) -> int:
+        return len(self.examples)
+
+    def add(self, question: str, steps: List[Dict[str, Any]], persist: bool = True) -> Optional[FewShotExample]:
+        """
+        Store a successful question → plan pair.
+
+        A question already in the index (same normalized terms) keeps its
+        slot and takes the latest plan.
+
+        Returns:
+            The stored example, or None if the question has no index terms
+        """
+        example = FewShotExample(question=question, steps=steps)
+        with self._lock:
+            if persist:
+                self._sync()
+            if not self._insert(example):
+                return None
+            if persist:
+                self._append(example)
+        return example
+
+    def search(self, question: str, k: int = 3) -> List[Tuple[FewShotExample, float]]:
+        """
+        Return the k stored examples most similar to the question.
+
+        Args:
+            question: User question
+            k: Number of examples to return
+
+        Returns:
+            List of (example, BM25 score) sorted by descending score
+        """
+        terms = set(tokenize(question))
+        with self._lock:
+            self._sync()
+            total_docs = len(self.examples)
+            if not terms or not total_docs or k <= 0:
+                return []
+
+            # BM25 length normalization of every document with the current average
+            average = self._total_length / total_docs
+            norms = self.k1 * (1.0 - self.b) + (self.k1 * self.b / average) * self._lengths[:total_docs]
+            scores = np.zeros(total_docs, dtype=np.float32)
+
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                ids, freqs = postings.arrays()
+                df = len(ids)
+                idf = math.log(1.0 + (total_docs - df + 0.5) / (df + 0.5))
+                weight = idf * (self.k1 + 1.0)
+                if df * 2 > total_docs:
+                    # Common term: dense arithmetic beats gathering most of the documents
+                    dense = np.zeros(total_docs, dtype=np.float32)
+                    dense[ids] = freqs
+                    scores += weight * dense / (dense + norms)
+                else:
+                    scores[ids] += weight * freqs / (freqs + norms[ids])
+
+            k = min(k, total_docs)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.examples[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def _reset(self):
+        """Empty the index (and forget how much of the file was read)"""
+        self.examples: List[FewShotExample] = []
+        self._doc_ids: Dict[str, int] = {}
+        self._lengths = np.empty(1024, dtype=np.float32)
+        self._postings: Dict[str, _Postings] = {}
+        self._total_length = 0
+        self._file_id: Optional[Tuple[int, int]] = None
+        self._file_offset = 0
+        self._file_lines = 0
+
+    def _insert(self, example: FewShotExample) -> bool:
+        """Index an example; returns False if it has no terms"""
+        key = normalize_question(example.question)
+        if not key:
+            return False
+
+        with self._lock:
+            doc_id = self._doc_ids.get(key)
+            if doc_id is not None:
+                self.examples[doc_id] = example
+                return True
+
+            terms = key.split()
+            doc_id = len(self.examples)
+            self._doc_ids[key] = doc_id
+            self.examples.append(example)
+            if doc_id == len(self._lengths):
+                self._lengths = np.resize(self._lengths, 2 * doc_id)
+            self._lengths[doc_id] = len(terms)
+            self._total_length += len(terms)
+
+            frequencies: Dict[str, int] = {}
+            for term in terms:
+                frequencies[term] = frequencies.get(term, 0) + 1
+            for term, freq in frequencies.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = _Postings()
+                postings.append(doc_id, freq)
+            return True
+
+    def _sync(self):
+        """Read what was appended to the file since the last read, or all of it if it was replaced"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self._file_id or stat.st_size < self._file_offset:
+            loaded = self._file_id is None
+            self._reset()
+            self._file_id = file_id
+            self._read(stat.st_size)
+            # Repeated questions are only kept once
+            if loaded and self._file_lines > len(self.examples):
+                self._compact()
+        elif stat.st_size > self._file_offset:
+            self._read(stat.st_size)
+
+    def _read(self, size: int):
+        """Index the complete lines between the last read offset and size"""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._file_offset)
+                data = f.read(size - self._file_offset)
+        except OSError as e:
+            print(f"Error loading few-shot index: {e}")
+            return
+
+        # A line still being written by another worker is read next time
+        end = data.rfind(b"\n") + 1
+        self._file_offset += end
+        for line in data[:end].splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            self._file_lines += 1
+            try:
+                self._insert(FewShotExample(**json.loads(line)))
+            except Exception as e:
+                print(f"Error loading few-shot example: {e}")
+
+    def _append(self, example: FewShotExample):
+        """Persist an example at the end of the index file"""
+        data = (json.dumps(asdict(example), ensure_ascii=False) + "\n").encode("utf-8")
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'ab') as f:
+                f.write(data)
+            stat = os.stat(self.path)
+        except Exception as e:
+            print(f"Error saving few-shot example: {e}")
+            return
+
+        # Skip our own line on the next read unless another worker wrote in between
+        if self._file_id is None:
+            self._file_id = (stat.st_dev, stat.st_ino)
+        if (stat.st_dev, stat.st_ino) == self._file_id and stat.st_size == self._file_offset + len(data):
+            self._file_offset = stat.st_size
+            self._file_lines += 1
+            if self._file_lines >= 2 * len(self.examples):
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the file with one line per question"""
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for example in self.examples:
+                    f.write(json.dumps(asdict(example), ensure_ascii=False) + "\n")
+            os.replace(temp_path, self.path)
+            stat = os.stat(self.path)
+        except Exception as e:
+            print(f"Error compacting few-shot index: {e}")
+            return
+
+        self._file_id = (stat.st_dev, stat.st_ino)
+        self._file_offset = stat.st_size
+        self._file_lines = len(self.examples)
+
+
+def steps_from_task_manager(task_manager) -> List[Dict[str, Any]]:
+    """
+    Rebuild the plan steps (planner JSON format) from executed tasks.
+
+    Only the SQL is kept from the parameters, so examples stay short. It is
+    the SQL that ran (QueryResult.query_executed), which differs from the
+    planner's when a local repair or an LLM retry rewrote it.
+    """
+    step_ids = {task.id: index for index, task in enumerate(task_manager.tasks, start=1)}
+    steps = []
+    for task in task_manager.tasks:
+        step = {
+            "step_id": step_ids[task.id],
+            "action_type": task.action_type,
+            "description": task.description,
+            "dependencies": [step_ids[dep] for dep in task.dependencies if dep in step_ids]
+        }
+        query = task.result.query_executed if isinstance(task.result, QueryResult) else None
+        query = query or task.parameters.get("query")
+        if query:
+            step["parameters"] = {"query": query}
+        steps.append(step)
+    return steps
+
+
+# Global index instance
+_global_index = None
+
+def get_few_shot_index() -> FewShotIndex:
+    """Get global few-shot index instance"""
+    global _global_index
+    if _global_index is None:
+        _global_index = FewShotIndex()
+    return _global_index
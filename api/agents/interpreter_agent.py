@@ -5,6 +5,7 @@ from typing import Dict, Any
 import json
 import re
 from .base_agent import BaseAgent
+from .prompt_compiler import PromptSection
 from .prompts.interpreter_prompt import ROLE_SETUP, INTERPRETATION_PROMPT_TEMPLATE
 
 
@@ -59,9 +60,13 @@ class InterpreterAgent(BaseAgent):
         """
         user_query = input_data.get("user_query", "")
 
-        prompt = INTERPRETATION_PROMPT_TEMPLATE.format(
-            user_query=user_query
-        )
+        prompt = self.compile_prompt([
+            PromptSection(
+                "query",
+                INTERPRETATION_PROMPT_TEMPLATE.format(user_query=user_query),
+                required=True
+            )
+        ])
 
         response = self.run(prompt)
 
@@ -2,13 +2,18 @@
 Orchestrator - Coordinates the multi-agent system workflow
 """
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from .interpreter_agent import InterpreterAgent
 from .planner_agent import PlannerAgent
 from .executor_agent import ExecutorAgent
 from .response_agent import ResponseAgent
 from .visualization_agent import VisualizationAgent
+from .task_manager import TaskStatus
+from .few_shot_index import get_few_shot_index, steps_from_task_manager
 from database.schema_mapper import DynamicSchemaMapper
+from database.columnar import ColumnarResult
+from database.results import QueryResult
+from database.result_store import current_result_store
 from utils.logger import get_logger
 from utils.debug_serializer import debug_workflow_data
 
@@ -98,6 +103,10 @@ class AgentOrchestrator:
         # Log user query
         self.logger.log_user_query(user_query)
 
+        # Rows of this query's results are kept out of the agents' messages, in
+        # the caller's result store (the executor's task threads share it)
+        current_result_store()
+
         workflow_data = {
             "user_query": user_query,
             "schema_info": self.schema_info  # Include schema in all steps
@@ -171,6 +180,9 @@ class AgentOrchestrator:
             self.logger.log_agent_activity("executor", "process_completed", workflow_data, execution_result)
             workflow_data.update(execution_result)
 
+            # Remember plans that ran cleanly as few-shot examples for the planner
+            self._record_successful_plan(user_query, task_manager)
+
             # Show execution summary
             exec_summary = execution_result.get("execution_summary", {})
             if exec_summary:
@@ -192,20 +204,20 @@ class AgentOrchestrator:
 
             structured_results = []
             for i, result in enumerate(execution_results):
-                if result.get("status") == "success" and isinstance(result.get("result"), str):
+                if result.get("status") == "success":
                     try:
-                        parsed_result = json.loads(result["result"])
-                        if parsed_result.get("success") and "data" in parsed_result:
-                            data = parsed_result["data"]
-                            if isinstance(data, list) and len(data) > 0:
+                        query_result = QueryResult.coerce(result.get("result"))
+                        if query_result and query_result.success:
+                            table = query_result.table
+                            if table.row_count > 0:
                                 structured_results.append({
                                     "description": result.get("description", result.get("task_description", f"Query {i+1}")),
-                                    "data": data,
-                                    "row_count": len(data),
-                                    "columns": list(data[0].keys()) if data else [],
+                                    "table": table,
+                                    "row_count": table.row_count,
+                                    "columns": table.columns,
                                     "is_primary": False
                                 })
-                                print(f"   📊 Dataset {i+1}: '{structured_results[-1]['description']}' - {len(data)} filas")
+                                print(f"   📊 Dataset {i+1}: '{structured_results[-1]['description']}' - {table.row_count} filas")
                     except:
                         continue
 
@@ -215,8 +227,8 @@ class AgentOrchestrator:
                 print(f"   📊 Dataset primario: '{structured_results[-1]['description']}'")
 
             # Evaluate if visualization makes sense (use primary dataset for heuristics)
-            primary_data = structured_results[-1]["data"] if structured_results else []
-            should_visualize = self._should_generate_visualization(primary_data, user_query)
+            primary_table = structured_results[-1]["table"] if structured_results else None
+            should_visualize = self._should_generate_visualization(primary_table, user_query)
 
             if should_visualize:
                 print("📊 Generando visualizaciones...")
@@ -278,6 +290,21 @@ class AgentOrchestrator:
                 "error": str(e)
             }
 
+    def _record_successful_plan(self, user_query: str, task_manager) -> None:
+        """Store the plan in the few-shot index if every task completed and at least one ran SQL"""
+        if not task_manager or not task_manager.tasks:
+            return
+        if any(task.status != TaskStatus.COMPLETED for task in task_manager.tasks):
+            return
+
+        try:
+            steps = steps_from_task_manager(task_manager)
+            if not any("parameters" in step for step in steps):
+                return
+            get_few_shot_index().add(user_query, steps)
+        except Exception as e:
+            self.logger.log_error("few_shot_index", f"Could not store example: {str(e)}")
+
     def _get_rejection_message(self, reason: str) -> str:
         """
         Generate user-friendly rejection message.
@@ -289,7 +316,7 @@ class AgentOrchestrator:
             "'¿Cuáles son las plantaciones registradas en Cusco?'"
         )
 
-    def _should_generate_visualization(self, query_results: list, user_query: str) -> bool:
+    def _should_generate_visualization(self, table: Optional[ColumnarResult], user_query: str) -> bool:
         """
         Heuristics to determine if visualization would add value.
 
@@ -298,11 +325,11 @@ class AgentOrchestrator:
         - Very few rows with few columns
         - Simple list queries without comparable dimensions
         """
-        if not query_results or len(query_results) == 0:
+        if table is None or table.row_count == 0:
             return False
 
-        num_rows = len(query_results)
-        num_cols = len(query_results[0]) if query_results else 0
+        num_rows = table.row_count
+        num_cols = len(table.columns)
 
         # Case 1: Single row = single value result (e.g., "total: 523")
         if num_rows == 1:
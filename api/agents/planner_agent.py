@@ -4,16 +4,30 @@ Planner Agent - Creates execution plans based on interpreted requests
 from typing import Dict, Any, List
 from .base_agent import BaseAgent
 from .task_manager import TaskManager, ExecutionTask
-from .prompts.planner_prompt import ROLE_SETUP, PLANNING_PROMPT_TEMPLATE
+from .prompts.planner_prompt import (
+    ROLE_SETUP,
+    PLANNING_PROMPT_TEMPLATE,
+    PLANNING_SQL_GUIDELINES,
+    PLANNING_STRATEGIES,
+    PLANNING_STATIC_EXAMPLE,
+    FEW_SHOT_HEADER,
+    DOMAIN_TOPICS
+)
+from .prompts.domain_knowledge import select_fragments
+from .prompt_compiler import PromptSection, knowledge_section
+from .few_shot_index import get_few_shot_index
 from .utils import format_schema_for_prompt
 from utils.logger import get_logger
 import json
+import os
 
 class PlannerAgent(BaseAgent):
     """Agent that creates step-by-step execution plans with task management"""
 
     def __init__(self):
         self.logger = get_logger()
+        self.few_shot_index = get_few_shot_index()
+        self.few_shot_k = int(os.getenv("FEW_SHOT_K", "3"))
         super().__init__(
             name="Planner",
             model="gpt-4.1",
@@ -35,15 +49,34 @@ class PlannerAgent(BaseAgent):
         interpretation = input_data.get("interpretation", "")
         user_query = input_data.get("user_query", "")
         schema_info = input_data.get("schema_info", {})
+        entities = input_data.get("entities", [])
 
         # Format schema using shared utility
         schema_details = format_schema_for_prompt(schema_info)
 
-        prompt = PLANNING_PROMPT_TEMPLATE.format(
-            user_query=user_query,
-            interpretation=interpretation,
-            schema_details=schema_details
-        )
+        # Past successful plans for similar questions replace the static example
+        examples = self.few_shot_index.search(user_query, self.few_shot_k)
+        if examples:
+            self.logger.log_agent_activity(
+                "planner",
+                "few_shot_examples",
+                None,
+                {"count": len(examples), "scores": [round(score, 2) for _, score in examples]}
+            )
+
+        prompt = self.compile_prompt([
+            PromptSection(
+                "request",
+                PLANNING_PROMPT_TEMPLATE.format(user_query=user_query, interpretation=interpretation),
+                required=True
+            ),
+            PromptSection("schema", schema_details, priority=95, static=True),
+            PromptSection("sql_guidelines", PLANNING_SQL_GUIDELINES, priority=90, static=True),
+            # Only the business rules of the views involved in this query
+            knowledge_section("domain_knowledge", select_fragments(entities, DOMAIN_TOPICS)),
+            PromptSection("strategies", PLANNING_STRATEGIES, required=True, static=True),
+            self._examples_section(examples)
+        ])
 
         response = self.run(prompt)
 
@@ -62,6 +95,21 @@ class PlannerAgent(BaseAgent):
             "agent": self.name
         }
 
+    def _examples_section(self, examples) -> PromptSection:
+        """Few-shot section; shrinks by dropping the least similar example"""
+        if not examples:
+            return PromptSection("examples", PLANNING_STATIC_EXAMPLE, required=True, static=True)
+
+        def _shrink(section: PromptSection):
+            return self._examples_section(examples[:-1]) if len(examples) > 1 else None
+
+        return PromptSection(
+            "examples",
+            FEW_SHOT_HEADER + "\n\n".join(example.render() for example, _ in examples),
+            priority=92,
+            shrink=_shrink
+        )
+
     def create_task_manager_from_plan(self, plan_json: str) -> TaskManager:
         """
         Create a TaskManager from the planner's JSON output
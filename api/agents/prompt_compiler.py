@@ -0,0 +1,202 @@
+"""
+Prompt Compiler - Builds agent prompts from prioritized sections within per-stage token budgets
+"""
+import os
+import re
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .prompts.domain_knowledge import KnowledgeFragment, render_fragments
+from utils.logger import get_logger
+
+# Presupuesto por defecto (tokens estimados) del prompt completo de cada etapa,
+# system prompt incluido. Se puede sobrescribir con PROMPT_BUDGET_<ETAPA>.
+DEFAULT_STAGE_BUDGETS: Dict[str, int] = {
+    "interpreter": 4000,
+    "planner": 9000,
+    "executor": 6000,
+    "response": 10000,
+    "visualization": 5000,
+}
+
+# Palabras, números y signos sueltos; aproximación local a un tokenizador BPE
+_TOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|_+", re.UNICODE)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text without calling any tokenizer service.
+
+    Words count as one token per ~4 characters, numbers per ~3 digits and each
+    punctuation sign as one token. It slightly overestimates BPE counts for
+    Spanish text, which is the safe side for budgets.
+    """
+    if not text:
+        return 0
+
+    total = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        if piece.isdigit():
+            total += (len(piece) + 2) // 3
+        else:
+            total += (len(piece) + 3) // 4
+    return total
+
+
+@lru_cache(maxsize=128)
+def count_static_tokens(text: str) -> int:
+    """
+    count_tokens memoized, for texts that repeat verbatim across requests
+    (system prompts, fixed sections, the rendered schema). Full prompts are
+    different every time and are counted with count_tokens.
+    """
+    return count_tokens(text)
+
+
+@dataclass
+class PromptSection:
+    """A piece of a prompt with its trimming policy"""
+    name: str
+    text: str
+    priority: int = 50  # Higher = more important, trimmed last
+    required: bool = False  # Required sections are never dropped (but may shrink)
+    shrink: Optional[Callable[["PromptSection"], Optional["PromptSection"]]] = None
+    static: bool = False  # Same text on every request: its count is memoized
+
+    @property
+    def tokens(self) -> int:
+        return count_static_tokens(self.text) if self.static else count_tokens(self.text)
+
+
+@dataclass
+class CompiledPrompt:
+    """Final prompt text with its size accounting"""
+    stage: str
+    text: str
+    tokens: int
+    system_tokens: int
+    budget: int
+    dropped: List[str] = field(default_factory=list)
+    shrunk: List[str] = field(default_factory=list)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.tokens + self.system_tokens
+
+    @property
+    def over_budget(self) -> bool:
+        return self.total_tokens > self.budget
+
+
+def get_stage_budget(stage: str) -> int:
+    """Token budget for a pipeline stage (env PROMPT_BUDGET_<STAGE> overrides the default)"""
+    env_value = os.getenv(f"PROMPT_BUDGET_{stage.upper()}")
+    if env_value:
+        try:
+            return int(env_value)
+        except ValueError:
+            pass
+    return DEFAULT_STAGE_BUDGETS.get(stage, 8000)
+
+
+def knowledge_section(name: str, fragments: Iterable[KnowledgeFragment]) -> PromptSection:
+    """
+    Build a section from domain knowledge fragments.
+
+    The section takes the priority of its least important fragment and shrinks
+    by removing that fragment, so business rules are trimmed one at a time
+    instead of all at once.
+    """
+    fragments = list(fragments)
+
+    def _shrink(section: PromptSection) -> Optional[PromptSection]:
+        if len(fragments) <= 1:
+            return None
+        weakest = min(fragments, key=lambda f: f.priority)
+        return knowledge_section(name, [f for f in fragments if f is not weakest])
+
+    return PromptSection(
+        name=name,
+        text=render_fragments(fragments),
+        priority=min((f.priority for f in fragments), default=0),
+        shrink=_shrink
+    )
+
+
+class PromptCompiler:
+    """Assembles prioritized sections into a prompt that fits the stage budget"""
+
+    def __init__(self, stage: str, budget: Optional[int] = None, separator: str = "\n"):
+        self.stage = stage
+        self.budget = budget if budget is not None else get_stage_budget(stage)
+        self.separator = separator
+        self.logger = get_logger()
+
+    def compile(self, sections: Iterable[PromptSection], system_prompt: str = "") -> CompiledPrompt:
+        """
+        Join sections in order, trimming the lowest-priority ones until the
+        prompt (plus the system prompt) fits the budget.
+
+        Args:
+            sections: Prompt sections in presentation order
+            system_prompt: Role setup sent along with the prompt (counted, never trimmed)
+
+        Returns:
+            CompiledPrompt with the final text and size accounting
+        """
+        active = [replace(section) for section in sections if section.text]
+        # Each section is measured once; shrunk versions replace their size
+        sizes = [section.tokens for section in active]
+        system_tokens = count_static_tokens(system_prompt)
+        total = system_tokens + sum(sizes)
+        exhausted = set()
+        dropped, shrunk = [], []
+
+        while total > self.budget:
+            candidates = [
+                (index, section) for index, section in enumerate(active)
+                if section.name not in exhausted and (not section.required or section.shrink)
+            ]
+            if not candidates:
+                break
+
+            # Lowest priority first; on ties, the later section goes first
+            index, victim = min(candidates, key=lambda item: (item[1].priority, -item[0]))
+
+            smaller = victim.shrink(victim) if victim.shrink else None
+            smaller_size = smaller.tokens if smaller is not None else None
+            if smaller is not None and smaller_size < sizes[index]:
+                total -= sizes[index] - smaller_size
+                active[index] = replace(smaller, required=victim.required)
+                sizes[index] = smaller_size
+                if victim.name not in shrunk:
+                    shrunk.append(victim.name)
+            elif victim.required:
+                exhausted.add(victim.name)
+            else:
+                total -= sizes[index]
+                del active[index]
+                del sizes[index]
+                dropped.append(victim.name)
+
+        compiled = CompiledPrompt(
+            stage=self.stage,
+            text=self.separator.join(section.text for section in active),
+            tokens=total - system_tokens,
+            system_tokens=system_tokens,
+            budget=self.budget,
+            dropped=dropped,
+            shrunk=shrunk
+        )
+
+        if dropped or shrunk or compiled.over_budget:
+            self.logger.log_prompt_budget(
+                self.stage,
+                compiled.total_tokens,
+                compiled.budget,
+                dropped=dropped,
+                shrunk=shrunk
+            )
+
+        return compiled
@@ -28,13 +28,19 @@ from .interpreter_prompt import (
 
 from .planner_prompt import (
     ROLE_SETUP as PLANNER_ROLE_SETUP,
-    PLANNING_PROMPT_TEMPLATE
+    PLANNING_PROMPT_TEMPLATE,
+    PLANNING_SQL_GUIDELINES,
+    PLANNING_STRATEGIES,
+    PLANNING_STATIC_EXAMPLE,
+    FEW_SHOT_HEADER
 )
 
 from .executor_prompt import (
     ROLE_SETUP as EXECUTOR_ROLE_SETUP,
     TASK_PROMPT_BASE,
-    TASK_PROMPTS
+    TASK_PROMPTS,
+    RETRY_PROMPT,
+    RETRY_HINTS
 )
 
 from .response_prompt import (
@@ -1,6 +1,8 @@
 """
 Conocimiento de dominio de SERFOR - Textos para usar en prompts
 """
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable, List, Optional, Tuple
 
 # =============================================================================
 # SINÓNIMOS - Cómo la gente pide cada entidad
@@ -60,53 +62,146 @@ V_TITULOHABILITANTE:
 """
 
 # =============================================================================
-# DESCRIPCIONES DE ENTIDADES
+# GLOSARIO
 # =============================================================================
 
-ENTITY_DESCRIPTIONS = """
-DESCRIPCIÓN DE CADA VISTA:
+GLOSSARY = """
+GLOSARIO DE TÉRMINOS:
 
+SERFOR: Servicio Nacional Forestal y de Fauna Silvestre de Perú
+ARFFS: Autoridad Regional Forestal y de Fauna Silvestre
+ATFFS: Administración Técnica Forestal y de Fauna Silvestre
+OSINFOR: Organismo de Supervisión de los Recursos Forestales
+UIT: Unidad Impositiva Tributaria (unidad para multas)
+RNI: Registro Nacional de Infractores
+RNPF: Registro Nacional de Plantaciones Forestales
+CTP: Centro de Transformación Primaria
+CUS: Cambio de Uso de Suelo
+"""
+
+# =============================================================================
+# FRAGMENTOS DE CONOCIMIENTO POR VISTA Y TEMA
+# =============================================================================
+#
+# El conocimiento de negocio se define como fragmentos etiquetados con el tema
+# al que pertenecen y las vistas a las que aplican. Así cada prompt puede
+# incluir solo lo relevante para las entidades de la consulta (ver
+# build_domain_knowledge). Un fragmento sin vistas aplica a todas.
+#
+# priority: importancia relativa (0-100). Las secciones de menor prioridad son
+# las primeras en recortarse cuando un prompt excede su presupuesto.
+
+KNOWN_VIEWS = (
+    "V_INFRACTOR",
+    "V_TITULOHABILITANTE",
+    "V_LICENCIA_CAZA",
+    "V_PLANTACION",
+    "V_AUTORIZACION_CTP",
+    "V_AUTORIZACION_DEPOSITO",
+    "V_AUTORIZACION_DESBOSQUE",
+    "V_CAMBIO_USO",
+)
+
+# Temas en el orden en que se presentan dentro de un prompt
+TOPIC_DESCRIPTIONS = "descriptions"
+TOPIC_RELATIONSHIPS = "relationships"
+TOPIC_NOTES = "notes"
+TOPIC_RULES = "rules"
+TOPIC_ESTADOS = "estados"
+TOPIC_NO_DISPONIBLES = "no_disponibles"
+
+ALL_TOPICS = (
+    TOPIC_DESCRIPTIONS,
+    TOPIC_RELATIONSHIPS,
+    TOPIC_NOTES,
+    TOPIC_RULES,
+    TOPIC_ESTADOS,
+    TOPIC_NO_DISPONIBLES,
+)
+
+_TOPIC_HEADERS = {
+    TOPIC_DESCRIPTIONS: "DESCRIPCIÓN DE CADA VISTA:",
+    TOPIC_RELATIONSHIPS: "RELACIONES ENTRE VISTAS (JOINs):",
+    TOPIC_NOTES: "NOTAS IMPORTANTES:",
+    TOPIC_RULES: "REGLAS DE NEGOCIO PARA QUERIES:",
+    TOPIC_ESTADOS: "REFERENCIA - COLUMNAS DE ESTADO POR TABLA:",
+    TOPIC_NO_DISPONIBLES: "DATOS QUE NO EXISTEN EN LA BASE DE DATOS:",
+}
+
+_CTP = "V_AUTORIZACION_CTP"
+_DEPOSITO = "V_AUTORIZACION_DEPOSITO"
+_DESBOSQUE = "V_AUTORIZACION_DESBOSQUE"
+_CAMBIO_USO = "V_CAMBIO_USO"
+_CAZA = "V_LICENCIA_CAZA"
+_PLANTACION = "V_PLANTACION"
+_INFRACTOR = "V_INFRACTOR"
+_TITULO = "V_TITULOHABILITANTE"
+
+
+@dataclass(frozen=True)
+class KnowledgeFragment:
+    """Fragmento de conocimiento de dominio etiquetado por tema y vistas"""
+    name: str
+    topic: str
+    text: str
+    views: Tuple[str, ...] = ()  # Vacío = aplica a todas las vistas
+    priority: int = 50
+
+    def applies_to(self, views: FrozenSet[str]) -> bool:
+        """Check if the fragment is relevant for the given views"""
+        return not self.views or any(view in views for view in self.views)
+
+
+KNOWLEDGE_FRAGMENTS: List[KnowledgeFragment] = [
+    # -------------------------------------------------------------------------
+    # DESCRIPCIONES DE ENTIDADES
+    # -------------------------------------------------------------------------
+    KnowledgeFragment("desc_desbosque", TOPIC_DESCRIPTIONS, """
 V_AUTORIZACION_DESBOSQUE:
   Autorización para el retiro físico de cobertura forestal. Permite actividades no forestales
-  como infraestructura, minería, hidrocarburos. NO confundir con tala o aprovechamiento forestal.
-
+  como infraestructura, minería, hidrocarburos. NO confundir con tala o aprovechamiento forestal.""",
+        views=(_DESBOSQUE,), priority=90),
+    KnowledgeFragment("desc_cambio_uso", TOPIC_DESCRIPTIONS, """
 V_CAMBIO_USO:
   Autorización para cambiar clasificación de tierra de "uso forestal" a "uso agropecuario".
-  Es PREVIO y OBLIGATORIO antes del desbosque para fines agrícolas.
-
+  Es PREVIO y OBLIGATORIO antes del desbosque para fines agrícolas.""",
+        views=(_CAMBIO_USO,), priority=90),
+    KnowledgeFragment("desc_deposito", TOPIC_DESCRIPTIONS, """
 V_AUTORIZACION_DEPOSITO:
   Autorización para lugares de acopio, depósitos y centros de comercialización
-  de productos forestales y fauna silvestre.
-
+  de productos forestales y fauna silvestre.""",
+        views=(_DEPOSITO,), priority=90),
+    KnowledgeFragment("desc_ctp", TOPIC_DESCRIPTIONS, """
 V_AUTORIZACION_CTP:
-  Autorización para Centros de Transformación Primaria (aserraderos, laminadoras, etc.)
-
+  Autorización para Centros de Transformación Primaria (aserraderos, laminadoras, etc.)""",
+        views=(_CTP,), priority=90),
+    KnowledgeFragment("desc_caza", TOPIC_DESCRIPTIONS, """
 V_LICENCIA_CAZA:
-  Licencias de caza deportiva (sin fines de lucro). Otorgadas por ARFFS.
-
+  Licencias de caza deportiva (sin fines de lucro). Otorgadas por ARFFS.""",
+        views=(_CAZA,), priority=90),
+    KnowledgeFragment("desc_plantacion", TOPIC_DESCRIPTIONS, """
 V_PLANTACION:
   Registro Nacional de Plantaciones Forestales. Incluye plantaciones de producción,
-  protección y restauración.
-
+  protección y restauración.""",
+        views=(_PLANTACION,), priority=90),
+    KnowledgeFragment("desc_infractor", TOPIC_DESCRIPTIONS, """
 V_INFRACTOR:
   Registro Nacional de Infractores con sanciones y multas.
   IMPORTANTE: Multas en UIT (usar WHERE Multa > 10 directamente).
-  NOTA: No tiene Departamento/Provincia/Distrito. Si necesitas ubicación, hacer JOIN con V_TITULOHABILITANTE.
-
+  NOTA: No tiene Departamento/Provincia/Distrito. Si necesitas ubicación, hacer JOIN con V_TITULOHABILITANTE.""",
+        views=(_INFRACTOR,), priority=90),
+    KnowledgeFragment("desc_titulo", TOPIC_DESCRIPTIONS, """
 V_TITULOHABILITANTE:
   Títulos habilitantes: permisos, concesiones, autorizaciones, cesiones, bosque local.
   Campo TipoTh: AUTORIZACIONES, BOSQUE LOCAL, CAMBIO DE USO, CONCESIONES, PERMISOS.
   Campo Situacion: VIGENTE, NO VIGENTE, EXTINGUIDO, OBSERVADO.
-  Contiene ubicación geográfica (Departamento, Provincia, Distrito).
-"""
-
-# =============================================================================
-# RELACIONES ENTRE VISTAS
-# =============================================================================
-
-VIEW_RELATIONSHIPS = """
-RELACIONES ENTRE VISTAS (JOINs):
+  Contiene ubicación geográfica (Departamento, Provincia, Distrito).""",
+        views=(_TITULO,), priority=90),
 
+    # -------------------------------------------------------------------------
+    # RELACIONES ENTRE VISTAS
+    # -------------------------------------------------------------------------
+    KnowledgeFragment("rel_general", TOPIC_RELATIONSHIPS, """
 IMPORTANTE: Solo usar JOINs cuando la consulta EXPLÍCITAMENTE requiere cruzar datos.
 Para consultas simples de una sola tabla, NO agregar JOINs.
 
@@ -118,133 +213,75 @@ Para consultas simples de una sola tabla, NO agregar JOINs.
 
 COLUMNAS DE RELACIÓN (usar con =):
   - NumeroDocumento: identificador principal para relacionar titulares entre vistas
-  - TituloHabilitante: código del título habilitante (solo V_INFRACTOR ↔ V_TITULOHABILITANTE)
-
-JOINs DISPONIBLES (todas por NumeroDocumento con =):
-
-V_INFRACTOR puede cruzarse con:
+  - TituloHabilitante: código del título habilitante (solo V_INFRACTOR ↔ V_TITULOHABILITANTE)""",
+        priority=80),
+    KnowledgeFragment("rel_infractor", TOPIC_RELATIONSHIPS, """
+V_INFRACTOR puede cruzarse con (por NumeroDocumento con =):
   - V_TITULOHABILITANTE: para obtener ubicación (Departamento, Provincia, Distrito)
   - V_PLANTACION: para encontrar plantaciones de infractores
   - V_LICENCIA_CAZA: para encontrar licencias de caza de infractores
   - V_AUTORIZACION_CTP: para encontrar CTPs de infractores
-  - V_AUTORIZACION_DEPOSITO: para encontrar depósitos de infractores
-
-V_TITULOHABILITANTE puede cruzarse con:
+  - V_AUTORIZACION_DEPOSITO: para encontrar depósitos de infractores""",
+        views=(_INFRACTOR,), priority=60),
+    KnowledgeFragment("rel_titulo", TOPIC_RELATIONSHIPS, """
+V_TITULOHABILITANTE puede cruzarse con (por NumeroDocumento con =):
   - V_PLANTACION, V_LICENCIA_CAZA, V_AUTORIZACION_CTP, V_AUTORIZACION_DEPOSITO,
-    V_AUTORIZACION_DESBOSQUE, V_CAMBIO_USO (todo por NumeroDocumento)
-
+    V_AUTORIZACION_DESBOSQUE, V_CAMBIO_USO (todo por NumeroDocumento)""",
+        views=(_TITULO, _PLANTACION, _CAZA, _CTP, _DEPOSITO, _DESBOSQUE, _CAMBIO_USO), priority=55),
+    KnowledgeFragment("rel_infractor_titulo", TOPIC_RELATIONSHIPS, """
 CASO ESPECIAL - V_INFRACTOR ↔ V_TITULOHABILITANTE:
   - Usar SOLO cuando necesitas ubicación geográfica (V_INFRACTOR no tiene Departamento)
-  - Si solo necesitas datos del infractor, consultar V_INFRACTOR directamente SIN JOIN
-
+  - Si solo necesitas datos del infractor, consultar V_INFRACTOR directamente SIN JOIN""",
+        views=(_INFRACTOR,), priority=65),
+    KnowledgeFragment("rel_cambio_uso_desbosque", TOPIC_RELATIONSHIPS, """
 RELACIÓN DE NEGOCIO:
   V_CAMBIO_USO → V_AUTORIZACION_DESBOSQUE:
-  - El cambio de uso es PREVIO al desbosque para fines agrícolas
-"""
-
-# =============================================================================
-# NOTAS IMPORTANTES
-# =============================================================================
-
-IMPORTANT_NOTES = """
-NOTAS IMPORTANTES:
+  - El cambio de uso es PREVIO al desbosque para fines agrícolas""",
+        views=(_CAMBIO_USO, _DESBOSQUE), priority=40),
 
+    # -------------------------------------------------------------------------
+    # NOTAS IMPORTANTES
+    # -------------------------------------------------------------------------
+    KnowledgeFragment("note_multas", TOPIC_NOTES, """
 SOBRE MULTAS:
   - El campo Multa en V_INFRACTOR ya está en UIT (Unidad Impositiva Tributaria)
   - Para "multas mayores a 10 UIT" usar: WHERE Multa > 10
-  - NO buscar tablas de conversión, el valor ya está en UIT
-
+  - NO buscar tablas de conversión, el valor ya está en UIT""",
+        views=(_INFRACTOR,), priority=80),
+    KnowledgeFragment("note_fechas", TOPIC_NOTES, """
 SOBRE FECHAS (MUY IMPORTANTE):
   - Los campos de fecha pueden tener datos inconsistentes
   - NO usar BETWEEN con fechas directamente (puede fallar)
   - SIEMPRE usar YEAR() para filtrar por año: WHERE YEAR(FechaResolucion) = 2024
   - Para rango de años: WHERE YEAR(FechaResolucion) BETWEEN 2024 AND 2025
-  - Para mes: WHERE YEAR(FechaResolucion) = 2024 AND MONTH(FechaResolucion) = 6
-
+  - Para mes: WHERE YEAR(FechaResolucion) = 2024 AND MONTH(FechaResolucion) = 6""",
+        priority=85),
+    KnowledgeFragment("note_ubicacion", TOPIC_NOTES, """
 SOBRE UBICACIÓN GEOGRÁFICA:
   - V_INFRACTOR no tiene Departamento, Provincia, Distrito
   - Si necesitas ubicación de infractores: JOIN con V_TITULOHABILITANTE
   - Si NO necesitas ubicación: consultar V_INFRACTOR directamente SIN JOIN
-  - Las demás vistas SÍ tienen campos de ubicación
-
+  - Las demás vistas SÍ tienen campos de ubicación""",
+        views=(_INFRACTOR,), priority=75),
+    KnowledgeFragment("note_desbosque_tala", TOPIC_NOTES, """
 SOBRE DESBOSQUE vs TALA:
   - Desbosque: remueve el bosque para otra actividad (no forestal)
   - Tala/Aprovechamiento: usa la madera manteniendo el bosque
-  - Son conceptos diferentes, no confundir
-
+  - Son conceptos diferentes, no confundir""",
+        views=(_DESBOSQUE, _CAMBIO_USO), priority=50),
+    KnowledgeFragment("note_tipos_titulo", TOPIC_NOTES, """
 SOBRE TIPOS DE TÍTULO (V_TITULOHABILITANTE.TipoTh):
   - AUTORIZACIONES: autorizaciones forestales
   - BOSQUE LOCAL: bosques administrados por municipalidades
   - CAMBIO DE USO: cambios de uso de suelo
   - CONCESIONES: concesiones forestales y de fauna
-  - PERMISOS: permisos forestales y de fauna
-"""
-
-# =============================================================================
-# DATOS NO DISPONIBLES
-# =============================================================================
-
-DATOS_NO_DISPONIBLES = """
-DATOS QUE NO EXISTEN EN LA BASE DE DATOS:
-
-ESPECIES (no hay columna de especie en ninguna vista):
-  - Árboles: pino, eucalipto, cedro, caoba, tornillo, shihuahuaco, mohena, etc.
-  - Productos no maderables: uña de gato, sangre de grado, totora, palo santo, tara, aguaje, etc.
-  - Fauna: venado, sajino, taricaya, lagarto, loro, guacamayo, etc.
-
-VOLÚMENES (no hay columnas de volumen en ninguna vista):
-  - Metros cúbicos de madera
-  - Toneladas de producto
-  - Cantidad de especímenes de fauna
-
-  Solo existe Superficie (hectáreas)
-
-EDAD DE PLANTACIONES (V_PLANTACION no tiene edad ni año de siembra):
-  AnioRegistro es el año en que se registró en SERFOR, NO cuando se plantó
-
-PRECIOS Y VALORES ECONÓMICOS (no hay columnas de precio):
-  - Precio de productos
-  - Valor de concesiones
-  - Montos de contratos
-
-  El único dato monetario es Multa en V_INFRACTOR (en UIT)
-
-UBICACIÓN GEOGRÁFICA (limitaciones por vista):
-  - V_INFRACTOR: no tiene Departamento, Provincia, Distrito
-  - V_LICENCIA_CAZA: no tiene Departamento, Provincia, Distrito
-
-COORDENADAS GPS:
-  - Solo V_AUTORIZACION_CTP y V_AUTORIZACION_DEPOSITO tienen CoordenadaX, CoordenadaY
-  - Las demás vistas no tienen coordenadas
-
-FISCALIZACIÓN:
-  - No hay información de inspecciones, auditorías ni planes de manejo
-  - Solo existen sanciones impuestas (V_INFRACTOR)
-"""
-
-# =============================================================================
-# GLOSARIO
-# =============================================================================
-
-GLOSSARY = """
-GLOSARIO DE TÉRMINOS:
-
-SERFOR: Servicio Nacional Forestal y de Fauna Silvestre de Perú
-ARFFS: Autoridad Regional Forestal y de Fauna Silvestre
-ATFFS: Administración Técnica Forestal y de Fauna Silvestre
-OSINFOR: Organismo de Supervisión de los Recursos Forestales
-UIT: Unidad Impositiva Tributaria (unidad para multas)
-RNI: Registro Nacional de Infractores
-RNPF: Registro Nacional de Plantaciones Forestales
-CTP: Centro de Transformación Primaria
-CUS: Cambio de Uso de Suelo
-"""
+  - PERMISOS: permisos forestales y de fauna""",
+        views=(_TITULO,), priority=60),
 
-# =============================================================================
-# REGLAS DE NEGOCIO
-# =============================================================================
-
-BUSINESS_RULES_QUERIES = """
+    # -------------------------------------------------------------------------
+    # REGLAS DE NEGOCIO
+    # -------------------------------------------------------------------------
+    KnowledgeFragment("rule_desagregacion", TOPIC_RULES, """
 CONCEPTO CLAVE - DESAGREGACIÓN PARA USUARIOS EJECUTIVOS:
 
 Este sistema provee información a usuarios del área ejecutiva que NO conocen la estructura
@@ -256,24 +293,17 @@ Por eso, las consultas SQL deben SIEMPRE desagregar por columnas clave para entr
 
 Esto NO es filtrar (WHERE), es MOSTRAR la información organizada (SELECT + GROUP BY).
 
-COLUMNAS DE DESAGREGACIÓN OBLIGATORIAS:
-
-  V_TITULOHABILITANTE:
-    - Situacion (VIGENTE, NO VIGENTE, EXTINGUIDO)
-    - OtorgaPermiso (tipo de tenencia)
-
-  V_PLANTACION:
-    - FinalidadPlantacion (PRODUCCION, PROTECCION, RESTAURACION)
-
-  Tablas con columna de estado (V_CAMBIO_USO, V_AUTORIZACION_DESBOSQUE, etc.):
-    - Su respectiva columna de estado/situación
-
 CÓMO APLICAR:
-  - Incluir las columnas de desagregación en SELECT
+  - Incluir las columnas de desagregación obligatorias de cada vista (ver abajo) en SELECT
   - Si hay agregación (COUNT, SUM, etc.), incluirlas también en GROUP BY
 
 EXCEPCIÓN: Si el usuario YA especificó un valor de alguna columna de desagregación en su pregunta,
-filtrar por ese valor y no desagregar por esa columna (pero sí por las demás si aplica).
+filtrar por ese valor y no desagregar por esa columna (pero sí por las demás si aplica).""",
+        priority=85),
+    KnowledgeFragment("rule_desagregacion_titulo", TOPIC_RULES, """
+DESAGREGACIÓN OBLIGATORIA - V_TITULOHABILITANTE:
+  - Situacion (VIGENTE, NO VIGENTE, EXTINGUIDO)
+  - OtorgaPermiso (tipo de tenencia)
 
 Ejemplo - V_TITULOHABILITANTE, pregunta general: "¿Cuántos títulos hay en Loreto?"
   SELECT Situacion, OtorgaPermiso, COUNT(*) as Cantidad
@@ -287,18 +317,26 @@ Ejemplo - V_TITULOHABILITANTE, con estado específico: "¿Cuántos títulos vige
   WHERE Departamento = 'LORETO' AND Situacion = 'VIGENTE'
   GROUP BY OtorgaPermiso
 
-Ejemplo - V_PLANTACION, pregunta general: "¿Cuántas plantaciones hay en Cusco?"
-  SELECT FinalidadPlantacion, COUNT(*) as Cantidad
-  FROM V_PLANTACION
-  WHERE Departamento = 'CUSCO'
-  GROUP BY FinalidadPlantacion
-
 Ejemplo - Listado: "Listado de concesiones en Madre de Dios"
   SELECT TituloHabilitante, Titular, TipoConcesion, Situacion, OtorgaPermiso, FechaDocumento
   FROM V_TITULOHABILITANTE
-  WHERE Departamento = 'MADRE DE DIOS' AND TipoTh = 'CONCESIONES'
-
+  WHERE Departamento = 'MADRE DE DIOS' AND TipoTh = 'CONCESIONES'""",
+        views=(_TITULO,), priority=80),
+    KnowledgeFragment("rule_desagregacion_plantacion", TOPIC_RULES, """
+DESAGREGACIÓN OBLIGATORIA - V_PLANTACION:
+  - FinalidadPlantacion (PRODUCCION, PROTECCION, RESTAURACION)
 
+Ejemplo - V_PLANTACION, pregunta general: "¿Cuántas plantaciones hay en Cusco?"
+  SELECT FinalidadPlantacion, COUNT(*) as Cantidad
+  FROM V_PLANTACION
+  WHERE Departamento = 'CUSCO'
+  GROUP BY FinalidadPlantacion""",
+        views=(_PLANTACION,), priority=80),
+    KnowledgeFragment("rule_desagregacion_estado", TOPIC_RULES, """
+DESAGREGACIÓN OBLIGATORIA - Tablas con columna de estado (V_CAMBIO_USO, V_AUTORIZACION_DESBOSQUE, etc.):
+  - Su respectiva columna de estado/situación""",
+        views=(_CAMBIO_USO, _DESBOSQUE, _CTP, _DEPOSITO, _CAZA), priority=75),
+    KnowledgeFragment("rule_tipo_titulo", TOPIC_RULES, """
 REGLA - TipoTh vs TipoConcesion/CategoriaPermiso EN V_TITULOHABILITANTE:
 
 La columna TipoTh indica el tipo de título habilitante, pero su implementación
@@ -332,9 +370,9 @@ Ejemplos:
   "Permisos maderables"           → WHERE CategoriaPermiso = 'MADERABLE'
   "Permisos forestales"           → WHERE CategoriaPermiso IN ('MADERABLE', 'NO MADERABLE', 'BOSQUE SECO')
   "Cesiones en uso"               → WHERE TipoTh = 'CESIÓN EN USO'
-  "Bosques locales"               → WHERE TipoTh = 'BOSQUE LOCAL'
-
-
+  "Bosques locales"               → WHERE TipoTh = 'BOSQUE LOCAL'""",
+        views=(_TITULO,), priority=75),
+    KnowledgeFragment("rule_periodos", TOPIC_RULES, """
 REGLA - CONSULTAS CON PERIODOS DE TIEMPO (QUERIES):
 
 Cuando la consulta involucre un rango de tiempo:
@@ -345,9 +383,9 @@ Ejemplo: "¿Cuántas infracciones hubo entre 2020 y 2023?"
   SELECT YEAR(FechaResolucion) as Anio, COUNT(*) as Cantidad
   FROM V_INFRACTOR
   WHERE YEAR(FechaResolucion) BETWEEN 2020 AND 2023
-  GROUP BY YEAR(FechaResolucion)
-
-
+  GROUP BY YEAR(FechaResolucion)""",
+        priority=45),
+    KnowledgeFragment("rule_ordenamiento", TOPIC_RULES, """
 REGLA - ORDENAMIENTO DE RESULTADOS:
 
 Los resultados de las queries deben ordenarse de forma coherente:
@@ -360,9 +398,9 @@ Ejemplo: "¿Cuántos títulos hay por departamento?"
   SELECT Departamento, COUNT(*) as Cantidad
   FROM V_TITULOHABILITANTE
   GROUP BY Departamento
-  ORDER BY Cantidad DESC
-
-
+  ORDER BY Cantidad DESC""",
+        priority=40),
+    KnowledgeFragment("rule_superficies", TOPIC_RULES, """
 REGLA - SUPERFICIES EN CAMBIO DE USO Y DESBOSQUE (QUERIES):
 
 En V_CAMBIO_USO y V_AUTORIZACION_DESBOSQUE, cuando consulten sobre área, superficie o hectáreas:
@@ -371,9 +409,9 @@ En V_CAMBIO_USO y V_AUTORIZACION_DESBOSQUE, cuando consulten sobre área, superf
 Ejemplo: "¿Cuál es la superficie autorizada para cambio de uso en San Martín?"
   SELECT Titular, Superficie, SuperficieConservar, SuperficieDesbosque
   FROM V_CAMBIO_USO
-  WHERE Departamento = 'SAN MARTIN'
-
-
+  WHERE Departamento = 'SAN MARTIN'""",
+        views=(_CAMBIO_USO, _DESBOSQUE), priority=70),
+    KnowledgeFragment("rule_no_asumir_filtros", TOPIC_RULES, """
 REGLA GENERAL - NO ASUMIR FILTROS:
 
 El sistema PROVEE información, NO interpreta intenciones.
@@ -395,9 +433,9 @@ Ejemplo:
 
   ✅ Usuario: "¿Concesiones vigentes en Loreto?"
      Query: WHERE Situacion = 'VIGENTE' AND Departamento = 'LORETO'
-     Correcto: El usuario SÍ pidió "vigentes"
-
-
+     Correcto: El usuario SÍ pidió "vigentes\"""",
+        priority=70),
+    KnowledgeFragment("rule_licencias_caza", TOPIC_RULES, """
 REGLA - LICENCIAS DE CAZA (QUERIES):
 
 En V_LICENCIA_CAZA, la columna EstadoLicencia siempre dice "APROBADA", pero eso no significa que esté vigente.
@@ -418,9 +456,9 @@ Ejemplo: "¿Cuántas licencias de caza están extintas?"
   SELECT CausalExtincion, COUNT(*) as Cantidad
   FROM V_LICENCIA_CAZA
   WHERE CausalExtincion IS NOT NULL
-  GROUP BY CausalExtincion
-
-
+  GROUP BY CausalExtincion""",
+        views=(_CAZA,), priority=80),
+    KnowledgeFragment("rule_fechas_titulo", TOPIC_RULES, """
 REGLA - FECHAS EN TÍTULOS HABILITANTES (QUERIES):
 
 En V_TITULOHABILITANTE:
@@ -431,9 +469,9 @@ Cuando pregunten por:
   - "¿Cuándo se emitió/otorgó?": usar FechaDocumento
   - "¿Cuándo empieza/termina la vigencia?": usar FechaInicio/FechaFin
   - "Títulos emitidos en 2023": WHERE YEAR(FechaDocumento) = 2023
-  - "Títulos vigentes en 2024": WHERE FechaInicio <= '2024-12-31' AND FechaFin >= '2024-01-01'
-
-
+  - "Títulos vigentes en 2024": WHERE FechaInicio <= '2024-12-31' AND FechaFin >= '2024-01-01'""",
+        views=(_TITULO,), priority=65),
+    KnowledgeFragment("rule_tipo_empresa", TOPIC_RULES, """
 REGLA - BÚSQUEDA DE TIPOS DE EMPRESA:
 
 No existe campo "tipo de empresa" en la base de datos.
@@ -449,9 +487,9 @@ Ejemplo: "¿Empresas madereras sancionadas?"
   SELECT Infractor, Multa
   FROM V_INFRACTOR
   WHERE TipoDocumento = 'RUC'
-    AND Infractor LIKE '%MADERER%'
-
-
+    AND Infractor LIKE '%MADERER%'""",
+        priority=30),
+    KnowledgeFragment("rule_valores_compuestos", TOPIC_RULES, """
 REGLA - VALORES COMPUESTOS EN COLUMNAS CATEGÓRICAS:
 
 Algunas columnas pueden tener valores compuestos (múltiples valores separados por coma).
@@ -469,59 +507,206 @@ Para buscar "lugares de acopio":
 
 Para buscar "depósitos":
   WHERE TipoDeposito IN ('DEPOSITO', 'LUGAR DE ACOPIO, DEPOSITO, ESTABLECIMIENTO COMERCIAL')
-  -- O usar LIKE: WHERE TipoDeposito LIKE '%DEPOSITO%'
-
-
+  -- O usar LIKE: WHERE TipoDeposito LIKE '%DEPOSITO%'""",
+        views=(_DEPOSITO,), priority=70),
+    KnowledgeFragment("rule_categoricas", TOPIC_RULES, """
 REGLA - COLUMNAS CATEGÓRICAS (ENUMERACIONES CON VALORES FIJOS):
 
-Las siguientes columnas son ENUMERACIONES con un conjunto CERRADO de valores.
+Las columnas listadas a continuación son ENUMERACIONES con un conjunto CERRADO de valores.
 NO existen otros valores. NO usar LIKE para buscar valores que no estén en esta lista.
 
-V_TITULOHABILITANTE:
+IMPORTANTE:
+  - Usar ÚNICAMENTE estos valores exactos (respetando mayúsculas)
+  - Si el usuario pide algo que no está en esta lista, NO existe en la base de datos
+  - NO usar WHERE columna LIKE '%valor_inexistente%' en columnas categóricas""",
+        views=(_TITULO, _PLANTACION, _DEPOSITO, _CTP), priority=70),
+    KnowledgeFragment("rule_categoricas_titulo", TOPIC_RULES, """
+V_TITULOHABILITANTE (valores categóricos):
   - TipoTh: AUTORIZACIONES, BOSQUE LOCAL, CAMBIO DE USO, CESIÓN EN USO, CONCESIONES, DESBOSQUE, PERMISOS
   - TipoConcesion: CONSERVACIÓN, ECOTURISMO, FAUNA SILVESTRE, FINES MADERABLES, FORESTACIÓN Y/O REFORESTACIÓN, NO APLICA, PLANTACIONES FORESTALES, PRODUCTOS FORESTALES DIFERENTES A LA MADERA
   - Categoriapermiso: BOSQUE SECO, FAUNA SILVESTRE, MADERABLE, NO APLICA, NO MADERABLE
   - OtorgaPermiso: COMUNIDAD CAMPESINA, COMUNIDAD NATIVA, NO APLICA, PREDIO PRIVADO, TIERRAS DE DOMINIO PÚBLICO
-  - Situacion: VIGENTE, NO VIGENTE, EXTINGUIDO
-
-V_PLANTACION:
+  - Situacion: VIGENTE, NO VIGENTE, EXTINGUIDO""",
+        views=(_TITULO,), priority=70),
+    KnowledgeFragment("rule_categoricas_plantacion", TOPIC_RULES, """
+V_PLANTACION (valores categóricos):
   - FinalidadPlantacion: PRODUCCION, PROTECCION, RESTAURACION
     (NO contiene especies, nombres de árboles, ni tipos de plantas)
   - Region: COSTA, SELVA, SIERRA
   - TipoPersona: PERSONA JURIDICA, PERSONA NATURAL
   - RegimenTenencia: COMUNIDAD CAMPESINA, COMUNIDAD NATIVA, NO APLICA, PREDIO PRIVADO, TIERRAS DE DOMINIO PÚBLICO
-  - TipoComunidad: CAMPESINA, NATIVA
-
-V_AUTORIZACION_DEPOSITO:
-  - TipoDeposito: ver regla de VALORES COMPUESTOS arriba
+  - TipoComunidad: CAMPESINA, NATIVA""",
+        views=(_PLANTACION,), priority=70),
+    KnowledgeFragment("rule_categoricas_deposito", TOPIC_RULES, """
+V_AUTORIZACION_DEPOSITO (valores categóricos):
+  - TipoDeposito: ver regla de VALORES COMPUESTOS
   - TipoRecurso: FAUNA SILVESTRE, FORESTAL
-    (NO contiene especies específicas como "palo santo", "tara", etc.)
-
-V_AUTORIZACION_CTP:
+    (NO contiene especies específicas como "palo santo", "tara", etc.)""",
+        views=(_DEPOSITO,), priority=65),
+    KnowledgeFragment("rule_categoricas_ctp", TOPIC_RULES, """
+V_AUTORIZACION_CTP (valores categóricos):
   - TipoRecurso: FAUNA SILVESTRE, FORESTAL
-  - LineaProduccionGiro: ASERRADERO, LAMINADORA, PRODUCCION DE CARBON VEGETAL, TRIPLAYERA, otros
-
-IMPORTANTE:
-  - Usar ÚNICAMENTE estos valores exactos (respetando mayúsculas)
-  - Si el usuario pide algo que no está en esta lista, NO existe en la base de datos
-  - NO usar WHERE columna LIKE '%valor_inexistente%' en columnas categóricas
-"""
+  - LineaProduccionGiro: ASERRADERO, LAMINADORA, PRODUCCION DE CARBON VEGETAL, TRIPLAYERA, otros""",
+        views=(_CTP,), priority=65),
+
+    # -------------------------------------------------------------------------
+    # COLUMNAS DE ESTADO
+    # -------------------------------------------------------------------------
+    KnowledgeFragment("estado_general", TOPIC_ESTADOS, """
+Los términos "Estado" y "Situación" son sinónimos en el contexto de SERFOR.""",
+        priority=60),
+    KnowledgeFragment("estado_titulo", TOPIC_ESTADOS, """
+  - V_TITULOHABILITANTE.Situacion: VIGENTE, NO VIGENTE, EXTINGUIDO""",
+        views=(_TITULO,), priority=60),
+    KnowledgeFragment("estado_cambio_uso", TOPIC_ESTADOS, """
+  - V_CAMBIO_USO.Situacion: VIGENTE, NO VIGENTE, EXTINGUIDO""",
+        views=(_CAMBIO_USO,), priority=60),
+    KnowledgeFragment("estado_desbosque", TOPIC_ESTADOS, """
+  - V_AUTORIZACION_DESBOSQUE.Situacion: VIGENTE, NO VIGENTE""",
+        views=(_DESBOSQUE,), priority=60),
+    KnowledgeFragment("estado_ctp", TOPIC_ESTADOS, """
+  - V_AUTORIZACION_CTP.Estado: VIGENTE""",
+        views=(_CTP,), priority=60),
+    KnowledgeFragment("estado_deposito", TOPIC_ESTADOS, """
+  - V_AUTORIZACION_DEPOSITO.Estado: VIGENTE""",
+        views=(_DEPOSITO,), priority=60),
+    KnowledgeFragment("estado_caza", TOPIC_ESTADOS, """
+  - V_LICENCIA_CAZA.EstadoLicencia: APROBADA
+    NOTA: Para licencias extintas, verificar CausalExtincion (si no es NULL, está extinta)""",
+        views=(_CAZA,), priority=60),
+    KnowledgeFragment("estado_sin_columna", TOPIC_ESTADOS, """
+  - V_PLANTACION y V_INFRACTOR: NO tienen columna de estado""",
+        views=(_PLANTACION, _INFRACTOR), priority=55),
+
+    # -------------------------------------------------------------------------
+    # DATOS NO DISPONIBLES
+    # -------------------------------------------------------------------------
+    KnowledgeFragment("nd_especies", TOPIC_NO_DISPONIBLES, """
+ESPECIES (no hay columna de especie en ninguna vista):
+  - Árboles: pino, eucalipto, cedro, caoba, tornillo, shihuahuaco, mohena, etc.
+  - Productos no maderables: uña de gato, sangre de grado, totora, palo santo, tara, aguaje, etc.
+  - Fauna: venado, sajino, taricaya, lagarto, loro, guacamayo, etc.""",
+        priority=65),
+    KnowledgeFragment("nd_volumenes", TOPIC_NO_DISPONIBLES, """
+VOLÚMENES (no hay columnas de volumen en ninguna vista):
+  - Metros cúbicos de madera
+  - Toneladas de producto
+  - Cantidad de especímenes de fauna
 
-BUSINESS_RULES_ESTADOS = """
-REFERENCIA - COLUMNAS DE ESTADO POR TABLA:
+  Solo existe Superficie (hectáreas)""",
+        priority=55),
+    KnowledgeFragment("nd_edad_plantaciones", TOPIC_NO_DISPONIBLES, """
+EDAD DE PLANTACIONES (V_PLANTACION no tiene edad ni año de siembra):
+  AnioRegistro es el año en que se registró en SERFOR, NO cuando se plantó""",
+        views=(_PLANTACION,), priority=60),
+    KnowledgeFragment("nd_precios", TOPIC_NO_DISPONIBLES, """
+PRECIOS Y VALORES ECONÓMICOS (no hay columnas de precio):
+  - Precio de productos
+  - Valor de concesiones
+  - Montos de contratos
 
-Los términos "Estado" y "Situación" son sinónimos en el contexto de SERFOR.
+  El único dato monetario es Multa en V_INFRACTOR (en UIT)""",
+        priority=50),
+    KnowledgeFragment("nd_ubicacion", TOPIC_NO_DISPONIBLES, """
+UBICACIÓN GEOGRÁFICA (limitaciones por vista):
+  - V_INFRACTOR: no tiene Departamento, Provincia, Distrito
+  - V_LICENCIA_CAZA: no tiene Departamento, Provincia, Distrito""",
+        views=(_INFRACTOR, _CAZA), priority=60),
+    KnowledgeFragment("nd_coordenadas", TOPIC_NO_DISPONIBLES, """
+COORDENADAS GPS:
+  - Solo V_AUTORIZACION_CTP y V_AUTORIZACION_DEPOSITO tienen CoordenadaX, CoordenadaY
+  - Las demás vistas no tienen coordenadas""",
+        priority=35),
+    KnowledgeFragment("nd_fiscalizacion", TOPIC_NO_DISPONIBLES, """
+FISCALIZACIÓN:
+  - No hay información de inspecciones, auditorías ni planes de manejo
+  - Solo existen sanciones impuestas (V_INFRACTOR)""",
+        priority=35),
+]
+
+
+def normalize_view_name(name: str) -> Optional[str]:
+    """
+    Normaliza un nombre de vista ('Dir.[V_PLANTACION]', 'v_plantacion', ...)
+    al nombre canónico de KNOWN_VIEWS.
+
+    Returns:
+        Nombre canónico o None si no corresponde a una vista conocida
+    """
+    if not name:
+        return None
+    candidate = str(name).strip().split(".")[-1].strip("[]\" ").upper()
+    return candidate if candidate in KNOWN_VIEWS else None
+
+
+def select_fragments(
+    entities: Optional[Iterable[str]] = None,
+    topics: Optional[Iterable[str]] = None
+) -> List[KnowledgeFragment]:
+    """
+    Selecciona los fragmentos relevantes para las entidades de una consulta.
+
+    Args:
+        entities: Vistas involucradas (salida del Interpreter). Si ninguna es
+            reconocible se incluyen los fragmentos de todas las vistas.
+        topics: Temas a incluir (por defecto todos)
+
+    Returns:
+        Lista de fragmentos en orden de presentación (tema, luego definición)
+    """
+    views = frozenset(filter(None, (normalize_view_name(e) for e in entities or [])))
+    if not views:
+        views = frozenset(KNOWN_VIEWS)
+
+    selected_topics = [t for t in ALL_TOPICS if topics is None or t in topics]
+
+    return [
+        fragment
+        for topic in selected_topics
+        for fragment in KNOWLEDGE_FRAGMENTS
+        if fragment.topic == topic and fragment.applies_to(views)
+    ]
+
+
+def render_fragments(fragments: Iterable[KnowledgeFragment]) -> str:
+    """Render fragments grouped under their topic headers"""
+    sections = []
+    current_topic = None
+    for fragment in fragments:
+        if fragment.topic != current_topic:
+            current_topic = fragment.topic
+            sections.append(f"\n{_TOPIC_HEADERS[current_topic]}\n")
+        sections.append(fragment.text.lstrip("\n") + "\n")
+    return "\n".join(sections)
+
+
+def build_domain_knowledge(
+    entities: Optional[Iterable[str]] = None,
+    topics: Optional[Iterable[str]] = None
+) -> str:
+    """
+    Arma el texto de conocimiento de dominio solo con los fragmentos
+    relevantes para las entidades indicadas.
+
+    Args:
+        entities: Vistas involucradas en la consulta
+        topics: Temas a incluir (por defecto todos)
+
+    Returns:
+        Texto listo para insertar en un prompt
+    """
+    return render_fragments(select_fragments(entities, topics))
 
-Columnas de estado:
-  - V_TITULOHABILITANTE.Situacion: VIGENTE, NO VIGENTE, EXTINGUIDO
-  - V_CAMBIO_USO.Situacion: VIGENTE, NO VIGENTE, EXTINGUIDO
-  - V_AUTORIZACION_DESBOSQUE.Situacion: VIGENTE, NO VIGENTE
-  - V_AUTORIZACION_CTP.Estado: VIGENTE
-  - V_AUTORIZACION_DEPOSITO.Estado: VIGENTE
-  - V_LICENCIA_CAZA.EstadoLicencia: APROBADA
-    NOTA: Para licencias extintas, verificar CausalExtincion (si no es NULL, está extinta)
 
-Tablas SIN columna de estado:
-  - V_PLANTACION
-  - V_INFRACTOR
-"""
+# =============================================================================
+# TEXTOS COMPLETOS (todas las vistas)
+# =============================================================================
+# Se mantienen para los prompts que necesitan el conocimiento completo
+# (p. ej. el Interpreter, que aún no conoce las entidades de la consulta).
+
+ENTITY_DESCRIPTIONS = build_domain_knowledge(topics=[TOPIC_DESCRIPTIONS])
+VIEW_RELATIONSHIPS = build_domain_knowledge(topics=[TOPIC_RELATIONSHIPS])
+IMPORTANT_NOTES = build_domain_knowledge(topics=[TOPIC_NOTES])
+BUSINESS_RULES_QUERIES = build_domain_knowledge(topics=[TOPIC_RULES])
+BUSINESS_RULES_ESTADOS = build_domain_knowledge(topics=[TOPIC_ESTADOS])
+DATOS_NO_DISPONIBLES = build_domain_knowledge(topics=[TOPIC_NO_DISPONIBLES])
@@ -3,14 +3,24 @@ Prompts para el Executor Agent
 """
 
 from .domain_knowledge import (
-    ENTITY_DESCRIPTIONS,
-    IMPORTANT_NOTES,
-    VIEW_RELATIONSHIPS,
-    BUSINESS_RULES_QUERIES,
-    BUSINESS_RULES_ESTADOS
+    TOPIC_DESCRIPTIONS,
+    TOPIC_RELATIONSHIPS,
+    TOPIC_NOTES,
+    TOPIC_RULES,
+    TOPIC_ESTADOS
 )
 
-ROLE_SETUP = f"""Eres un agente ejecutor especializado en realizar consultas y operaciones sobre la base de datos SERFOR_BDDWH.
+# Temas de conocimiento de dominio que recibe el Executor en cada tarea
+# (seleccionados según las vistas que usa la query de la tarea)
+DOMAIN_TOPICS = (
+    TOPIC_DESCRIPTIONS,
+    TOPIC_RELATIONSHIPS,
+    TOPIC_NOTES,
+    TOPIC_RULES,
+    TOPIC_ESTADOS
+)
+
+ROLE_SETUP = """Eres un agente ejecutor especializado en realizar consultas y operaciones sobre la base de datos SERFOR_BDDWH.
 
 Tienes acceso a skills especializadas para:
 - execute_select_query: Consultas SELECT simples (incluye COUNT, SUM, AVG, etc.)
@@ -27,15 +37,7 @@ VISTAS DISPONIBLES:
 - Dir.V_AUTORIZACION_DESBOSQUE: Autorizaciones de desbosque
 - Dir.V_CAMBIO_USO: Cambios de uso
 
-{ENTITY_DESCRIPTIONS}
-
-{VIEW_RELATIONSHIPS}
-
-{IMPORTANT_NOTES}
-
-{BUSINESS_RULES_QUERIES}
-
-{BUSINESS_RULES_ESTADOS}
+El conocimiento de negocio relevante para cada tarea se incluye junto con la tarea.
 
 IMPORTANTE - SINTAXIS SQL SERVER:
 - USA 'TOP N' en lugar de 'LIMIT N'
@@ -61,17 +63,30 @@ Ejecutas tareas individuales según su tipo de acción:
 Para cada tarea, proporciona un resultado claro y estructurado.
 Si encuentras errores, describe específicamente qué falló y por qué."""
 
-# Templates para cada tipo de acción
+# Templates para cada tipo de acción. El esquema y el conocimiento de dominio
+# se agregan como secciones aparte (ver ExecutorAgent.generate_task_prompt).
 TASK_PROMPT_BASE = """
 Ejecuta la siguiente tarea:
 
 Descripción: {description}
 Tipo de acción: {action_type}
 Parámetros: {parameters}
+"""
+
+RETRY_PROMPT = """
+⚠️ INTENTO #{attempt} - ERROR ANTERIOR:
+{error_message}
 
-{schema_details}
+{hint}
 """
 
+# Indicación del reintento según la clase de error (ErrorClass de database.results)
+RETRY_HINTS = {
+    "timeout": ("La consulta superó el tiempo límite y es el único reintento: reescríbela para leer menos filas "
+                "(filtros en WHERE, agregar en SQL en vez de traer el detalle, TOP, sin JOINs innecesarios)."),
+    "default": "Usa SOLO las columnas que existen en el schema de arriba."
+}
+
 TASK_PROMPTS = {
     "validate": "Valida los parámetros y datos especificados. Retorna 'VALID' si todo está correcto, o describe los problemas encontrados.",
     "query": """Si los parámetros incluyen "query", ejecuta ESA QUERY EXACTA sin modificarla.
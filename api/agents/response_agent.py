@@ -4,11 +4,17 @@ Response Agent - Formats and presents final results to the user
 from typing import Dict, Any, List
 from .base_agent import BaseAgent
 from .prompts.response_prompt import ROLE_SETUP, RESPONSE_PROMPT_TEMPLATE
+from .prompt_compiler import PromptSection
+from database.columnar import ColumnarResult
+from database.results import QueryResult
 import json
 import re
 import pandas as pd
 from collections import Counter
 
+# Filas de muestra por resultado en el resumen (se reducen si el prompt excede su presupuesto)
+DEFAULT_SAMPLE_ROWS = 20
+
 class ResponseAgent(BaseAgent):
     """Agent that formats execution results into user-friendly responses"""
 
@@ -20,15 +26,20 @@ class ResponseAgent(BaseAgent):
             model='gpt-4.1'
         )
 
-    def _generate_data_summary(self, data: List[Dict], task_description: str = "Query") -> Dict[str, Any]:
+    def _generate_data_summary(
+        self,
+        table: ColumnarResult,
+        task_description: str = "Query",
+        sample_rows: int = DEFAULT_SAMPLE_ROWS
+    ) -> Dict[str, Any]:
         """
         Generate an intelligent statistical summary of the data.
         This allows the LLM to understand the data without needing all rows.
         """
-        if not data:
+        if not table.row_count:
             return {"task": task_description, "empty": True}
 
-        df = pd.DataFrame(data)
+        df = table.to_dataframe()
         summary = {
             "task": task_description,
             "total_rows": len(df),
@@ -75,15 +86,19 @@ class ResponseAgent(BaseAgent):
             summary["column_analysis"][col] = col_info
 
         # Siempre incluir muestra de datos para preservar relaciones entre columnas
-        if len(df) <= 20:
-            summary["sample_data"] = data
-        else:
-            summary["sample_data"] = data[:20]
-            summary["sample_data_note"] = "Primeros 20 resultados de muestra"
+        if len(df) <= sample_rows:
+            summary["sample_data"] = table.to_rows()
+        elif sample_rows > 0:
+            summary["sample_data"] = table.to_rows(stop=sample_rows)
+            summary["sample_data_note"] = f"Primeros {sample_rows} resultados de muestra"
 
         return summary
 
-    def _summarize_execution_results(self, execution_results: List[Dict]) -> str:
+    def _summarize_execution_results(
+        self,
+        execution_results: List[Dict],
+        sample_rows: int = DEFAULT_SAMPLE_ROWS
+    ) -> str:
         """
         Generate intelligent summaries of all execution results.
         """
@@ -92,16 +107,21 @@ class ResponseAgent(BaseAgent):
 
         summaries = []
         for result in execution_results:
-            if result.get("status") == "success" and isinstance(result.get("result"), str):
+            if result.get("status") == "success":
                 try:
-                    parsed = json.loads(result["result"])
-                    if parsed.get("success") and "data" in parsed:
-                        data = parsed["data"]
+                    query_result = QueryResult.coerce(result.get("result"))
+                    if query_result and query_result.success:
                         task_desc = result.get("description", "Query")
-                        summary = self._generate_data_summary(data, task_desc)
+                        summary = self._generate_data_summary(query_result.table, task_desc, sample_rows)
                         # Incluir el SQL ejecutado para que el Response pueda validar
-                        if "query_executed" in parsed:
-                            summary["sql_ejecutado"] = parsed["query_executed"]
+                        if query_result.query_executed:
+                            summary["sql_ejecutado"] = query_result.query_executed
+                        if query_result.truncated:
+                            total = query_result.total_count if query_result.total_count is not None else "más"
+                            summary["resultado_truncado"] = (
+                                f"Se devolvieron solo {query_result.row_count} filas de {total}; "
+                                "las estadísticas describen únicamente las filas devueltas"
+                            )
                         summaries.append(summary)
                 except Exception as e:
                     summaries.append({
@@ -116,6 +136,35 @@ class ResponseAgent(BaseAgent):
 
         return json.dumps(summaries, ensure_ascii=False, indent=2)
 
+    def _results_section(
+        self,
+        user_query: str,
+        execution_results: List[Dict],
+        summarized_results: str,
+        sample_rows: int
+    ) -> PromptSection:
+        """Build the prompt section; it shrinks by halving the sample rows of each summary"""
+        def _shrink(section: PromptSection):
+            if sample_rows == 0:
+                return None
+            fewer_rows = sample_rows // 2
+            return self._results_section(
+                user_query,
+                execution_results,
+                self._summarize_execution_results(execution_results, fewer_rows),
+                fewer_rows
+            )
+
+        return PromptSection(
+            "execution_results",
+            RESPONSE_PROMPT_TEMPLATE.format(
+                user_query=user_query,
+                execution_results=summarized_results
+            ),
+            required=True,
+            shrink=_shrink
+        )
+
     def _parse_tagged_response(self, response: str) -> Dict[str, str]:
         """
         Parse response with tags to extract executive and insight responses.
@@ -171,10 +220,9 @@ class ResponseAgent(BaseAgent):
 
         print(f"📊 ResponseAgent - Data summary generated ({len(summarized_results)} chars)")
 
-        prompt = RESPONSE_PROMPT_TEMPLATE.format(
-            user_query=user_query,
-            execution_results=summarized_results
-        )
+        prompt = self.compile_prompt([
+            self._results_section(user_query, execution_results, summarized_results, DEFAULT_SAMPLE_ROWS)
+        ])
 
         response = self.run(prompt)
 
@@ -1,10 +1,12 @@
 """
 Task Management System for execution planning and monitoring
 """
-from typing import Dict, List, Any, Optional
+from typing import Callable, Deque, Dict, List, Any, Optional
+from collections import deque
 from dataclasses import dataclass, field
 from enum import Enum
 import json
+import threading
 import uuid
 from datetime import datetime
 
@@ -31,23 +33,38 @@ class ExecutionTask:
     completed_at: Optional[datetime] = None
     retry_count: int = 0
     max_retries: int = 3
+    retryable: bool = True  # False when the last failure cannot be fixed by retrying
+    error_class: Optional[str] = None  # Class of the last failure (database.results.ErrorClass value)
+    # Called with (task, previous_status) on every status change; set by TaskManager
+    status_listener: Optional[Callable[["ExecutionTask", TaskStatus], None]] = field(
+        default=None, repr=False, compare=False
+    )
+
+    def set_status(self, status: TaskStatus):
+        """Change status and notify the owning task manager"""
+        previous = self.status
+        self.status = status
+        if self.status_listener and previous != status:
+            self.status_listener(self, previous)
 
     def start_execution(self):
         """Mark task as in progress"""
-        self.status = TaskStatus.IN_PROGRESS
         self.started_at = datetime.now()
+        self.set_status(TaskStatus.IN_PROGRESS)
 
     def complete_success(self, result: Any):
         """Mark task as completed with result"""
-        self.status = TaskStatus.COMPLETED
         self.result = result
         self.completed_at = datetime.now()
+        self.set_status(TaskStatus.COMPLETED)
 
-    def complete_failure(self, error: str):
+    def complete_failure(self, error: str, retryable: bool = True, error_class: Optional[str] = None):
         """Mark task as failed with error"""
-        self.status = TaskStatus.FAILED
         self.error_message = error
+        self.retryable = retryable
+        self.error_class = error_class
         self.completed_at = datetime.now()
+        self.set_status(TaskStatus.FAILED)
 
     def can_execute(self, completed_tasks: List[str]) -> bool:
         """Check if task dependencies are satisfied"""
@@ -55,19 +72,54 @@ class ExecutionTask:
 
     def should_retry(self) -> bool:
         """Check if task should be retried"""
-        return self.status == TaskStatus.FAILED and self.retry_count < self.max_retries
+        return (
+            self.status == TaskStatus.FAILED
+            and self.retryable
+            and self.retry_count < self.max_retries
+        )
 
 class TaskManager:
-    """Manages execution tasks with dependencies and error recovery"""
+    """
+    Manages execution tasks with dependencies and error recovery.
+
+    Scheduling is event driven: each task keeps a count of unfinished
+    dependencies and an index of its dependents, so a task enters the ready
+    queue as soon as its last dependency completes. Status counts are updated
+    on every status change instead of rescanning the task list. All methods
+    are thread-safe, so independent tasks can run concurrently.
+    """
 
     def __init__(self):
         self.tasks: List[ExecutionTask] = []
         self.execution_log: List[Dict[str, Any]] = []
+        self._tasks_by_id: Dict[str, ExecutionTask] = {}
+        self._dependents: Dict[str, List[str]] = {}
+        self._pending_dependencies: Dict[str, int] = {}
+        self._ready: Deque[str] = deque()
+        self._retry_queue: Deque[str] = deque()
+        self._status_counts: Dict[TaskStatus, int] = {status: 0 for status in TaskStatus}
+        self._lock = threading.RLock()
 
     def add_task(self, task: ExecutionTask) -> str:
         """Add a task to the manager"""
-        self.tasks.append(task)
-        self.log_event("task_added", {"task_id": task.id, "description": task.description})
+        with self._lock:
+            self.tasks.append(task)
+            self._tasks_by_id[task.id] = task
+            self._status_counts[task.status] += 1
+            task.status_listener = self._on_status_change
+
+            unfinished = 0
+            for dep_id in task.dependencies:
+                dependency = self._tasks_by_id.get(dep_id)
+                if dependency is None or dependency.status != TaskStatus.COMPLETED:
+                    unfinished += 1
+                self._dependents.setdefault(dep_id, []).append(task.id)
+            self._pending_dependencies[task.id] = unfinished
+
+            if task.status == TaskStatus.PENDING and unfinished == 0:
+                self._ready.append(task.id)
+
+            self.log_event("task_added", {"task_id": task.id, "description": task.description})
         return task.id
 
     def create_task_from_plan_step(self, step: Dict[str, Any], dependencies: List[str] = None) -> ExecutionTask:
@@ -81,61 +133,98 @@ class TaskManager:
         )
 
     def get_next_executable_task(self) -> Optional[ExecutionTask]:
-        """Get the next task that can be executed"""
-        completed_task_ids = [t.id for t in self.tasks if t.status == TaskStatus.COMPLETED]
+        """
+        Get the next task that can be executed.
 
-        for task in self.tasks:
-            if task.status == TaskStatus.PENDING and task.can_execute(completed_task_ids):
-                return task
+        Ready tasks come first, then failed tasks with retries left. A task is
+        handed out only once per attempt, so concurrent callers never receive
+        the same task.
+        """
+        with self._lock:
+            while self._ready:
+                task = self._tasks_by_id[self._ready.popleft()]
+                if task.status == TaskStatus.PENDING:
+                    return task
 
-        # Check for failed tasks that can be retried
-        for task in self.tasks:
-            if task.should_retry():
-                task.retry_count += 1
-                task.status = TaskStatus.PENDING
-                self.log_event("task_retry", {"task_id": task.id, "retry_count": task.retry_count})
-                return task
+            # Check for failed tasks that can be retried
+            while self._retry_queue:
+                task = self._tasks_by_id[self._retry_queue.popleft()]
+                if task.should_retry():
+                    task.retry_count += 1
+                    task.set_status(TaskStatus.PENDING)
+                    self.log_event("task_retry", {"task_id": task.id, "retry_count": task.retry_count})
+                    return task
 
         return None
 
+    def _on_status_change(self, task: ExecutionTask, previous: TaskStatus):
+        """Keep counts, the ready queue and the retry queue in sync with task status"""
+        with self._lock:
+            self._status_counts[previous] -= 1
+            self._status_counts[task.status] += 1
+
+            if task.status == TaskStatus.COMPLETED:
+                for dependent_id in self._dependents.get(task.id, []):
+                    self._pending_dependencies[dependent_id] -= 1
+                    dependent = self._tasks_by_id.get(dependent_id)
+                    if (dependent and dependent.status == TaskStatus.PENDING
+                            and self._pending_dependencies[dependent_id] == 0):
+                        self._ready.append(dependent_id)
+
+            elif task.status == TaskStatus.FAILED:
+                if task.should_retry():
+                    self._retry_queue.append(task.id)
+                else:
+                    self._skip_dependents(task)
+
+    def _skip_dependents(self, failed_task: ExecutionTask):
+        """Mark every task that (transitively) depends on a definitively failed task as skipped"""
+        pending = list(self._dependents.get(failed_task.id, []))
+        while pending:
+            dependent = self._tasks_by_id.get(pending.pop())
+            if dependent and dependent.status == TaskStatus.PENDING:
+                dependent.error_message = f"Dependencia fallida: {failed_task.description}"
+                dependent.set_status(TaskStatus.SKIPPED)
+                self.log_event("task_skipped", {"task_id": dependent.id, "failed_dependency": failed_task.id})
+                pending.extend(self._dependents.get(dependent.id, []))
+
     def get_tasks_by_status(self, status: TaskStatus) -> List[ExecutionTask]:
         """Get all tasks with specific status"""
         return [task for task in self.tasks if task.status == status]
 
     def is_execution_complete(self) -> bool:
         """Check if all tasks are completed or definitively failed"""
-        for task in self.tasks:
-            if task.status in [TaskStatus.PENDING, TaskStatus.IN_PROGRESS]:
-                return False
-            if task.status == TaskStatus.FAILED and task.should_retry():
+        with self._lock:
+            if self._status_counts[TaskStatus.PENDING] or self._status_counts[TaskStatus.IN_PROGRESS]:
                 return False
-        return True
+            return not any(self._tasks_by_id[task_id].should_retry() for task_id in self._retry_queue)
 
     def get_execution_summary(self) -> Dict[str, Any]:
         """Get summary of execution status"""
-        status_counts = {}
-        for status in TaskStatus:
-            status_counts[status.value] = len(self.get_tasks_by_status(status))
+        with self._lock:
+            status_counts = {status.value: count for status, count in self._status_counts.items()}
 
-        failed_tasks = self.get_tasks_by_status(TaskStatus.FAILED)
-        failed_details = [{"id": t.id, "description": t.description, "error": t.error_message}
-                         for t in failed_tasks if not t.should_retry()]
+            failed_details = []
+            if self._status_counts[TaskStatus.FAILED]:
+                failed_details = [{"id": t.id, "description": t.description, "error": t.error_message}
+                                  for t in self.tasks if t.status == TaskStatus.FAILED and not t.should_retry()]
 
-        return {
-            "total_tasks": len(self.tasks),
-            "status_counts": status_counts,
-            "is_complete": self.is_execution_complete(),
-            "failed_tasks": failed_details,
-            "execution_log": self.execution_log[-10:]  # Last 10 events
-        }
+            return {
+                "total_tasks": len(self.tasks),
+                "status_counts": status_counts,
+                "is_complete": self.is_execution_complete(),
+                "failed_tasks": failed_details,
+                "execution_log": self.execution_log[-10:]  # Last 10 events
+            }
 
     def log_event(self, event_type: str, details: Dict[str, Any]):
         """Log execution event"""
-        self.execution_log.append({
-            "timestamp": datetime.now().isoformat(),
-            "event_type": event_type,
-            "details": details
-        })
+        with self._lock:
+            self.execution_log.append({
+                "timestamp": datetime.now().isoformat(),
+                "event_type": event_type,
+                "details": details
+            })
 
     def create_recovery_plan(self) -> List[ExecutionTask]:
         """Create recovery tasks for failed operations"""
@@ -1,18 +1,41 @@
 """
 Utilidades compartidas para los agentes
 """
-from typing import Dict, Any
+import os
+import re
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 
+from .prompts.domain_knowledge import normalize_view_name
 
-def format_schema_for_prompt(schema_info: Dict[str, Any]) -> str:
+# Referencias a vistas dentro de una query: Dir.V_X, [Dir].[V_X], V_X
+_VIEW_REFERENCE_PATTERN = re.compile(r'\[?\bV_[A-Za-z_]+\b\]?')
+
+# Schema renderizado por (versión, vistas, codificación)
+_SCHEMA_RENDER_CACHE: Dict[Tuple[str, Tuple[str, ...], str], str] = {}
+_SCHEMA_RENDER_CACHE_SIZE = 64
+# Los hilos del executor renderizan en paralelo
+_SCHEMA_RENDER_LOCK = threading.Lock()
+
+
+def format_schema_for_prompt(
+    schema_info: Dict[str, Any],
+    table_names: Optional[Iterable[str]] = None,
+    encoding: Optional[str] = None
+) -> str:
     """
     Convierte el schema_info estructurado a formato compacto para los prompts.
 
     Las descripciones detalladas de cada vista están en domain_knowledge.py,
     aquí solo mostramos las columnas técnicas para que el modelo genere queries correctas.
+    El texto se memoiza por (versión del schema, vistas, codificación), así que
+    planner y executor no lo vuelven a renderizar en cada request.
 
     Args:
         schema_info: Diccionario con la información del schema (de get_schema_for_ai())
+        table_names: Vistas a incluir (por defecto todas)
+        encoding: "grouped" agrupa columnas por tipo (menos tokens) o "columns"
+            lista nombre(tipo); por defecto SCHEMA_PROMPT_ENCODING o "grouped"
 
     Returns:
         String con el schema formateado de forma compacta
@@ -20,19 +43,75 @@ def format_schema_for_prompt(schema_info: Dict[str, Any]) -> str:
     if not schema_info or "tables" not in schema_info:
         return ""
 
+    encoding = encoding or os.getenv("SCHEMA_PROMPT_ENCODING", "grouped")
+    tables = schema_info["tables"]
+    if table_names:
+        selected = {normalize_view_name(name) or name for name in table_names}
+        table_keys = tuple(name for name in tables if name in selected)
+    else:
+        table_keys = tuple(tables)
+
+    version = schema_info.get("database_overview", {}).get("version")
+    if not version:
+        return _render_schema(tables, table_keys, encoding)
+
+    cache_key = (version, table_keys, encoding)
+    with _SCHEMA_RENDER_LOCK:
+        rendered = _SCHEMA_RENDER_CACHE.get(cache_key)
+    if rendered is None:
+        # Se renderiza fuera del lock; si dos hilos coinciden, ambos obtienen el mismo texto
+        rendered = _render_schema(tables, table_keys, encoding)
+        with _SCHEMA_RENDER_LOCK:
+            if cache_key not in _SCHEMA_RENDER_CACHE and len(_SCHEMA_RENDER_CACHE) >= _SCHEMA_RENDER_CACHE_SIZE:
+                _SCHEMA_RENDER_CACHE.pop(next(iter(_SCHEMA_RENDER_CACHE)))
+            _SCHEMA_RENDER_CACHE[cache_key] = rendered
+    return rendered
+
+
+def _render_schema(tables: Dict[str, Any], table_keys: Tuple[str, ...], encoding: str) -> str:
+    """Renderiza las columnas de las vistas indicadas"""
     schema_details = "\n🗄️ COLUMNAS DE CADA VISTA:\n"
+    if encoding == "grouped":
+        schema_details += "(columnas agrupadas por tipo)\n"
 
-    for table_name, table_data in schema_info["tables"].items():
+    for table_name in table_keys:
+        table_data = tables[table_name]
         full_name = table_data.get('full_name', table_name)
         rows = table_data.get('estimated_rows', '?')
-
-        # Formato compacto: nombre(tipo) separados por coma
         cols = table_data.get('columns', [])
-        col_list = [f"{c['name']}({c['type']})" for c in cols]
 
         schema_details += f"\n{full_name} ({rows} filas):\n"
-        schema_details += f"  {', '.join(col_list)}\n"
+
+        if encoding == "grouped":
+            # Formato agrupado: tipo: col1, col2 (el tipo se escribe una sola vez)
+            by_type: Dict[str, List[str]] = {}
+            for c in cols:
+                by_type.setdefault(c['type'], []).append(c['name'])
+            for col_type, names in by_type.items():
+                schema_details += f"  {col_type}: {', '.join(names)}\n"
+        else:
+            # Formato compacto: nombre(tipo) separados por coma
+            col_list = [f"{c['name']}({c['type']})" for c in cols]
+            schema_details += f"  {', '.join(col_list)}\n"
 
     # NOTA: Las descripciones conceptuales y relaciones están en domain_knowledge.py
 
     return schema_details
+
+
+def extract_views_from_sql(query: str) -> List[str]:
+    """
+    Extrae las vistas conocidas referenciadas en una query SQL.
+
+    Args:
+        query: Query SQL (puede ser vacía)
+
+    Returns:
+        Lista de nombres canónicos de vista, sin duplicados y en orden de aparición
+    """
+    views = []
+    for match in _VIEW_REFERENCE_PATTERN.findall(query or ""):
+        view = normalize_view_name(match)
+        if view and view not in views:
+            views.append(view)
+    return views
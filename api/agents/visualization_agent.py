@@ -12,6 +12,8 @@ import json
 
 from .base_agent import BaseAgent
 from .prompts.visualization_prompt import ROLE_SETUP, VISUALIZATION_PROMPT_TEMPLATE
+from .prompt_compiler import PromptSection
+from database.columnar import ColumnarResult
 
 
 class VisualizationAgent(BaseAgent):
@@ -39,11 +41,12 @@ class VisualizationAgent(BaseAgent):
             if not structured_results:
                 legacy_data = input_data.get("query_results", [])
                 if legacy_data:
+                    legacy_table = ColumnarResult.from_rows(legacy_data)
                     structured_results = [{
                         "description": "Query results",
-                        "data": legacy_data,
-                        "row_count": len(legacy_data),
-                        "columns": list(legacy_data[0].keys()) if legacy_data else [],
+                        "table": legacy_table,
+                        "row_count": legacy_table.row_count,
+                        "columns": legacy_table.columns,
                         "is_primary": True
                     }]
 
@@ -54,7 +57,7 @@ class VisualizationAgent(BaseAgent):
             dataframes = {}
             for i, result in enumerate(structured_results):
                 df_name = f"df_{i+1}"
-                dataframes[df_name] = pd.DataFrame(result["data"])
+                dataframes[df_name] = result["table"].to_dataframe()
 
             # Generate visualization code - agent decides which dataset(s) to use
             logging.info(f"Generating visualizations - {len(structured_results)} datasets available")
@@ -193,14 +196,46 @@ if 'fig' in locals():
         executive_response: str = ""
     ) -> str:
         """Build prompt with all datasets - agent decides which to visualize"""
+        return self.compile_prompt([
+            self._datasets_section(datasets, user_query, executive_response, sample_rows=3)
+        ])
+
+    def _datasets_section(
+        self,
+        datasets: List[Dict],
+        user_query: str,
+        executive_response: str,
+        sample_rows: int
+    ) -> PromptSection:
+        """Prompt section describing the datasets; it shrinks by dropping sample rows"""
+        def _shrink(section: PromptSection):
+            if sample_rows == 0:
+                return None
+            return self._datasets_section(datasets, user_query, executive_response, sample_rows - 1)
+
+        return PromptSection(
+            "datasets",
+            self._format_datasets_prompt(datasets, user_query, executive_response, sample_rows),
+            required=True,
+            shrink=_shrink
+        )
+
+    def _format_datasets_prompt(
+        self,
+        datasets: List[Dict],
+        user_query: str,
+        executive_response: str,
+        sample_rows: int
+    ) -> str:
+        """Render the visualization prompt with the given number of sample rows per dataset"""
 
         # Build detailed info for each dataset
         datasets_info = []
         for i, dataset in enumerate(datasets):
-            df = pd.DataFrame(dataset["data"])
+            df = dataset["table"].to_dataframe()
             numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
             text_cols = df.select_dtypes(include=['object']).columns.tolist()
-            sample = df.head(3).to_dict('records') if len(df) > 0 else []
+            sample = df.head(sample_rows).to_dict('records') if len(df) > 0 else []
 
             primary_marker = " [RESULTADO PRINCIPAL]" if dataset.get("is_primary") else ""
             datasets_info.append(
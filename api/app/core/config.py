@@ -54,6 +54,14 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRATION_HOURS: int = 2
 
+    # View counts snapshot (home screen)
+    VIEW_COUNTS_TTL: int = 600  # Seconds between background recounts
+    VIEW_COUNTS_MAX_STALE: int = 86400  # Older snapshots are recounted before answering
+    VIEW_COUNTS_SEED_ESTIMATES: bool = False
+
+    # Health probes: seconds a database check is reused
+    HEALTH_CACHE_SECONDS: int = 5
+
     @property
     def cors_origins_list(self) -> List[str]:
         """Parse CORS origins into a list"""
@@ -4,6 +4,7 @@ Main FastAPI application
 import logging
 from pathlib import Path
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
@@ -14,6 +15,11 @@ from dotenv import load_dotenv
 from .core import settings
 from .routes import query_router, auth_router
 from .services.auth_service import get_auth_service
+from .services.orchestrator_service import get_orchestrator_service
+from .services.view_counts import get_view_counts_service
+from database.connection_manager import DatabaseConnectionManager
+from database.async_db import close_async_databases
+from database.connection_pool import close_all_pools, get_connection_pool
 
 # HTTP Basic Auth for /docs protection
 security = HTTPBasic()
@@ -121,9 +127,28 @@ async def startup_event():
     logger.info(f"Auth Mode: {'DEV (bypass)' if settings.AUTH_DEV_MODE else 'SGI Seguridad'}")
     logger.info(f"SGI URL: {settings.SGI_BASE_URL}")
 
+    # Open the pooled DB connections now instead of on the first requests
+    try:
+        DatabaseConnectionManager().pool.warm_up()
+        get_connection_pool(settings.database_url, name="api").warm_up()
+    except Exception as e:
+        logger.warning(f"Connection pool warm-up failed: {str(e)}")
+
+    # Initialize the agents now, so the first query (and readiness) does not wait for it
+    try:
+        await run_in_threadpool(get_orchestrator_service)
+    except Exception as e:
+        logger.warning(f"Orchestrator warm-up failed: {str(e)}")
+
+    # Keep the home screen view counts counted in the background
+    get_view_counts_service().start()
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Shutdown event handler"""
     logger = logging.getLogger(__name__)
     logger.info("SERFOR API shutting down...")
+    get_view_counts_service().stop()
+    close_async_databases()
+    close_all_pools()
@@ -1,4 +1,7 @@
-from .query import QueryRequest, QueryResponse, HealthResponse, ViewCountInfo, ViewCountsResponse
+from .query import (
+    QueryRequest, QueryResponse, HealthResponse, LivenessResponse, ReadinessResponse,
+    ViewCountInfo, ViewCountsResponse
+)
 from .auth import LoginRequest, LoginResponse, UserInfo
 
-__all__ = ["QueryRequest", "QueryResponse", "HealthResponse", "ViewCountInfo", "ViewCountsResponse", "LoginRequest", "LoginResponse", "UserInfo"]
+__all__ = ["QueryRequest", "QueryResponse", "HealthResponse", "LivenessResponse", "ReadinessResponse", "ViewCountInfo", "ViewCountsResponse", "LoginRequest", "LoginResponse", "UserInfo"]
@@ -3,7 +3,7 @@ Pydantic models for API requests and responses
 """
 import re
 from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional, Any, Dict
+from typing import List, Literal, Optional, Any, Dict
 
 
 # Patrones peligrosos a detectar (SQL injection, XSS, path traversal)
@@ -26,6 +26,10 @@ class QueryRequest(BaseModel):
         description="User's natural language query (letters, numbers, spaces, basic punctuation)"
     )
     include_workflow: bool = Field(default=False, description="Include workflow details in response")
+    result_format: Literal["columns", "rows"] = Field(
+        default="columns",
+        description="Result sets as column arrays (columns/types/values) or as one object per row (data)"
+    )
 
     @field_validator('query')
     @classmethod
@@ -43,9 +47,14 @@ class QueryRequest(BaseModel):
 class QueryResultSet(BaseModel):
     """Individual query result set"""
     description: str
-    data: List[Dict[str, Any]] = Field(default=[], max_length=30000)
+    columns: List[str] = Field(default=[])
+    types: Optional[List[str]] = None  # Logical type per column (result_format="columns")
+    values: Optional[List[List[Any]]] = None  # One array per column (result_format="columns")
+    data: Optional[List[Dict[str, Any]]] = Field(default=None, max_length=30000)  # Rows (result_format="rows")
     row_count: int
     is_primary: bool = False
+    truncated: bool = False
+    total_count: Optional[int] = None
 
 
 class QueryResponse(BaseModel):
@@ -54,7 +63,7 @@ class QueryResponse(BaseModel):
     executive_response: str = ""
     final_response: str = ""
     agents_used: List[str] = Field(default=[], max_length=10)
-    data: Optional[List[Dict[str, Any]]] = Field(default=None, max_length=30000)
+    data: Optional[List[Dict[str, Any]]] = Field(default=None, max_length=30000)  # Primary rows (result_format="rows")
     query_results: Optional[List[QueryResultSet]] = Field(default=None, max_length=100)
     visualization_data: Optional[List[Dict[str, Any]]] = Field(default=None, max_length=30000)
     sql_queries: Optional[List[Dict[str, Any]]] = Field(default=None, max_length=100)
@@ -76,7 +85,8 @@ class ViewCountsResponse(BaseModel):
     """Response model for view counts"""
     success: bool
     views: List[ViewCountInfo] = Field(default=[])
-    timestamp: str
+    timestamp: str  # When the counts were taken
+    estimated: bool = False  # Counts are row estimates until the first exact count
 
 
 class HealthResponse(BaseModel):
@@ -84,3 +94,18 @@ class HealthResponse(BaseModel):
     status: str
     database: str
     timestamp: str
+    connection_pools: Optional[Dict[str, Dict[str, Any]]] = None  # Pool stats, by pool name
+
+
+class LivenessResponse(BaseModel):
+    """Liveness probe response (the process is up)"""
+    status: str
+    timestamp: str
+
+
+class ReadinessResponse(BaseModel):
+    """Readiness probe response (database reachable and agents initialized)"""
+    status: str
+    database: str
+    orchestrator: str
+    timestamp: str
@@ -1,21 +1,38 @@
 """
 Query routes for the API
 """
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime
 import time
-import pyodbc
 import logging
 
-from ..models import QueryRequest, QueryResponse, HealthResponse, ViewCountInfo, ViewCountsResponse, UserInfo
-from ..services import get_orchestrator_service, get_wazuh_logger
-from ..core import settings
+from ..models import (
+    QueryRequest, QueryResponse, HealthResponse, LivenessResponse, ReadinessResponse,
+    ViewCountInfo, ViewCountsResponse, UserInfo
+)
+from ..services import (
+    get_health_probe, get_orchestrator_service, get_view_counts_service, get_wazuh_logger,
+    is_orchestrator_service_ready
+)
 from ..dependencies import get_current_user
+from database.connection_pool import get_pool_stats
+from database.timeouts import statement_timeout
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+def _run_query(request: QueryRequest):
+    """Run the agent pipeline (blocking: LLM and database calls) under the /query time limit"""
+    with statement_timeout("query"):
+        return get_orchestrator_service().process_query(
+            query=request.query,
+            include_workflow=request.include_workflow,
+            result_format=request.result_format
+        )
+
+
 @router.post("/query", response_model=QueryResponse)
 async def process_query(
     request: QueryRequest,
@@ -36,11 +53,8 @@ async def process_query(
     start_time = time.time()
 
     try:
-        orchestrator_service = get_orchestrator_service()
-        result = orchestrator_service.process_query(
-            query=request.query,
-            include_workflow=request.include_workflow
-        )
+        # Off the event loop, so other requests are served meanwhile
+        result = await run_in_threadpool(_run_query, request)
 
         response_time_ms = int((time.time() - start_time) * 1000)
 
@@ -105,94 +119,92 @@ async def health_check():
     """
     Health check endpoint to verify API and database connectivity
 
+    The database check is shared by all probes for HEALTH_CACHE_SECONDS.
+
     Returns:
         HealthResponse with status information
     """
-    db_status = "disconnected"
-
-    try:
-        # Test database connection
-        conn = pyodbc.connect(settings.database_url, timeout=5)
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        cursor.fetchone()
-        cursor.close()
-        conn.close()
-        db_status = "connected"
-    except Exception as e:
-        # Log error internally but don't expose details to client
-        logger.error(f"Health check DB error: {str(e)}")
-        db_status = "error"
+    db_status = await get_health_probe().database_status()
 
     return HealthResponse(
         status="healthy" if db_status == "connected" else "degraded",
         database=db_status,
+        timestamp=datetime.now().isoformat(),
+        connection_pools=get_pool_stats()
+    )
+
+
+@router.get("/health/live", response_model=LivenessResponse)
+async def liveness_check():
+    """
+    Liveness probe: the process is up and serving (no database access)
+
+    Returns:
+        LivenessResponse
+    """
+    return LivenessResponse(status="alive", timestamp=datetime.now().isoformat())
+
+
+@router.get("/health/ready", response_model=ReadinessResponse)
+async def readiness_check(response: Response):
+    """
+    Readiness probe: the database answers and the agents are initialized.
+    Responds 503 while not ready, so load balancers hold traffic back.
+
+    Returns:
+        ReadinessResponse
+    """
+    db_status = await get_health_probe().database_status()
+    orchestrator_status = "ready" if is_orchestrator_service_ready() else "not_initialized"
+    ready = db_status == "connected" and orchestrator_status == "ready"
+    if not ready:
+        response.status_code = 503
+
+    return ReadinessResponse(
+        status="ready" if ready else "not_ready",
+        database=db_status,
+        orchestrator=orchestrator_status,
         timestamp=datetime.now().isoformat()
     )
 
 
 @router.get("/views/counts", response_model=ViewCountsResponse)
 async def get_view_counts(
+    request: Request,
+    response: Response,
     current_user: UserInfo = Depends(get_current_user)
 ):
     """
     Get row counts for all available database views
 
+    Served from a snapshot refreshed in the background; the ETag lets
+    clients revalidate with If-None-Match and get a 304 when unchanged.
+
     Returns:
         ViewCountsResponse with counts for each view
     """
-    # Mapping of view names to display names (as shown in the UI)
-    view_mappings = {
-        "V_AUTORIZACION_CTP": "Autorizaciones CTP",
-        "V_AUTORIZACION_DEPOSITO": "Autorizaciones de depósito",
-        "V_AUTORIZACION_DESBOSQUE": "Autorizaciones de desbosque",
-        "V_CAMBIO_USO": "Cambios de uso",
-        "V_TITULOHABILITANTE": "Títulos habilitantes",
-        "V_PLANTACION": "Plantaciones forestales",
-        "V_LICENCIA_CAZA": "Licencias de caza",
-        "V_INFRACTOR": "Infractores"
-    }
-
-    view_counts = []
-
+    service = get_view_counts_service()
     try:
-        conn = pyodbc.connect(settings.database_url, timeout=10)
-        cursor = conn.cursor()
-
-        for view_name, display_name in view_mappings.items():
-            try:
-                # Get count for each view (views are in Dir schema, not dbo)
-                count_query = f"SELECT COUNT(*) FROM Dir.[{view_name}]"
-                result = cursor.execute(count_query).fetchone()
-                count = result[0] if result else 0
-
-                view_counts.append(ViewCountInfo(
-                    view_name=view_name,
-                    display_name=display_name,
-                    count=count
-                ))
-
-            except Exception as e:
-                logger.warning(f"Error getting count for {view_name}: {str(e)}")
-                # Add with count 0 if query fails
-                view_counts.append(ViewCountInfo(
-                    view_name=view_name,
-                    display_name=display_name,
-                    count=0
-                ))
-
-        cursor.close()
-        conn.close()
-
-        return ViewCountsResponse(
-            success=True,
-            views=view_counts,
-            timestamp=datetime.now().isoformat()
-        )
-
+        snapshot = await service.get()
     except Exception as e:
         logger.error(f"Error getting view counts: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail="Error al obtener conteos de vistas"
         )
+
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": f"private, max-age={max(int(service.ttl - snapshot.age()), 0)}, "
+                         f"stale-while-revalidate={service.max_stale}"
+    }
+    if request.headers.get("if-none-match") == snapshot.etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    return ViewCountsResponse(
+        success=True,
+        views=[ViewCountInfo(**view) for view in snapshot.views()],
+        timestamp=datetime.fromtimestamp(snapshot.refreshed_at).isoformat(),
+        estimated=snapshot.estimated
+    )
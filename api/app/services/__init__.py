@@ -1,11 +1,15 @@
-from .orchestrator_service import get_orchestrator_service, OrchestratorService
+from .orchestrator_service import get_orchestrator_service, is_orchestrator_service_ready, OrchestratorService
 from .auth_service import get_auth_service, AuthService
 from .wazuh_logger import get_wazuh_logger, WazuhLogger
 from .jwt_utils import create_token, decode_token
+from .view_counts import get_view_counts_service, ViewCountsService
+from .health import get_health_probe, HealthProbe
 
 __all__ = [
-    "get_orchestrator_service", "OrchestratorService",
+    "get_orchestrator_service", "is_orchestrator_service_ready", "OrchestratorService",
     "get_auth_service", "AuthService",
     "get_wazuh_logger", "WazuhLogger",
-    "create_token", "decode_token"
+    "create_token", "decode_token",
+    "get_view_counts_service", "ViewCountsService",
+    "get_health_probe", "HealthProbe"
 ]
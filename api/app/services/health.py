@@ -0,0 +1,59 @@
+"""
+Health probe - Database check shared by the health endpoints, cached briefly
+so frequent load balancer probes do not each reach the database
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from ..core import settings
+from database.async_db import get_async_database
+from database.timeouts import get_scope_timeout
+
+logger = logging.getLogger(__name__)
+
+
+class HealthProbe:
+    """
+    Result of the last "SELECT 1" on a pooled connection, reused for
+    HEALTH_CACHE_SECONDS. Concurrent probes after it expires share one check.
+    """
+
+    def __init__(self):
+        self.cache_seconds = settings.HEALTH_CACHE_SECONDS
+        self._status: Optional[str] = None
+        self._checked_at = 0.0
+        self._checking: Optional[asyncio.Task] = None
+
+    async def database_status(self) -> str:
+        """"connected" or "error" """
+        if self._status is not None and time.monotonic() - self._checked_at < self.cache_seconds:
+            return self._status
+        if self._checking is None or self._checking.done():
+            self._checking = asyncio.create_task(self._check())
+        return await asyncio.shield(self._checking)
+
+    async def _check(self) -> str:
+        try:
+            database = get_async_database(settings.database_url, name="api")
+            await database.fetchone("SELECT 1", timeout=get_scope_timeout("health"))
+            status = "connected"
+        except Exception as e:
+            # Log error internally but don't expose details to client
+            logger.error(f"Health check DB error: {str(e)}")
+            status = "error"
+        self._status, self._checked_at = status, time.monotonic()
+        return status
+
+
+# Global instance (singleton pattern)
+_health_probe = None
+
+
+def get_health_probe() -> HealthProbe:
+    """Get or create the health probe instance"""
+    global _health_probe
+    if _health_probe is None:
+        _health_probe = HealthProbe()
+    return _health_probe
@@ -5,6 +5,8 @@ from typing import Dict, Any, List
 import json
 
 from agents.orchestrator import AgentOrchestrator
+from database.results import QueryResult
+from database.result_store import result_store_scope
 from utils.logger import init_logger
 
 
@@ -17,17 +19,23 @@ class OrchestratorService:
         self.orchestrator = AgentOrchestrator()
         print("✅ OrchestratorService initialized")
 
-    def process_query(self, query: str, include_workflow: bool = False) -> Dict[str, Any]:
+    def process_query(self, query: str, include_workflow: bool = False, result_format: str = "columns") -> Dict[str, Any]:
         """
         Process a user query through the orchestrator
 
         Args:
             query: User's natural language query
             include_workflow: Whether to include detailed workflow data
+            result_format: "columns" (column arrays) or "rows" (one dict per row)
 
         Returns:
             Dictionary with query results
         """
+        # Result sets of the query live in its result store until the response is built
+        with result_store_scope():
+            return self._process_query(query, include_workflow, result_format)
+
+    def _process_query(self, query: str, include_workflow: bool, result_format: str) -> Dict[str, Any]:
         try:
             self.logger.log_user_query(query)
 
@@ -70,9 +78,10 @@ class OrchestratorService:
             workflow_data = result.get("workflow_data", {})
             execution_results = workflow_data.get("execution_results", [])
 
-            table_data = self._extract_table_data(execution_results)
+            table_data = self._extract_table_data(execution_results, result_format)
             if table_data:
-                response_data["data"] = table_data["primary_data"]
+                if result_format == "rows":
+                    response_data["data"] = table_data["query_results"][-1]["data"]
                 response_data["query_results"] = table_data["query_results"]
 
             # Extract SQL queries
@@ -112,29 +121,38 @@ class OrchestratorService:
                 "agents_used": []
             }
 
-    def _extract_table_data(self, execution_results: List[Dict]) -> Dict[str, Any]:
+    def _extract_table_data(self, execution_results: List[Dict], result_format: str = "columns") -> Dict[str, Any]:
         """
         Extract table data from execution results.
-        Returns primary data (last query) and all query results separately.
+        Returns all query results, the last one marked as primary. Result sets
+        stay columnar unless result_format is "rows"; only then are row dicts built.
         """
         query_results = []
 
         for i, result in enumerate(execution_results):
-            if result.get("status") == "success" and isinstance(result.get("result"), str):
+            if result.get("status") == "success":
                 try:
-                    parsed_result = json.loads(result["result"])
+                    query_result = QueryResult.coerce(result.get("result"))
                     task_desc = result.get("description", result.get("task_description", f"Query {i+1}"))
 
-                    if parsed_result.get("success") and "data" in parsed_result:
-                        data = parsed_result["data"]
-                        if isinstance(data, list) and len(data) > 0:
-                            query_results.append({
+                    if query_result and query_result.success:
+                        table = query_result.table
+                        if table.row_count > 0:
+                            result_set = {
                                 "description": task_desc,
-                                "data": data,
-                                "row_count": len(data),
-                                "is_primary": False
-                            })
-                            print(f"📊 DEBUG - Query '{task_desc}': {len(data)} rows")
+                                "columns": table.columns,
+                                "row_count": table.row_count,
+                                "is_primary": False,
+                                "truncated": query_result.truncated,
+                                "total_count": query_result.total_count
+                            }
+                            if result_format == "rows":
+                                result_set["data"] = table.to_rows()
+                            else:
+                                result_set["types"] = table.types
+                                result_set["values"] = table.values
+                            query_results.append(result_set)
+                            print(f"📊 DEBUG - Query '{task_desc}': {table.row_count} rows")
                 except Exception as e:
                     print(f"❌ DEBUG - Error parsing result: {e}")
                     continue
@@ -144,12 +162,10 @@ class OrchestratorService:
 
         # Mark last query as primary
         query_results[-1]["is_primary"] = True
-        primary_data = query_results[-1]["data"]
 
-        print(f"📊 DEBUG - {len(query_results)} queries extracted, primary has {len(primary_data)} rows")
+        print(f"📊 DEBUG - {len(query_results)} queries extracted, primary has {query_results[-1]['row_count']} rows")
 
         return {
-            "primary_data": primary_data,
             "query_results": query_results
         }
 
@@ -158,25 +174,26 @@ class OrchestratorService:
         sql_queries = []
 
         for result in execution_results:
-            if result.get("status") == "success" and isinstance(result.get("result"), str):
-                try:
-                    parsed_result = json.loads(result["result"])
-                    if "query_executed" in parsed_result:
-                        sql_queries.append({
-                            "query": parsed_result["query_executed"],
-                            "success": parsed_result.get("success", False),
-                            "row_count": parsed_result.get("row_count", 0),
-                            "task_description": result.get("description", result.get("task_description", "SQL Query"))
-                        })
-                    elif "query_attempted" in parsed_result:
-                        sql_queries.append({
-                            "query": parsed_result["query_attempted"],
-                            "success": False,
-                            "error": parsed_result.get("error", "Unknown error"),
-                            "task_description": result.get("description", result.get("task_description", "SQL Query"))
-                        })
-                except Exception:
-                    continue
+            # Successful tasks carry "result"; failed ones the skill "response"
+            query_result = QueryResult.coerce(result.get("result", result.get("response")))
+            if not query_result:
+                continue
+
+            task_description = result.get("description", result.get("task_description", "SQL Query"))
+            if query_result.success and query_result.query_executed:
+                sql_queries.append({
+                    "query": query_result.query_executed,
+                    "success": True,
+                    "row_count": query_result.row_count,
+                    "task_description": task_description
+                })
+            elif query_result.query_attempted:
+                sql_queries.append({
+                    "query": query_result.query_attempted,
+                    "success": False,
+                    "error": query_result.error or "Unknown error",
+                    "task_description": task_description
+                })
 
         return sql_queries if sql_queries else None
 
@@ -204,3 +221,8 @@ def get_orchestrator_service() -> OrchestratorService:
     if _orchestrator_service is None:
         _orchestrator_service = OrchestratorService()
     return _orchestrator_service
+
+
+def is_orchestrator_service_ready() -> bool:
+    """Whether the orchestrator service (agents) has been initialized"""
+    return _orchestrator_service is not None
@@ -0,0 +1,177 @@
+"""
+View counts snapshot - Row counts of the Dir views, kept in memory and
+refreshed in the background instead of counted on every request
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from ..core import settings
+from database.async_db import get_async_database
+from database.timeouts import get_scope_timeout
+
+logger = logging.getLogger(__name__)
+
+# Views shown on the home screen and their display names (as shown in the UI)
+VIEW_DISPLAY_NAMES = {
+    "V_AUTORIZACION_CTP": "Autorizaciones CTP",
+    "V_AUTORIZACION_DEPOSITO": "Autorizaciones de depósito",
+    "V_AUTORIZACION_DESBOSQUE": "Autorizaciones de desbosque",
+    "V_CAMBIO_USO": "Cambios de uso",
+    "V_TITULOHABILITANTE": "Títulos habilitantes",
+    "V_PLANTACION": "Plantaciones forestales",
+    "V_LICENCIA_CAZA": "Licencias de caza",
+    "V_INFRACTOR": "Infractores"
+}
+
+
+@dataclass
+class ViewCountsSnapshot:
+    """Counts of every view at one point in time"""
+    counts: Dict[str, int]
+    refreshed_at: float
+    estimated: bool = False
+    etag: str = field(init=False)
+
+    def __post_init__(self):
+        payload = json.dumps([self.counts, self.estimated], sort_keys=True)
+        self.etag = f'"{hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]}"'
+
+    def age(self) -> float:
+        return time.time() - self.refreshed_at
+
+    def views(self) -> List[Dict]:
+        return [
+            {"view_name": view_name, "display_name": display_name, "count": self.counts.get(view_name, 0)}
+            for view_name, display_name in VIEW_DISPLAY_NAMES.items()
+        ]
+
+
+class ViewCountsService:
+    """
+    In-memory snapshot of the view counts.
+
+    A background task recounts every VIEW_COUNTS_TTL seconds. Requests are
+    answered from the snapshot; once it is older than the TTL the current one
+    is still served while a single recount runs (stale-while-revalidate), and
+    only a snapshot older than VIEW_COUNTS_MAX_STALE makes a request wait. On
+    startup the snapshot can be seeded from the sys.dm_db_partition_stats row
+    estimates (VIEW_COUNTS_SEED_ESTIMATES) until the first exact count ends.
+    """
+
+    def __init__(self):
+        self.ttl = settings.VIEW_COUNTS_TTL
+        self.max_stale = settings.VIEW_COUNTS_MAX_STALE
+        self._snapshot: Optional[ViewCountsSnapshot] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self._background: Optional[asyncio.Task] = None
+
+    @property
+    def database(self):
+        return get_async_database(settings.database_url, name="api")
+
+    async def get(self) -> ViewCountsSnapshot:
+        """Current snapshot (counting first only when there is none usable)"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.age() <= self.max_stale:
+            if snapshot.age() > self.ttl or snapshot.estimated:
+                self._start_refresh()
+            return snapshot
+        # Shielded: a request that goes away must not cancel the recount others wait for
+        return await asyncio.shield(self._start_refresh())
+
+    def _start_refresh(self) -> "asyncio.Task":
+        """Start a recount, or join the one already running"""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self.refresh())
+            self._refreshing.add_done_callback(self._log_failure)
+        return self._refreshing
+
+    @staticmethod
+    def _log_failure(task: "asyncio.Task"):
+        # Background recounts have no caller to raise to; the snapshot is kept
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"View counts refresh failed: {str(task.exception())}")
+
+    async def refresh(self) -> ViewCountsSnapshot:
+        """Count every view and replace the snapshot"""
+        previous = self._snapshot
+        started = time.time()
+
+        def count_views(conn) -> Dict[str, int]:
+            counts = {}
+            cursor = conn.cursor()
+            for view_name in VIEW_DISPLAY_NAMES:
+                try:
+                    # Views are in Dir schema, not dbo
+                    result = cursor.execute(f"SELECT COUNT(*) FROM Dir.[{view_name}]").fetchone()
+                    counts[view_name] = result[0] if result else 0
+                except Exception as e:
+                    logger.warning(f"Error getting count for {view_name}: {str(e)}")
+                    # Keep the last known count of a view that failed (0 if there is none)
+                    counts[view_name] = previous.counts.get(view_name, 0) if previous else 0
+            cursor.close()
+            return counts
+
+        counts = await self.database.run_with_connection(count_views, timeout=get_scope_timeout("view_counts"))
+        self._snapshot = ViewCountsSnapshot(counts=counts, refreshed_at=started)
+        logger.info(f"View counts refreshed in {time.time() - started:.1f}s")
+        return self._snapshot
+
+    async def seed_from_estimates(self):
+        """Fill an empty snapshot with the partition-stats row estimates (indexed views only)"""
+        names = ", ".join(f"'{view_name}'" for view_name in VIEW_DISPLAY_NAMES)
+        query = f"""
+            SELECT o.name, SUM(p.row_count)
+            FROM sys.dm_db_partition_stats p
+            JOIN sys.objects o ON o.object_id = p.object_id
+            JOIN sys.schemas s ON s.schema_id = o.schema_id
+            WHERE s.name = 'Dir' AND o.name IN ({names}) AND p.index_id IN (0, 1)
+            GROUP BY o.name
+        """
+        try:
+            rows = await self.database.fetchall(query, timeout=get_scope_timeout("view_counts"))
+        except Exception as e:
+            logger.warning(f"View count estimates unavailable: {str(e)}")
+            return
+        estimates = {name: int(count) for name, count in rows}
+        if self._snapshot is None and set(estimates) == set(VIEW_DISPLAY_NAMES):
+            self._snapshot = ViewCountsSnapshot(counts=estimates, refreshed_at=time.time(), estimated=True)
+
+    async def _run(self):
+        if settings.VIEW_COUNTS_SEED_ESTIMATES:
+            await self.seed_from_estimates()
+        while True:
+            try:
+                await self._start_refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass  # Logged by _log_failure
+            await asyncio.sleep(self.ttl)
+
+    def start(self):
+        """Start the background refresh (from the app startup)"""
+        if self._background is None:
+            self._background = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._background is not None:
+            self._background.cancel()
+            self._background = None
+
+
+# Global instance (singleton pattern)
+_view_counts_service = None
+
+
+def get_view_counts_service() -> ViewCountsService:
+    """Get or create the view counts service instance"""
+    global _view_counts_service
+    if _view_counts_service is None:
+        _view_counts_service = ViewCountsService()
+    return _view_counts_service
@@ -0,0 +1,540 @@
+"""
+Aggregate Cube - Precomputed counts and sums of the Dir views by their common dimensions
+"""
+import os
+import re
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .columnar import ColumnarResult, column_type
+from .replica import COLLATION, compare_ci_as
+
+DEFAULT_CUBE_PATH = "database/aggregate_cube.sqlite3"
+DEFAULT_MAX_AGE_HOURS = 26  # Nightly warehouse load plus a margin
+
+# Stored in PRAGMA user_version; cubes of another format are ignored until refreshed
+CUBE_FORMAT_VERSION = 2
+
+# Dimensions (department, type, state, year) and summed measures of each view's cube
+CUBE_VIEWS = {
+    "V_AUTORIZACION_CTP": {"dimensions": ["Departamento", "Estado", "YEAR(FechaInicio)"], "measures": []},
+    "V_AUTORIZACION_DEPOSITO": {"dimensions": ["Departamento", "Estado", "YEAR(FechaInicio)"], "measures": []},
+    "V_AUTORIZACION_DESBOSQUE": {
+        "dimensions": ["Departamento", "Situacion", "AnioEmisionAutorizacion"],
+        "measures": ["Superficie"]
+    },
+    "V_CAMBIO_USO": {
+        "dimensions": ["Departamento", "Situacion", "AnioEmisionAutorizacion"],
+        "measures": ["Superficie"]
+    },
+    "V_INFRACTOR": {"dimensions": ["YEAR(FechaResolucion)"], "measures": ["Multa"]},
+    "V_LICENCIA_CAZA": {"dimensions": ["EstadoLicencia", "AnioEmisionLicencia"], "measures": []},
+    "V_PLANTACION": {"dimensions": ["Departamento", "AnioRegistro"], "measures": ["Superficie"]},
+    "V_TITULOHABILITANTE": {
+        "dimensions": ["Departamento", "TipoTh", "Situacion", "AnioEmisionTH"],
+        "measures": ["Superficie"]
+    },
+}
+
+_TOKEN = re.compile(
+    r"\s*(?:(N?'(?:[^']|'')*')|(\d+(?:\.\d+)?)|\[([^\]]+)\]|\"([^\"]+)\"|(\w+)|(<>|!=|[(),.*=;]))",
+    re.UNICODE
+)
+_KEYWORDS = {"SELECT", "FROM", "WHERE", "GROUP", "ORDER", "BY", "AS", "AND", "IN", "ASC", "DESC", "TOP"}
+
+
+def _cube_column(dimension: str) -> str:
+    """Column of a dimension in the cube table (YEAR(FechaX) -> Anio_FechaX)"""
+    match = re.match(r"YEAR\((\w+)\)$", dimension)
+    return f"Anio_{match.group(1)}" if match else dimension
+
+
+@dataclass
+class CubeQuery:
+    """An aggregate query over one view, in the subset the cube can answer"""
+    view: str
+    items: List[Tuple[str, Optional[str], str]] = field(default_factory=list)  # (kind, argument, output name)
+    filters: List[Tuple[str, List[Any]]] = field(default_factory=list)         # (dimension, accepted values)
+    group_by: List[str] = field(default_factory=list)
+    order_by: List[Tuple[int, bool]] = field(default_factory=list)             # (select item index, descending)
+    top: Optional[int] = None
+
+
+class _Parser:
+    """
+    Recursive-descent parser for: SELECT [TOP n] dims / COUNT(*) / SUM(m) /
+    AVG(m) FROM [Dir.]view [alias] [WHERE dim = value | dim IN (...) [AND ...]]
+    [GROUP BY dims] [ORDER BY item [ASC|DESC], ...]. Anything else raises
+    ValueError, and the query runs as usual.
+    """
+
+    def __init__(self, query: str):
+        self.tokens = []
+        position = 0
+        query = query.strip().rstrip(";")
+        while position < len(query.rstrip()):
+            match = _TOKEN.match(query, position)
+            if not match or match.end() == position:
+                raise ValueError("unsupported token")
+            literal, number, bracketed, quoted, word, symbol = match.groups()
+            if literal is not None:
+                self.tokens.append(("value", literal.lstrip("N")[1:-1].replace("''", "'")))
+            elif number is not None:
+                self.tokens.append(("value", float(number) if "." in number else int(number)))
+            elif bracketed is not None or quoted is not None:
+                self.tokens.append(("name", bracketed or quoted))
+            elif word is not None:
+                kind = "keyword" if word.upper() in _KEYWORDS else "name"
+                self.tokens.append((kind, word.upper() if kind == "keyword" else word))
+            else:
+                self.tokens.append(("symbol", symbol))
+            position = match.end()
+        self.position = 0
+
+    def peek(self, offset: int = 0) -> Tuple[str, Any]:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else ("end", None)
+
+    def take(self) -> Tuple[str, Any]:
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def accept(self, kind: str, value: Any = None) -> bool:
+        token = self.peek()
+        if token[0] == kind and (value is None or str(token[1]).upper() == value):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, kind: str, value: Any = None) -> Any:
+        token = self.take()
+        if token[0] != kind or (value is not None and str(token[1]).upper() != value):
+            raise ValueError(f"expected {value or kind}")
+        return token[1]
+
+    def column(self) -> str:
+        """[alias.]column"""
+        name = self.expect("name")
+        if self.accept("symbol", "."):
+            name = self.expect("name")
+        return name
+
+    def dimension(self) -> str:
+        if self.peek()[0] == "name" and self.peek()[1].upper() == "YEAR" and self.peek(1) == ("symbol", "("):
+            self.take()
+            self.take()
+            column = self.column()
+            self.expect("symbol", ")")
+            return f"YEAR({column})"
+        return self.column()
+
+    def item(self) -> Tuple[str, Optional[str], str]:
+        token = self.peek()
+        function = str(token[1]).upper() if token[0] == "name" else None
+        if function in ("COUNT", "SUM", "AVG") and self.peek(1) == ("symbol", "("):
+            self.take()
+            self.take()
+            if function == "COUNT":
+                if not (self.accept("symbol", "*") or self.accept("value", "1")):
+                    raise ValueError("only COUNT(*)")
+                kind, argument = "count", None
+            else:
+                kind, argument = function.lower(), self.column()
+            self.expect("symbol", ")")
+            name = ""
+        else:
+            kind, argument = "dimension", self.dimension()
+            name = "" if argument.startswith("YEAR(") else argument
+        if self.accept("keyword", "AS") or self.peek()[0] in ("name", "value"):
+            alias_kind, alias = self.take()
+            if alias_kind not in ("name", "value") or not isinstance(alias, str):
+                raise ValueError("bad alias")
+            name = alias
+        return kind, argument, name
+
+    def parse(self) -> CubeQuery:
+        self.expect("keyword", "SELECT")
+        top = None
+        if self.accept("keyword", "TOP"):
+            parenthesized = self.accept("symbol", "(")
+            top = self.expect("value")
+            if parenthesized:
+                self.expect("symbol", ")")
+            if not isinstance(top, int):
+                raise ValueError("bad TOP")
+
+        items = [self.item()]
+        while self.accept("symbol", ","):
+            items.append(self.item())
+
+        self.expect("keyword", "FROM")
+        view = self.expect("name")
+        if self.accept("symbol", "."):
+            if view.upper() != "DIR":
+                raise ValueError("not a Dir view")
+            view = self.expect("name")
+        query = CubeQuery(view=view.upper(), items=items, top=top)
+        self.accept("keyword", "AS")
+        if self.peek()[0] == "name":
+            self.take()
+
+        if self.accept("keyword", "WHERE"):
+            while True:
+                dimension = self.dimension()
+                if self.accept("symbol", "="):
+                    values = [self.expect("value")]
+                else:
+                    self.expect("keyword", "IN")
+                    self.expect("symbol", "(")
+                    values = [self.expect("value")]
+                    while self.accept("symbol", ","):
+                        values.append(self.expect("value"))
+                    self.expect("symbol", ")")
+                query.filters.append((dimension, values))
+                if not self.accept("keyword", "AND"):
+                    break
+
+        if self.accept("keyword", "GROUP"):
+            self.expect("keyword", "BY")
+            query.group_by.append(self.dimension())
+            while self.accept("symbol", ","):
+                query.group_by.append(self.dimension())
+
+        if self.accept("keyword", "ORDER"):
+            self.expect("keyword", "BY")
+            while True:
+                query.order_by.append((self.order_item(items), False))
+                if self.accept("keyword", "DESC"):
+                    query.order_by[-1] = (query.order_by[-1][0], True)
+                else:
+                    self.accept("keyword", "ASC")
+                if not self.accept("symbol", ","):
+                    break
+
+        if self.peek()[0] != "end":
+            raise ValueError("trailing tokens")
+        return query
+
+    def order_item(self, items: List[Tuple[str, Optional[str], str]]) -> int:
+        """Index of the select item an ORDER BY term refers to (by alias, position or expression)"""
+        token = self.peek()
+        if token[0] == "value" and isinstance(token[1], int):
+            self.take()
+            if not 1 <= token[1] <= len(items):
+                raise ValueError("bad ORDER BY position")
+            return token[1] - 1
+        if token[0] == "name" and self.peek(1) != ("symbol", "(") and self.peek(1) != ("symbol", "."):
+            for index, (_, _, name) in enumerate(items):
+                if name and name.upper() == token[1].upper():
+                    self.take()
+                    return index
+        kind, argument, _ = self.item()
+        for index, (item_kind, item_argument, _) in enumerate(items):
+            if item_kind == kind and (item_argument or "").upper() == (argument or "").upper():
+                return index
+        raise ValueError("ORDER BY term not in the select list")
+
+
+def parse_cube_query(query: str) -> Optional[CubeQuery]:
+    """Parsed aggregate query, or None if it is outside the subset the cube answers"""
+    try:
+        return _Parser(query).parse()
+    except (ValueError, IndexError):
+        return None
+
+
+class AggregateCube:
+    """
+    Per-view counts, non-NULL counts and sums of the measures, grouped by
+    every dimension of the view (CUBE_VIEWS), in a small SQLite file.
+
+    refresh() recomputes it from SQL Server with one GROUP BY per view (run it
+    after the nightly load, e.g. with scripts/refresh_cube.py). While it is
+    younger than max_age_hours, answer() serves aggregate queries whose
+    filters and groups only use those dimensions by re-aggregating the cube,
+    without scanning the view.
+
+    Answers follow the warehouse semantics: text dimensions use its CI_AS
+    collation (case and trailing spaces ignored, accents not) in filters and
+    groups, and AVG of an integer measure truncates to an integer. Known
+    differences that remain: a text group shows one of its case variants,
+    not necessarily the one SQL Server would pick; text is ordered by base
+    letters and then accents, so Ñ and punctuation can sort differently (a
+    TOP over a text ORDER BY goes to SQL Server); and decimal measures are
+    summed as floats, so SUM / AVG carry float rounding and AVG is not cut
+    to the decimal scale SQL Server returns.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_age_hours: Optional[float] = None):
+        self.path = path or os.getenv("CUBE_PATH", DEFAULT_CUBE_PATH)
+        self.max_age_hours = max_age_hours if max_age_hours is not None else float(
+            os.getenv("CUBE_MAX_AGE_HOURS", str(DEFAULT_MAX_AGE_HOURS))
+        )
+        self.hits = 0
+        # (file mtime, refreshed_at, {view: {"dimensions" / "measures": {name: logical type}}}) of the current cube
+        self._state: Tuple[Optional[float], Optional[float], Dict[str, Dict[str, Dict[str, str]]]] = (None, None, {})
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True)
+        conn.create_collation(COLLATION, compare_ci_as)
+        return conn
+
+    def _load(self) -> Tuple[Optional[float], Dict[str, Dict[str, Dict[str, str]]]]:
+        """Refresh time and dimension / measure types of the cube on disk (re-read when the file changes)"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return None, {}
+        if self._state[0] == mtime:
+            return self._state[1], self._state[2]
+
+        try:
+            conn = self.connect()
+            try:
+                if conn.execute("PRAGMA user_version").fetchone()[0] != CUBE_FORMAT_VERSION:
+                    print("⚠️ Cubo de agregados en un formato anterior, ejecute scripts/refresh_cube.py")
+                    self._state = (mtime, None, {})
+                    return None, {}
+                refreshed_at = conn.execute("SELECT MIN(refreshed_at) FROM cube_views").fetchone()[0]
+                views: Dict[str, Dict[str, Dict[str, str]]] = {}
+                for view, dimension, kind in conn.execute("SELECT view_name, dimension, kind FROM cube_dimensions"):
+                    views.setdefault(view, {"dimensions": {}, "measures": {}})["dimensions"][dimension] = kind
+                for view, measure, kind in conn.execute("SELECT view_name, measure, kind FROM cube_measures"):
+                    views.setdefault(view, {"dimensions": {}, "measures": {}})["measures"][measure] = kind
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Cubo de agregados no disponible: {e}")
+            return None, {}
+        self._state = (mtime, refreshed_at, views)
+        return refreshed_at, views
+
+    def is_fresh(self) -> bool:
+        refreshed_at, _ = self._load()
+        return refreshed_at is not None and (time.time() - refreshed_at) / 3600 <= self.max_age_hours
+
+    def answer(self, query: str, max_rows: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Answer an aggregate query (T-SQL) from the cube, with the same result
+        shape as DatabaseConnectionManager.execute_query.
+
+        Returns:
+            The result, or None if the cube cannot answer the query
+        """
+        parsed = parse_cube_query(query)
+        if parsed is None:
+            return None
+        _, views = self._load()
+        plan = self._plan(parsed, views.get(parsed.view))
+        if plan is None:
+            return None
+        sql, parameters, columns, types = plan
+
+        try:
+            conn = self.connect()
+            try:
+                rows = conn.execute(sql, parameters).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Cubo de agregados no pudo responder la consulta: {e}")
+            return None
+
+        truncated = max_rows is not None and len(rows) > max_rows
+        if truncated:
+            rows = rows[:max_rows]
+        values = [list(column) for column in zip(*rows)] if rows else [[] for _ in columns]
+        table = ColumnarResult(columns, values, types)
+
+        self.hits += 1
+        print(f"🧊 Consulta respondida por el cubo de agregados ({table.row_count} filas)")
+        return {
+            "success": True,
+            "table": table,
+            "columns": columns,
+            "row_count": table.row_count,
+            "truncated": truncated,
+            "memory_capped": False,
+            "cube": True
+        }
+
+    def _plan(self, parsed: CubeQuery, view: Optional[Dict[str, Dict[str, str]]]):
+        """
+        SQL over the cube table for a parsed query, or None if the cube lacks
+        a dimension / measure or its answer could differ from SQL Server's
+        """
+        if not view or not view["dimensions"]:
+            return None
+        dimensions, measure_kinds = view["dimensions"], view["measures"]
+        canonical = {name.upper(): name for name in dimensions}
+        measures = {name.upper(): name for name in measure_kinds}
+
+        def dimension_column(dimension: str) -> Optional[str]:
+            name = canonical.get(dimension.upper())
+            return f'"{_cube_column(name)}"' if name else None
+
+        group_columns = [dimension_column(dimension) for dimension in parsed.group_by]
+        if None in group_columns:
+            return None
+
+        select, columns, types = [], [], []
+        for kind, argument, name in parsed.items:
+            if kind == "dimension":
+                column = dimension_column(argument)
+                if column is None or column not in group_columns:
+                    return None
+                select.append(column)
+                types.append(dimensions[canonical[argument.upper()]])
+            elif kind == "count":
+                select.append("IFNULL(SUM(row_count), 0)")
+                types.append("integer")
+            else:
+                measure = measures.get((argument or "").upper())
+                if measure is None:
+                    return None
+                if kind == "sum":
+                    select.append(f'SUM("{measure}_sum")')
+                else:
+                    # Integer sums divide as integers: AVG of an integer column truncates, as in SQL Server
+                    select.append(f'SUM("{measure}_sum") / NULLIF(SUM("{measure}_count"), 0)')
+                types.append(measure_kinds[measure])
+            columns.append(name)
+
+        # The rows a TOP keeps depend on the text order, which can differ from the warehouse's
+        if parsed.top is not None and any(types[index] == "string" for index, _ in parsed.order_by):
+            return None
+
+        where, parameters = [], []
+        for dimension, values in parsed.filters:
+            column = dimension_column(dimension)
+            if column is None:
+                return None
+            if dimensions[canonical[dimension.upper()]] == "string":
+                # Compared with the column's CI_AS collation; a number would be converted by SQL Server
+                if not all(isinstance(value, str) for value in values):
+                    return None
+            else:
+                if not all(isinstance(value, int) or (isinstance(value, str) and value.strip().isdigit())
+                           for value in values):
+                    return None
+                values = [int(value) for value in values]
+            where.append(f"{column} IN ({', '.join('?' for _ in values)})")
+            parameters.extend(values)
+
+        sql = f'SELECT {", ".join(select)} FROM "cube_{parsed.view}"'
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if group_columns:
+            sql += " GROUP BY " + ", ".join(group_columns)
+        if parsed.order_by:
+            sql += " ORDER BY " + ", ".join(
+                f"{index + 1}{' DESC' if descending else ''}" for index, descending in parsed.order_by
+            )
+        if parsed.top is not None:
+            sql += f" LIMIT {parsed.top}"
+        return sql, parameters, columns, types
+
+    def refresh(self, source_connection) -> Dict[str, int]:
+        """
+        Recompute the cube from a SQL Server connection into a new file, then
+        swap it in (queries keep using the previous cube meanwhile).
+
+        Returns:
+            Cube rows, by view
+        """
+        temp_path = f"{self.path}.tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        counts = {}
+        target = sqlite3.connect(temp_path)
+        try:
+            target.create_collation(COLLATION, compare_ci_as)
+            target.executescript("""
+                CREATE TABLE cube_views (view_name TEXT PRIMARY KEY, refreshed_at REAL);
+                CREATE TABLE cube_dimensions (view_name TEXT, dimension TEXT, kind TEXT);
+                CREATE TABLE cube_measures (view_name TEXT, measure TEXT, kind TEXT);
+            """)
+            for view, definition in CUBE_VIEWS.items():
+                started = time.time()
+                counts[view] = self._build_view(source_connection, target, view, definition)
+                target.execute("INSERT INTO cube_views (view_name, refreshed_at) VALUES (?, ?)", (view, started))
+                print(f"🧊 {view}: {counts[view]} combinaciones en el cubo")
+            target.execute(f"PRAGMA user_version = {CUBE_FORMAT_VERSION}")
+            target.commit()
+        finally:
+            target.close()
+
+        os.replace(temp_path, self.path)
+        return counts
+
+    def _build_view(self, source_connection, target: sqlite3.Connection, view: str, definition: Dict[str, List[str]]) -> int:
+        dimensions, measures = definition["dimensions"], definition["measures"]
+        cursor = source_connection.cursor()
+        try:
+            # Integer measures are summed as integers so their AVG can truncate like SQL Server's
+            measure_kinds = []
+            if measures:
+                cursor.execute(f"SELECT TOP 0 {', '.join(f'[{measure}]' for measure in measures)} FROM Dir.[{view}]")
+                measure_kinds = ["integer" if column_type(column[1]) == "integer" else "number"
+                                 for column in cursor.description]
+
+            select = [f"{dimension} AS [{_cube_column(dimension)}]" for dimension in dimensions]
+            select.append("COUNT_BIG(*) AS row_count")
+            for measure, kind in zip(measures, measure_kinds):
+                select.append(f"COUNT([{measure}]) AS [{measure}_count]")
+                select.append(f"SUM(CAST([{measure}] AS {'BIGINT' if kind == 'integer' else 'FLOAT'})) AS [{measure}_sum]")
+
+            cursor.execute(f"SELECT {', '.join(select)} FROM Dir.[{view}] GROUP BY {', '.join(dimensions)}")
+            rows = [tuple(row) for row in cursor.fetchall()]
+            description = cursor.description
+        finally:
+            cursor.close()
+
+        kinds = [
+            "integer" if dimension.startswith("YEAR(") or column_type(column[1]) == "integer" else "string"
+            for dimension, column in zip(dimensions, description)
+        ]
+        declarations = [f'"{_cube_column(dimension)}" {"INTEGER" if kind == "integer" else f"TEXT COLLATE {COLLATION}"}'
+                        for dimension, kind in zip(dimensions, kinds)]
+        declarations.append("row_count INTEGER")
+        for measure, kind in zip(measures, measure_kinds):
+            declarations += [f'"{measure}_count" INTEGER', f'"{measure}_sum" {"INTEGER" if kind == "integer" else "REAL"}']
+
+        target.execute(f'CREATE TABLE "cube_{view}" ({", ".join(declarations)})')
+        target.executemany(
+            f'INSERT INTO "cube_{view}" VALUES ({", ".join("?" for _ in declarations)})', rows
+        )
+        target.executemany(
+            "INSERT INTO cube_dimensions (view_name, dimension, kind) VALUES (?, ?, ?)",
+            [(view, dimension, kind) for dimension, kind in zip(dimensions, kinds)]
+        )
+        target.executemany(
+            "INSERT INTO cube_measures (view_name, measure, kind) VALUES (?, ?, ?)",
+            [(view, measure, kind) for measure, kind in zip(measures, measure_kinds)]
+        )
+        return len(rows)
+
+    def get_stats(self) -> Dict[str, Any]:
+        refreshed_at, _ = self._load()
+        return {
+            "age_hours": round((time.time() - refreshed_at) / 3600, 2) if refreshed_at is not None else None,
+            "fresh": self.is_fresh(),
+            "hits": self.hits
+        }
+
+
+# Global cube instance
+_global_cube = None
+
+def get_aggregate_cube() -> Optional[AggregateCube]:
+    """Get global cube instance (None unless CUBE_ENABLED is true)"""
+    global _global_cube
+    if os.getenv("CUBE_ENABLED", "false").lower() not in ("true", "1", "yes"):
+        return None
+    if _global_cube is None:
+        _global_cube = AggregateCube()
+    return _global_cube
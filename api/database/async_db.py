@@ -0,0 +1,101 @@
+"""
+Async Database - Awaitable access to pooled connections for async handlers
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from .connection_pool import ConnectionPool, get_connection_pool
+
+T = TypeVar("T")
+
+
+def _execute(conn, query: str, parameters: Optional[List], fetch: Callable[[Any], T]) -> T:
+    cursor = conn.cursor()
+    try:
+        if parameters:
+            cursor.execute(query, parameters)
+        else:
+            cursor.execute(query)
+        return fetch(cursor)
+    finally:
+        cursor.close()
+
+
+class AsyncDatabase:
+    """
+    Runs blocking pyodbc calls off the event loop.
+
+    Every call goes to a thread pool dedicated to one connection pool and
+    sized like it, so a thread never waits for a connection another handler
+    thread holds, and database work does not compete with the default
+    executor. Context variables (e.g. statement timeouts) are carried into
+    the worker thread.
+    """
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self._executor = ThreadPoolExecutor(
+            max_workers=pool.max_size,
+            thread_name_prefix=f"db-{pool.name}"
+        )
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Await func(*args, **kwargs) run on the database threads"""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, func, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    async def run_with_connection(self, func: Callable[[Any], T], timeout: Optional[int] = None) -> T:
+        """Await func(conn) with a pooled connection checked out for the call"""
+        def call():
+            with self.pool.connection() as conn:
+                if timeout is not None:
+                    conn.timeout = timeout
+                return func(conn)
+
+        return await self.run(call)
+
+    async def fetchone(self, query: str, parameters: Optional[List] = None, timeout: Optional[int] = None):
+        """First row of a query (None if it returned no rows)"""
+        return await self.run_with_connection(
+            lambda conn: _execute(conn, query, parameters, lambda cursor: cursor.fetchone()), timeout
+        )
+
+    async def fetchall(self, query: str, parameters: Optional[List] = None, timeout: Optional[int] = None) -> List[Any]:
+        """All rows of a query"""
+        return await self.run_with_connection(
+            lambda conn: _execute(conn, query, parameters, lambda cursor: cursor.fetchall()), timeout
+        )
+
+    def close(self):
+        """Stop the database threads (running calls are not waited for)"""
+        self._executor.shutdown(wait=False)
+
+
+# Global instances, one per connection string
+_databases: Dict[str, AsyncDatabase] = {}
+_databases_lock = threading.Lock()
+
+def get_async_database(connection_string: str, name: str = "default") -> AsyncDatabase:
+    """Get the global async database for a connection string (backed by its connection pool)"""
+    with _databases_lock:
+        database = _databases.get(connection_string)
+        if database is None:
+            database = _databases[connection_string] = AsyncDatabase(
+                get_connection_pool(connection_string, name=name)
+            )
+        return database
+
+
+def close_async_databases():
+    """Stop the threads of every async database (e.g. at shutdown)"""
+    with _databases_lock:
+        databases = list(_databases.values())
+        _databases.clear()
+    for database in databases:
+        database.close()
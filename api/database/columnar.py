@@ -0,0 +1,198 @@
+"""
+Columnar Results - Result sets as column names plus one value array per column
+"""
+import sys
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Logical column types reported to clients, by the Python type pyodbc gives in cursor.description
+_COLUMN_TYPES = [
+    (bool, "boolean"),
+    (int, "integer"),
+    (float, "number"),
+    (Decimal, "number"),
+    (datetime, "datetime"),
+    (date, "date"),
+    (time, "time"),
+    (str, "string"),
+    (bytes, "binary"),
+    (bytearray, "binary"),
+]
+
+
+def column_type(type_code: Any) -> str:
+    """Logical type of a column from its cursor.description type code"""
+    if isinstance(type_code, type):
+        for python_type, name in _COLUMN_TYPES:
+            if issubclass(type_code, python_type):
+                return name
+    return "unknown"
+
+
+def serialize_value(value: Any) -> Any:
+    """Convert one non-JSON serializable value (for columns of unknown type)"""
+    if isinstance(value, Decimal):
+        return float(value)
+    elif isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def column_converter(type_code: Any) -> Optional[Callable[[Any], Any]]:
+    """
+    Converter for every value of a column, from its cursor.description type
+    code: None when the driver values are already JSON-compatible.
+    """
+    if not isinstance(type_code, type):
+        return serialize_value
+    if issubclass(type_code, Decimal):
+        return float
+    # datetime first: date.isoformat would drop the time of a datetime
+    if issubclass(type_code, datetime):
+        return datetime.isoformat
+    if issubclass(type_code, date):
+        return date.isoformat
+    if issubclass(type_code, (bool, int, float, str)):
+        return None
+    return serialize_value
+
+
+def convert_column(values: Sequence[Any], converter: Optional[Callable[[Any], Any]]) -> Sequence[Any]:
+    """Apply a column converter to a batch of values, leaving NULLs as None"""
+    if converter is None:
+        return values
+    try:
+        return list(map(converter, values))
+    except TypeError:
+        # The column has NULLs: float(None) / isoformat(None) fail, convert value by value
+        return [None if value is None else converter(value) for value in values]
+
+
+@dataclass
+class ColumnarResult:
+    """
+    A result set stored by column.
+
+    `values[i]` holds every value of `columns[i]`, so column names are kept
+    once instead of once per row. Row dicts are only built on request
+    (to_rows), e.g. at the API edge for clients that want them. Results read
+    by the Arrow fetch engine keep only their Arrow table (values=None) plus
+    a converter: to_dataframe uses the table directly, to_rows converts just
+    the requested rows and `values` is built from the table on first access.
+    """
+    columns: List[str]
+    values: Optional[List[List[Any]]]
+    types: List[str] = field(default_factory=list)
+    arrow: Any = field(default=None, repr=False, compare=False)
+    arrow_converter: Optional[Callable[[Any], List[Any]]] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.values is None:
+            # Built by __getattr__ from the Arrow table when first read
+            del self.values
+
+    def __getattr__(self, name: str) -> Any:
+        if name != "values" or self.__dict__.get("arrow") is None:
+            raise AttributeError(name)
+        self.values = [self.arrow_converter(column) for column in self.arrow.columns]
+        return self.values
+
+    @property
+    def is_lazy(self) -> bool:
+        """True while the Python values have not been built from the Arrow table"""
+        return "values" not in self.__dict__
+
+    @classmethod
+    def empty(cls, columns: Sequence[str], types: Optional[List[str]] = None) -> "ColumnarResult":
+        return cls(list(columns), [[] for _ in columns], list(types or []))
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]], columns: Optional[List[str]] = None) -> "ColumnarResult":
+        """Build from row dicts (legacy payloads); columns default to the first row's keys"""
+        if columns is None:
+            columns = list(rows[0].keys()) if rows else []
+        return cls(list(columns), [[row.get(name) for row in rows] for name in columns])
+
+    @property
+    def row_count(self) -> int:
+        if self.is_lazy:
+            return self.arrow.num_rows
+        return len(self.values[0]) if self.values else 0
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def extend(self, column_batches: Sequence[Sequence[Any]]):
+        """Append a batch given as one sequence per column"""
+        for values, batch in zip(self.values, column_batches):
+            values.extend(batch)
+        self.arrow = None
+
+    def truncate(self, row_count: int):
+        """Drop the rows past row_count, in place"""
+        if not self.is_lazy:
+            for values in self.values:
+                del values[row_count:]
+        if self.arrow is not None:
+            self.arrow = self.arrow.slice(0, row_count)
+
+    def head(self, row_count: int) -> "ColumnarResult":
+        """First rows as a new result (the column lists are sliced, values shared)"""
+        if self.is_lazy:
+            return ColumnarResult(self.columns, None, self.types, self.arrow.slice(0, row_count), self.arrow_converter)
+        arrow = self.arrow.slice(0, row_count) if self.arrow is not None else None
+        return ColumnarResult(
+            self.columns, [values[:row_count] for values in self.values], self.types, arrow, self.arrow_converter
+        )
+
+    def column(self, name: str) -> List[Any]:
+        return self.values[self.columns.index(name)]
+
+    def to_rows(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Rows as dicts (column name -> value)"""
+        columns = self.columns
+        if self.is_lazy:
+            start, stop, _ = slice(start, stop).indices(self.arrow.num_rows)
+            window = self.arrow.slice(start, max(stop - start, 0))
+            sliced = [self.arrow_converter(column) for column in window.columns]
+        else:
+            sliced = [values[start:stop] for values in self.values]
+        return [dict(zip(columns, row)) for row in zip(*sliced)]
+
+    def to_dataframe(self):
+        """pandas DataFrame with one column per result column"""
+        import pandas as pd
+
+        if self.arrow is not None:
+            return self.arrow.to_pandas()
+
+        df = pd.DataFrame({index: values for index, values in enumerate(self.values)})
+        df.columns = self.columns
+        return df
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-compatible columnar form"""
+        return {"columns": self.columns, "types": self.types, "values": self.values}
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> "ColumnarResult":
+        return cls(list(payload.get("columns") or []), payload.get("values") or [], list(payload.get("types") or []))
+
+    def estimate_bytes(self, samples: int = 8) -> int:
+        """
+        Approximate memory of the values, extrapolated from a few sampled
+        cells per column (the Arrow buffers while no values were built)
+        """
+        if self.is_lazy:
+            return self.arrow.nbytes
+        total = 0
+        for values in self.values:
+            if not values:
+                continue
+            step = max(len(values) // samples, 1)
+            sampled = values[::step][:samples]
+            # List slot (8 bytes) plus the value object itself
+            total += len(values) * (8 + sum(sys.getsizeof(value) for value in sampled) // len(sampled))
+        return total
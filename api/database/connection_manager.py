@@ -1,32 +1,63 @@
 """
 Database Connection Manager - Handles SQL Server connections
 """
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Iterator, Optional, List, Tuple
 import os
+import re
 from dotenv import load_dotenv
-from decimal import Decimal
-from datetime import datetime, date
 import json
+import threading
+from .aggregate_cube import get_aggregate_cube
+from .arrow_fetch import ENGINE_ARROW, ENGINE_PYODBC, arrow_available, enable_connection_pooling, fetch_arrow
+from .columnar import ColumnarResult, column_converter, column_type, convert_column
+from .connection_pool import ConnectionPool, get_connection_pool
+from .query_cache import get_query_cache
+from .replica import get_replica
+from .query_cost import CostLimits, PlanEstimate, parse_showplan
+from .results import ErrorClass, classify_error
+from .sql_validator import SQLValidator, statement_kind
+from .timeouts import current_statement_timeout, statement_timeout
 
 load_dotenv()
 
+# Maximum rows returned per query (the API response cannot carry more anyway)
+DEFAULT_MAX_ROWS = 30000
+
+# Rows fetched and converted per round trip, and memory a single result may take
+DEFAULT_FETCH_BATCH_SIZE = 2000
+DEFAULT_MAX_RESULT_MB = 256
+
+# Set operations: TOP on the first SELECT would only limit that branch
+_SET_OPERATION = re.compile(r'\b(UNION|EXCEPT|INTERSECT)\b', re.IGNORECASE)
+_ORDER_BY = re.compile(r'\bORDER\s+BY\b', re.IGNORECASE)
+_LEADING_WITH = re.compile(r'^\s*;?\s*WITH\b', re.IGNORECASE)
+_SELECT = re.compile(r'\bSELECT\b', re.IGNORECASE)
+_OFFSET_FETCH = re.compile(r'\bOFFSET\s+\d+\s+ROWS?\b', re.IGNORECASE)
+_LEADING_TOP = re.compile(
+    r'^(\s*SELECT\s+(?:DISTINCT\s+|ALL\s+)?)TOP\s*\(?\s*(\d+)\s*\)?(\s+PERCENT)?',
+    re.IGNORECASE
+)
+
 class DatabaseConnectionManager:
     """Manages database connections and basic operations"""
 
     def __init__(self):
         self.connection_config = self._load_default_config()
         self.connection = None
-
-    def _serialize_value(self, value):
-        """Convert non-JSON serializable types to serializable ones"""
-        if isinstance(value, Decimal):
-            return float(value)
-        elif isinstance(value, (datetime, date)):
-            return value.isoformat()
-        elif value is None:
-            return None
-        else:
-            return value
+        self.max_rows = int(os.getenv("DB_MAX_ROWS", str(DEFAULT_MAX_ROWS)))
+        self.fetch_batch_size = int(os.getenv("DB_FETCH_BATCH_SIZE", str(DEFAULT_FETCH_BATCH_SIZE)))
+        self.max_result_bytes = int(float(os.getenv("DB_MAX_RESULT_MB", str(DEFAULT_MAX_RESULT_MB))) * 1024 * 1024)
+        self.fetch_engine = os.getenv("DB_FETCH_ENGINE", ENGINE_PYODBC).lower()
+        if self.fetch_engine == ENGINE_ARROW and not arrow_available():
+            print("⚠️ DB_FETCH_ENGINE=arrow requiere arrow-odbc y pyarrow, se usa pyodbc")
+            self.fetch_engine = ENGINE_PYODBC
+        if self.fetch_engine == ENGINE_ARROW:
+            enable_connection_pooling()
+        self.cost_limits = CostLimits.from_env()
+        self.query_cache = get_query_cache()
+        self.replica = get_replica()
+        self.cube = get_aggregate_cube()
+        self.sql_validator = SQLValidator()
 
     def _load_default_config(self) -> Dict[str, str]:
         """Load default connection configuration"""
@@ -56,6 +87,11 @@ class DatabaseConnectionManager:
         ]
         return ";".join(parts)
 
+    @property
+    def pool(self) -> ConnectionPool:
+        """Connection pool for the current configuration"""
+        return get_connection_pool(self.get_connection_string(), name="queries")
+
     def test_connection(self) -> Dict[str, Any]:
         """Test database connection"""
         try:
@@ -67,8 +103,7 @@ class DatabaseConnectionManager:
             }
 
         try:
-            conn_str = self.get_connection_string()
-            with pyodbc.connect(conn_str, timeout=10) as conn:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT 1 as test")
                 result = cursor.fetchone()
@@ -85,54 +120,95 @@ class DatabaseConnectionManager:
                 "error": str(e)
             }
 
-    def execute_query(self, query: str, parameters: Optional[List] = None) -> Dict[str, Any]:
+    def execute_query(
+        self,
+        query: str,
+        parameters: Optional[List] = None,
+        max_rows: Optional[int] = None,
+        timeout: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
         Execute a SQL query safely
 
         Args:
             query: SQL query string
             parameters: Optional parameters for parameterized queries
+            max_rows: Fetch at most this many rows; "truncated" is set if there were more
+                (or if the result reached the DB_MAX_RESULT_MB memory ceiling first)
+            timeout: Seconds before the statement is cancelled (defaults to the
+                limit of the current endpoint / stage, see database.timeouts)
 
         Returns:
             Dictionary with results or error information
         """
-        try:
-            import pyodbc
-        except ImportError:
-            return {
-                "success": False,
-                "error": "pyodbc not installed"
-            }
+        if timeout is None:
+            timeout = current_statement_timeout()
+
+        # Parameterized statements always go through pyodbc; reads include WITH ... SELECT
+        if self.fetch_engine == ENGINE_ARROW and not parameters and statement_kind(query) == "SELECT":
+            return self._execute_arrow(query, max_rows, timeout)
+
+        # A missing pyodbc surfaces from the pool when it opens a connection
+        watchdog = None
 
         try:
-            conn_str = self.get_connection_string()
-            with pyodbc.connect(conn_str) as conn:
+            with self.pool.connection() as conn:
+                conn.timeout = timeout
                 cursor = conn.cursor()
-
-                if parameters:
-                    cursor.execute(query, parameters)
-                else:
-                    cursor.execute(query)
+                watchdog = _StatementWatchdog(cursor, timeout)
+
+                # The watchdog cancels the statement if executing + fetching outlasts the limit
+                with watchdog:
+                    if parameters:
+                        cursor.execute(query, parameters)
+                    else:
+                        cursor.execute(query)
+
+                    # A result set (SELECT, WITH ... SELECT) has a description; writes do not
+                    is_select = cursor.description is not None
+                    if is_select:
+                        # Fetch results for SELECT queries into columns, converting each batch as it arrives
+                        description = cursor.description or []
+                        table = ColumnarResult.empty(
+                            [column[0] for column in description],
+                            [column_type(column[1]) for column in description]
+                        )
+                        # One converter per column, picked once from the driver type codes
+                        converters = [column_converter(column[1]) for column in description]
+                        result_bytes = 0
+                        memory_capped = False
+                        for batch in self._fetch_batches(cursor, max_rows):
+                            converted = ColumnarResult(table.columns, [
+                                convert_column(values, converter)
+                                for values, converter in zip(zip(*batch), converters)
+                            ])
+                            del batch
+                            table.extend(converted.values)
+                            result_bytes += converted.estimate_bytes()
+                            if result_bytes > self.max_result_bytes:
+                                # Stop fetching; the rest of the result is discarded with the cursor
+                                memory_capped = True
+                                break
+                        # Discards any rows left unread on the server side of the pooled connection
+                        cursor.close()
 
                 # Handle different query types
-                if query.strip().upper().startswith('SELECT'):
-                    # Fetch results for SELECT queries
-                    columns = [column[0] for column in cursor.description] if cursor.description else []
-                    rows = cursor.fetchall()
-
-                    # Convert to list of dictionaries with proper serialization
-                    results = []
-                    for row in rows:
-                        row_dict = {}
-                        for i, value in enumerate(row):
-                            row_dict[columns[i]] = self._serialize_value(value)
-                        results.append(row_dict)
+                if is_select:
+                    truncated = memory_capped
+                    if max_rows is not None and table.row_count > max_rows:
+                        truncated = True
+                        table.truncate(max_rows)
+                    if memory_capped:
+                        print(f"⚠️ Resultado detenido en {table.row_count} filas por el límite de memoria "
+                              f"({self.max_result_bytes // (1024 * 1024)} MB)")
 
                     return {
                         "success": True,
-                        "data": results,
-                        "columns": columns,
-                        "row_count": len(results)
+                        "table": table,
+                        "columns": table.columns,
+                        "row_count": table.row_count,
+                        "truncated": truncated,
+                        "memory_capped": memory_capped
                     }
                 else:
                     # For non-SELECT queries
@@ -144,25 +220,267 @@ class DatabaseConnectionManager:
                     }
 
         except Exception as e:
+            if (watchdog and watchdog.fired) or _is_statement_timeout(str(e)):
+                return {
+                    "success": False,
+                    "error": f"Statement timeout: query cancelled after {timeout}s ({e})"
+                }
             return {
                 "success": False,
                 "error": str(e)
             }
 
-    def execute_query_safely(self, query: str) -> Dict[str, Any]:
+    def _execute_arrow(self, query: str, max_rows: Optional[int], timeout: Optional[int]) -> Dict[str, Any]:
+        """Execute a SELECT with the Arrow fetch engine (same result shape as execute_query)"""
+        try:
+            fetched = fetch_arrow(
+                query,
+                self.get_connection_string(),
+                batch_size=self.fetch_batch_size,
+                max_rows=max_rows,
+                max_result_bytes=self.max_result_bytes,
+                timeout=timeout,
+                login_timeout=self.pool.login_timeout
+            )
+        except Exception as e:
+            if _is_statement_timeout(str(e)):
+                return {
+                    "success": False,
+                    "error": f"Statement timeout: query cancelled after {timeout}s ({e})"
+                }
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+        table = fetched["table"]
+        if fetched["memory_capped"]:
+            print(f"⚠️ Resultado detenido en {table.row_count} filas por el límite de memoria "
+                  f"({self.max_result_bytes // (1024 * 1024)} MB)")
+        return {
+            "success": True,
+            "table": table,
+            "columns": table.columns,
+            "row_count": table.row_count,
+            "truncated": fetched["truncated"],
+            "memory_capped": fetched["memory_capped"]
+        }
+
+    def _fetch_batches(self, cursor, max_rows: Optional[int] = None) -> Iterator[List[Any]]:
+        """
+        Yield the rows of the open result set in batches of fetch_batch_size.
+
+        With max_rows, at most max_rows + 1 rows are fetched: the extra row
+        tells the caller the result was cut.
+        """
+        remaining = max_rows + 1 if max_rows is not None else None
+        while remaining is None or remaining > 0:
+            size = self.fetch_batch_size if remaining is None else min(self.fetch_batch_size, remaining)
+            batch = cursor.fetchmany(size)
+            if not batch:
+                return
+            if remaining is not None:
+                remaining -= len(batch)
+            yield batch
+
+    def execute_query_safely(self, query: str, max_rows: Optional[int] = None) -> Dict[str, Any]:
         """
-        Execute query with SQL Server syntax conversion (no row limits)
+        Execute query with SQL Server syntax conversion, a row cap and cost limits.
+
+        A TOP (cap + 1) is injected when the query has no tighter TOP, so the
+        server stops early too. If the cap is hit, the result is marked
+        "truncated" and a COUNT over the uncapped query gives "total_count".
+        Before running, the estimated plan is checked against the cost limits
+        (DB_MAX_ESTIMATED_COST, DB_MAX_ESTIMATED_ROWS). Successful results are
+        kept in the shared query cache, keyed by the normalized SQL. While the
+        aggregate cube and the local replica are fresh, queries they can answer
+        are served from them instead (the cube first).
 
         Args:
             query: SQL query
+            max_rows: Row cap (defaults to DB_MAX_ROWS)
 
         Returns:
             Query results
         """
         # Convert MySQL/PostgreSQL syntax to SQL Server (LIMIT -> TOP)
         query = self._convert_to_sqlserver_syntax(query)
+        row_cap = max_rows or self.max_rows
 
-        return self.execute_query(query)
+        if self.query_cache:
+            cached = self.query_cache.get(query, row_cap)
+            if cached is not None:
+                print(f"💾 Resultado desde caché ({cached.get('row_count', 0)} filas)")
+                cached["cached"] = True
+                return cached
+
+        if self.cube and self.cube.is_fresh():
+            result = self.cube.answer(query, max_rows=row_cap)
+            if result is not None:
+                return result
+
+        capped_query = self._apply_row_cap(query, row_cap)
+
+        if self.replica and self.replica.is_fresh():
+            result = self.replica.execute(capped_query, max_rows=row_cap, timeout=current_statement_timeout())
+            if result is not None:
+                if result.get("success") and result.get("truncated"):
+                    result["row_cap"] = row_cap
+                    result["total_count"] = self.replica.count_rows(query)
+                return result
+
+        if self.cost_limits.enabled:
+            check = self._enforce_cost_limits(capped_query, row_cap)
+            if not check["success"]:
+                return check
+            capped_query = check["query"]
+
+        result = self.execute_query(capped_query, max_rows=row_cap)
+
+        if result.get("success") and result.get("truncated"):
+            result["row_cap"] = row_cap
+            result["total_count"] = self._count_rows(query, len(result["columns"]))
+            print(f"✂️ Resultado truncado a {row_cap} filas (total: {result['total_count']})")
+
+        if self.query_cache and result.get("success"):
+            self.query_cache.put(query, row_cap, result)
+
+        return result
+
+    def estimate_query_cost(self, query: str) -> Dict[str, Any]:
+        """
+        Get the optimizer estimates of a query without executing it
+
+        Args:
+            query: SQL query
+
+        Returns:
+            Dictionary with the PlanEstimate ("estimate") or error information
+        """
+        try:
+            with statement_timeout("estimate") as timeout, self.pool.connection() as conn:
+                conn.timeout = timeout
+                cursor = conn.cursor()
+                # SHOWPLAN_XML must be alone in its batch; while it is on, statements are compiled, not run
+                cursor.execute("SET SHOWPLAN_XML ON")
+                try:
+                    cursor.execute(query)
+                    row = cursor.fetchone()
+                finally:
+                    try:
+                        cursor.execute("SET SHOWPLAN_XML OFF")
+                    except Exception:
+                        # Never hand a session still in SHOWPLAN mode back to the pool
+                        conn.close()
+                        raise
+
+            estimate = parse_showplan(row[0]) if row else None
+            if estimate is None:
+                return {
+                    "success": False,
+                    "error": "No estimated plan returned"
+                }
+            return {
+                "success": True,
+                "estimate": estimate
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    def _enforce_cost_limits(self, query: str, row_cap: int) -> Dict[str, Any]:
+        """
+        Check the estimated plan of a query against the cost limits.
+
+        Queries above the cost limit are rejected. Queries above the row limit
+        (only possible when no TOP could be injected, e.g. UNION or a CTE) are
+        wrapped in an outer TOP; when they cannot be (ORDER BY, unnamed or
+        repeated columns) they run as they are and the fetch cap of
+        execute_query stops reading after the cap. Compile errors are
+        returned right away; if the plan cannot be fetched for another reason
+        the query runs unchecked.
+
+        Returns:
+            {"success": True, "query": query to run} or a failed query result
+        """
+        estimation = self.estimate_query_cost(query)
+        if not estimation["success"]:
+            error = estimation["error"]
+            if classify_error(error) in (ErrorClass.INVALID_IDENTIFIER, ErrorClass.SYNTAX):
+                return {"success": False, "error": error}
+            print(f"⚠️ Plan estimado no disponible, se ejecuta sin control de costo: {error}")
+            return {"success": True, "query": query}
+
+        estimate = estimation["estimate"]
+        print(f"📐 Plan estimado: {estimate.describe()}")
+
+        if self.cost_limits.exceeds_cost(estimate):
+            return self._cost_rejection(estimate, f"exceeds the limit of {self.cost_limits.max_cost:g}")
+
+        if self.cost_limits.exceeds_rows(estimate):
+            # An ORDER BY cannot go inside a derived table; the fetch cap still stops reading
+            if not _find_top_level(query, _ORDER_BY):
+                ctes, statement = _split_ctes(query.strip().rstrip(';'))
+                wrapped_query = f"{ctes}SELECT TOP {row_cap + 1} * FROM ({statement}) AS capped_query"
+                # Unnamed or repeated columns make the wrapper invalid
+                if self.estimate_query_cost(wrapped_query)["success"]:
+                    print(f"✂️ Consulta envuelta en TOP {row_cap + 1} por filas estimadas")
+                    return {"success": True, "query": wrapped_query}
+            print(f"⚠️ Consulta con {estimate.estimated_rows:,.0f} filas estimadas, "
+                  f"se limita la lectura a {row_cap + 1} filas")
+
+        return {"success": True, "query": query}
+
+    def _cost_rejection(self, estimate: PlanEstimate, reason: str) -> Dict[str, Any]:
+        """Failed result for a query stopped by the cost limits"""
+        hint = "add the missing JOIN condition" if estimate.no_join_predicate else "add filters or aggregate"
+        return {
+            "success": False,
+            "error": f"Query rejected by plan estimate ({estimate.describe()}): query {reason}; {hint}"
+        }
+
+    def _apply_row_cap(self, query: str, row_cap: int) -> str:
+        """
+        Inject TOP (row_cap + 1) unless the query already has a TOP within the cap.
+
+        Set operations, OFFSET/FETCH pages and TOP ... PERCENT are left as
+        they are; the fetch limit in execute_query still caps them.
+        """
+        if _find_top_level(query, _SET_OPERATION) or _find_top_level(query, _OFFSET_FETCH):
+            return query
+
+        existing = _LEADING_TOP.match(query)
+        if existing:
+            if existing.group(3) or int(existing.group(2)) <= row_cap:
+                return query
+            return _LEADING_TOP.sub(lambda m: f"{m.group(1)}TOP {row_cap + 1}", query, count=1)
+
+        return self._add_top_clause(query, row_cap + 1)
+
+    def _count_rows(self, query: str, column_count: int) -> Optional[int]:
+        """
+        Total rows of a query, or None if the COUNT could not run.
+
+        The query is counted as a derived table whose columns are renamed
+        (c1..cN), so unnamed expressions and repeated names from SELECT *
+        across a JOIN are valid; CTEs stay in front of the outer SELECT.
+        """
+        order_by = _find_top_level(query, _ORDER_BY)
+        inner_query = query[:order_by.start()] if order_by else query
+        ctes, statement = _split_ctes(inner_query.strip().rstrip(';'))
+        column_names = ", ".join(f"c{index}" for index in range(1, column_count + 1))
+
+        with statement_timeout("count"):
+            result = self.execute_query(
+                f"{ctes}SELECT COUNT_BIG(*) AS total_count FROM ({statement}) AS capped_query ({column_names})"
+            )
+        if result.get("success") and result["row_count"]:
+            return int(result["table"].values[0][0])
+        print(f"⚠️ No se pudo contar el total de filas: {result.get('error')}")
+        return None
 
     def _convert_to_sqlserver_syntax(self, query: str) -> str:
         """
@@ -234,10 +552,10 @@ class DatabaseConnectionManager:
         query = f"SELECT COUNT(*) as row_count FROM [{schema}].[{table}]"
         result = self.execute_query(query)
 
-        if result["success"] and result["data"]:
+        if result["success"] and result["row_count"]:
             return {
                 "success": True,
-                "count": result["data"][0]["row_count"]
+                "count": result["table"].column("row_count")[0]
             }
         else:
             return result
@@ -252,38 +570,7 @@ class DatabaseConnectionManager:
         Returns:
             Validation result
         """
-        try:
-            # Basic syntax validation
-            query = query.strip()
-
-            # Check for dangerous operations
-            dangerous_keywords = ['DROP', 'DELETE', 'TRUNCATE', 'ALTER', 'UPDATE', 'INSERT']
-            query_upper = query.upper()
-
-            for keyword in dangerous_keywords:
-                if keyword in query_upper:
-                    return {
-                        "valid": False,
-                        "error": f"Query contains potentially dangerous operation: {keyword}"
-                    }
-
-            # Check if it's a SELECT query
-            if not query_upper.startswith('SELECT'):
-                return {
-                    "valid": False,
-                    "error": "Only SELECT queries are allowed"
-                }
-
-            return {
-                "valid": True,
-                "message": "Query syntax appears valid"
-            }
-
-        except Exception as e:
-            return {
-                "valid": False,
-                "error": f"Validation error: {str(e)}"
-            }
+        return self.sql_validator.validate(query).to_dict()
 
     def get_connection_info(self) -> Dict[str, Any]:
         """Get sanitized connection information"""
@@ -291,4 +578,80 @@ class DatabaseConnectionManager:
         # Remove sensitive information
         if 'password' in info:
             info['password'] = '***'
-        return info
\ No newline at end of file
+        return info
+
+
+class _StatementWatchdog:
+    """Cancels a cursor's statement once its time limit passes (0 = no limit)"""
+
+    def __init__(self, cursor, timeout: int):
+        self.fired = False
+        self._cursor = cursor
+        self._timer = threading.Timer(timeout, self._cancel) if timeout > 0 else None
+        if self._timer:
+            self._timer.daemon = True
+
+    def _cancel(self):
+        self.fired = True
+        try:
+            self._cursor.cancel()
+        except Exception:
+            pass
+
+    def __enter__(self) -> "_StatementWatchdog":
+        if self._timer:
+            self._timer.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._timer:
+            self._timer.cancel()
+
+
+def _is_statement_timeout(message: str) -> bool:
+    """Driver-side query timeout or cancellation (login timeouts are connection errors)"""
+    return classify_error(message) is ErrorClass.TIMEOUT
+
+
+def _top_level_text(query: str) -> str:
+    """The query with everything inside parentheses and string literals blanked out"""
+    masked = []
+    depth = 0
+    in_literal = False
+    for char in query:
+        if in_literal:
+            in_literal = char != "'"
+            masked.append(" ")
+        elif char == "'":
+            in_literal = True
+            masked.append(" ")
+        elif char == "(":
+            depth += 1
+            masked.append(" ")
+        elif char == ")":
+            depth = max(depth - 1, 0)
+            masked.append(" ")
+        else:
+            masked.append(char if depth == 0 else " ")
+    return "".join(masked)
+
+
+def _find_top_level(query: str, pattern: re.Pattern) -> Optional[re.Match]:
+    """Last match of pattern outside parentheses and string literals"""
+    matches = list(pattern.finditer(_top_level_text(query)))
+    return matches[-1] if matches else None
+
+
+def _split_ctes(query: str) -> Tuple[str, str]:
+    """
+    Split "WITH a AS (...), b AS (...) SELECT ..." into the CTE list
+    ("WITH a AS (...), b AS (...) ") and the statement that uses it.
+    Queries without CTEs give an empty CTE list.
+    """
+    if not _LEADING_WITH.match(query):
+        return "", query
+    # CTE bodies and column lists are parenthesized: the first top-level SELECT is the statement
+    statement = _SELECT.search(_top_level_text(query))
+    if not statement:
+        return "", query
+    return query[:statement.start()], query[statement.start():]
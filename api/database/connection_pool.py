@@ -0,0 +1,285 @@
+"""
+Connection Pool - Reuses SQL Server connections across queries
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional
+
+DEFAULT_MIN_SIZE = 1
+DEFAULT_MAX_SIZE = 10
+DEFAULT_MAX_LIFETIME = 1800     # Seconds before a connection is recycled
+DEFAULT_WAIT_TIMEOUT = 15       # Seconds a checkout waits when every connection is in use
+DEFAULT_CHECK_AFTER_IDLE = 30   # Idle seconds after which a connection is pinged on checkout
+DEFAULT_LOGIN_TIMEOUT = 10
+
+
+class PoolExhaustedError(Exception):
+    """No connection became available within the wait timeout"""
+
+
+class _PooledConnection:
+    """A driver connection plus the times the pool tracks for it"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def age(self, now: float) -> float:
+        return now - self.created_at
+
+    def idle(self, now: float) -> float:
+        return now - self.last_used
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of pyodbc connections for one connection string.
+
+    Connections are opened on demand up to max_size (warm_up() opens min_size
+    ahead of the first request) and kept open between uses. On checkout, a connection older than max_lifetime is recycled
+    and one idle for longer than check_after_idle is pinged first, so a
+    connection dropped by the server or a firewall is replaced instead of
+    failing the query. A connection whose use raised an error it cannot roll
+    back from is discarded.
+    """
+
+    def __init__(
+        self,
+        connection_string: str,
+        name: str = "default",
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        max_lifetime: Optional[float] = None,
+        wait_timeout: Optional[float] = None,
+        check_after_idle: Optional[float] = None,
+        login_timeout: Optional[int] = None
+    ):
+        self.connection_string = connection_string
+        self.name = name
+        self.min_size = min_size if min_size is not None else int(os.getenv("DB_POOL_MIN_SIZE", str(DEFAULT_MIN_SIZE)))
+        self.max_size = max(max_size or int(os.getenv("DB_POOL_MAX_SIZE", str(DEFAULT_MAX_SIZE))), 1)
+        self.max_lifetime = max_lifetime or float(os.getenv("DB_POOL_MAX_LIFETIME", str(DEFAULT_MAX_LIFETIME)))
+        self.wait_timeout = wait_timeout or float(os.getenv("DB_POOL_WAIT_TIMEOUT", str(DEFAULT_WAIT_TIMEOUT)))
+        self.check_after_idle = check_after_idle if check_after_idle is not None else float(
+            os.getenv("DB_POOL_CHECK_AFTER_IDLE", str(DEFAULT_CHECK_AFTER_IDLE))
+        )
+        self.login_timeout = login_timeout or int(os.getenv("DB_POOL_LOGIN_TIMEOUT", str(DEFAULT_LOGIN_TIMEOUT)))
+
+        self._idle: Deque[_PooledConnection] = deque()
+        self._size = 0  # Open connections, idle or checked out
+        self._closed = False
+        self._condition = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "discarded": 0,
+            "failed_checks": 0,
+            "waits": 0,
+            "wait_timeouts": 0,
+            "total_wait_ms": 0.0
+        }
+
+    def _open(self) -> _PooledConnection:
+        import pyodbc
+
+        connection = pyodbc.connect(self.connection_string, timeout=self.login_timeout)
+        with self._condition:
+            self._stats["created"] += 1
+        return _PooledConnection(connection)
+
+    def _close(self, pooled: _PooledConnection, reason: str):
+        """Close a connection that leaves the pool (its slot must already be released)"""
+        with self._condition:
+            self._stats[reason] += 1
+        try:
+            pooled.connection.close()
+        except Exception:
+            pass
+
+    def _release_slot(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def _is_alive(self, pooled: _PooledConnection) -> bool:
+        try:
+            cursor = pooled.connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self) -> _PooledConnection:
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        wait_started = time.monotonic()
+
+        while True:
+            pooled = None
+            with self._condition:
+                if self._idle:
+                    pooled = self._idle.pop()  # Most recently used: least likely to be stale
+                elif self._size < self.max_size:
+                    self._size += 1  # Reserve the slot; the connection is opened outside the lock
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["wait_timeouts"] += 1
+                        raise PoolExhaustedError(
+                            f"Connection pool exhausted: no connection available within {self.wait_timeout:g}s "
+                            f"({self.max_size} in use)"
+                        )
+                    if not waited:
+                        waited = True
+                        self._stats["waits"] += 1
+                    self._condition.wait(remaining)
+                    continue
+
+            if pooled is None:
+                try:
+                    pooled = self._open()
+                except Exception:
+                    self._release_slot()
+                    raise
+            else:
+                now = time.monotonic()
+                if pooled.age(now) > self.max_lifetime:
+                    self._close(pooled, "recycled")
+                    pooled = self._replace_slot()
+                elif pooled.idle(now) > self.check_after_idle and not self._is_alive(pooled):
+                    with self._condition:
+                        self._stats["failed_checks"] += 1
+                    self._close(pooled, "discarded")
+                    pooled = self._replace_slot()
+
+            with self._condition:
+                self._stats["checkouts"] += 1
+                if waited:
+                    self._stats["total_wait_ms"] += (time.monotonic() - wait_started) * 1000
+            return pooled
+
+    def _replace_slot(self) -> _PooledConnection:
+        """Open a new connection in the slot of one just closed"""
+        try:
+            return self._open()
+        except Exception:
+            self._release_slot()
+            raise
+
+    def _checkin(self, pooled: _PooledConnection, healthy: bool):
+        now = time.monotonic()
+        if healthy and not self._closed and pooled.age(now) <= self.max_lifetime:
+            pooled.last_used = now
+            with self._condition:
+                self._idle.append(pooled)
+                self._condition.notify()
+            return
+
+        self._close(pooled, "discarded" if not healthy else "recycled")
+        self._release_slot()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        Check out a connection for the duration of a block.
+
+        The open transaction is rolled back when the block ends (callers that
+        write must commit). If the block fails and the connection cannot be
+        rolled back, it is discarded instead of returned.
+        """
+        pooled = self._checkout()
+        healthy = True
+        try:
+            yield pooled.connection
+        except Exception:
+            healthy = self._reset(pooled)
+            raise
+        else:
+            healthy = self._reset(pooled)
+        finally:
+            self._checkin(pooled, healthy)
+
+    def _reset(self, pooled: _PooledConnection) -> bool:
+        """Leave the connection as a new one would be; False if it is unusable"""
+        try:
+            pooled.connection.rollback()
+            pooled.connection.timeout = 0
+            return True
+        except Exception:
+            return False
+
+    def warm_up(self):
+        """Open connections up to min_size (e.g. at startup)"""
+        while True:
+            with self._condition:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                pooled = self._open()
+            except Exception:
+                self._release_slot()
+                raise
+            self._checkin(pooled, True)
+
+    def close(self):
+        """Close the idle connections (checked out ones close on return)"""
+        with self._condition:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._closed = True
+        for pooled in idle:
+            self._close(pooled, "recycled")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Size, usage and lifetime counters of the pool"""
+        with self._condition:
+            stats = dict(self._stats)
+            idle = len(self._idle)
+            stats.update({
+                "name": self.name,
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "avg_wait_ms": round(stats["total_wait_ms"] / stats["waits"], 1) if stats["waits"] else 0.0
+            })
+            stats["total_wait_ms"] = round(stats["total_wait_ms"], 1)
+        return stats
+
+
+# Global pools, one per connection string
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_connection_pool(connection_string: str, name: str = "default") -> ConnectionPool:
+    """Get the global pool for a connection string"""
+    with _pools_lock:
+        pool = _pools.get(connection_string)
+        if pool is None:
+            pool = _pools[connection_string] = ConnectionPool(connection_string, name=name)
+        return pool
+
+
+def close_all_pools():
+    """Close the idle connections of every pool (e.g. at shutdown)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+def get_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats of every pool, by pool name"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.name: pool.get_stats() for pool in pools}
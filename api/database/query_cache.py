@@ -0,0 +1,247 @@
+"""
+Query Cache - Results of identical SQL shared across requests and workers
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .columnar import ColumnarResult
+
+DEFAULT_CACHE_PATH = "database/query_cache.sqlite3"
+DEFAULT_TTL_SECONDS = 600
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_MAX_ENTRY_MB = 16
+
+_WHITESPACE = re.compile(r"\s+")
+# String literal (kept) or comment (dropped)
+_LITERAL_OR_COMMENT = re.compile(r"('(?:[^']|'')*')|--[^\n]*|/\*.*?\*/", re.DOTALL)
+_VIEW_NAME = re.compile(r"\bV_[A-Z0-9_]+\b")
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Canonical form of a query for cache lookups.
+
+    Comments are dropped and whitespace is collapsed and case folded outside
+    string literals; the literals are kept as written, since they can select
+    different rows.
+    """
+    normalized = []
+    code = ""
+    last = 0
+    for match in _LITERAL_OR_COMMENT.finditer(query):
+        code += query[last:match.start()]
+        if match.group(1) is None:
+            # A comment separates tokens like whitespace ("--" runs to the end of its line)
+            code += " "
+        else:
+            normalized.append(_WHITESPACE.sub(" ", code).upper())
+            normalized.append(match.group(1))
+            code = ""
+        last = match.end()
+    normalized.append(_WHITESPACE.sub(" ", code + query[last:]).upper())
+    return "".join(normalized).strip().rstrip(";").strip()
+
+
+def referenced_views(normalized_query: str) -> List[str]:
+    """Dir.V_* views referenced by a normalized query (outside literals)"""
+    code = re.sub(r"'(?:[^']|'')*'", "''", normalized_query)
+    return sorted(set(_VIEW_NAME.findall(code)))
+
+
+class QueryCache:
+    """
+    Successful query results keyed by normalized SQL and row cap.
+
+    Entries live in a SQLite file, so every worker process of the API shares
+    them. They expire after a TTL, the least recently used are evicted past
+    max_entries, and entries are tagged with the views they read so a view
+    reload can invalidate only what depends on it. Cache errors never fail
+    a query; they only turn lookups into misses.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_entry_bytes: Optional[int] = None
+    ):
+        self.path = path or os.getenv("QUERY_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(
+            os.getenv("QUERY_CACHE_TTL", str(DEFAULT_TTL_SECONDS))
+        )
+        self.max_entries = max_entries or int(os.getenv("QUERY_CACHE_MAX_ENTRIES", str(DEFAULT_MAX_ENTRIES)))
+        self.max_entry_bytes = max_entry_bytes or int(
+            float(os.getenv("QUERY_CACHE_MAX_ENTRY_MB", str(DEFAULT_MAX_ENTRY_MB))) * 1024 * 1024
+        )
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript("""
+                        CREATE TABLE IF NOT EXISTS query_cache (
+                            key TEXT PRIMARY KEY,
+                            query TEXT NOT NULL,
+                            payload TEXT NOT NULL,
+                            created_at REAL NOT NULL,
+                            last_used REAL NOT NULL
+                        );
+                        CREATE INDEX IF NOT EXISTS idx_query_cache_last_used ON query_cache (last_used);
+                        CREATE TABLE IF NOT EXISTS query_cache_views (
+                            view TEXT NOT NULL,
+                            key TEXT NOT NULL,
+                            PRIMARY KEY (view, key)
+                        );
+                    """)
+                    self._initialized = True
+        return conn
+
+    @staticmethod
+    def make_key(normalized_query: str, row_cap: int) -> str:
+        return hashlib.sha1(f"{row_cap}\n{normalized_query}".encode("utf-8")).hexdigest()
+
+    def get(self, query: str, row_cap: int) -> Optional[Dict[str, Any]]:
+        """Cached result of a query (already in SQL Server syntax), or None"""
+        key = self.make_key(normalize_sql(query), row_cap)
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT payload FROM query_cache WHERE key = ? AND created_at >= ?",
+                    (key, now - self.ttl_seconds)
+                ).fetchone()
+                if row:
+                    with conn:
+                        conn.execute("UPDATE query_cache SET last_used = ? WHERE key = ?", (now, key))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Query cache no disponible: {e}")
+            return None
+
+        result = json.loads(row[0]) if row else None
+        if not result or not isinstance(result.get("table"), dict):
+            # Missing, expired, or stored by an older version
+            self.misses += 1
+            return None
+        self.hits += 1
+        result["table"] = ColumnarResult.from_dict(result["table"])
+        return result
+
+    def put(self, query: str, row_cap: int, result: Dict[str, Any]):
+        """Store a successful result (too large results are not cached)"""
+        if not result.get("success"):
+            return
+
+        payload = json.dumps({**result, "table": result["table"].to_dict()}, ensure_ascii=False)
+        if len(payload) > self.max_entry_bytes:
+            return
+
+        normalized = normalize_sql(query)
+        key = self.make_key(normalized, row_cap)
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO query_cache (key, query, payload, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                        (key, normalized, payload, now, now)
+                    )
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO query_cache_views (view, key) VALUES (?, ?)",
+                        [(view, key) for view in referenced_views(normalized)]
+                    )
+                    self._evict(conn, now)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Query cache no disponible: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then the least recently used past max_entries"""
+        conn.execute("DELETE FROM query_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        conn.execute(
+            """
+            DELETE FROM query_cache WHERE key IN (
+                SELECT key FROM query_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,)
+        )
+        conn.execute("DELETE FROM query_cache_views WHERE key NOT IN (SELECT key FROM query_cache)")
+
+    def invalidate(self, view: Optional[str] = None) -> int:
+        """
+        Drop the entries that read a view (e.g. after it was reloaded), or all
+        entries if no view is given.
+
+        Returns:
+            Number of entries removed
+        """
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    if view is None:
+                        removed = conn.execute("DELETE FROM query_cache").rowcount
+                        conn.execute("DELETE FROM query_cache_views")
+                    else:
+                        view = view.split(".")[-1].strip("[]").upper()
+                        removed = conn.execute(
+                            "DELETE FROM query_cache WHERE key IN (SELECT key FROM query_cache_views WHERE view = ?)",
+                            (view,)
+                        ).rowcount
+                        conn.execute("DELETE FROM query_cache_views WHERE view = ?", (view,))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Query cache no disponible: {e}")
+            return 0
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit / miss counts of this process and entries in the shared store"""
+        entries = None
+        try:
+            conn = self._connect()
+            try:
+                entries = conn.execute("SELECT COUNT(*) FROM query_cache").fetchone()[0]
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            pass
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries
+        }
+
+
+# Global cache instance
+_global_cache = None
+
+def get_query_cache() -> Optional[QueryCache]:
+    """Get global query cache instance (None if QUERY_CACHE_ENABLED is false)"""
+    global _global_cache
+    if os.getenv("QUERY_CACHE_ENABLED", "true").lower() not in ("true", "1", "yes"):
+        return None
+    if _global_cache is None:
+        _global_cache = QueryCache()
+    return _global_cache
@@ -0,0 +1,85 @@
+"""
+Query Cost - Estimated plan (SHOWPLAN_XML) parsing and cost limits
+"""
+import os
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Optional
+
+SHOWPLAN_NAMESPACE = "{http://schemas.microsoft.com/sqlserver/2004/07/showplan}"
+
+# Limits over the estimated plan (0 disables the limit)
+DEFAULT_MAX_ESTIMATED_COST = 1000.0
+DEFAULT_MAX_ESTIMATED_ROWS = 5_000_000
+
+
+@dataclass(frozen=True)
+class PlanEstimate:
+    """Optimizer estimates for a statement, taken from its SHOWPLAN_XML"""
+    estimated_rows: float
+    subtree_cost: float
+    no_join_predicate: bool = False  # The plan joins without a predicate (cross join)
+
+    def describe(self) -> str:
+        text = f"cost {self.subtree_cost:.1f}, ~{self.estimated_rows:,.0f} rows"
+        if self.no_join_predicate:
+            text += ", join without predicate"
+        return text
+
+
+def parse_showplan(plan_xml: str) -> Optional[PlanEstimate]:
+    """
+    Extract the estimates of a SHOWPLAN_XML document.
+
+    The statement with the highest subtree cost is reported (batches from the
+    planner hold a single SELECT). Returns None if the XML has no statements.
+    """
+    try:
+        root = ET.fromstring(plan_xml)
+    except ET.ParseError:
+        return None
+
+    worst = None
+    for statement in root.iter(f"{SHOWPLAN_NAMESPACE}StmtSimple"):
+        cost = statement.get("StatementSubTreeCost")
+        if cost is None:
+            continue
+        if worst is None or float(cost) > float(worst.get("StatementSubTreeCost")):
+            worst = statement
+
+    if worst is None:
+        return None
+
+    no_join_predicate = any(
+        warnings.get("NoJoinPredicate") in ("true", "1")
+        for warnings in worst.iter(f"{SHOWPLAN_NAMESPACE}Warnings")
+    )
+    return PlanEstimate(
+        estimated_rows=float(worst.get("StatementEstRows") or 0),
+        subtree_cost=float(worst.get("StatementSubTreeCost")),
+        no_join_predicate=no_join_predicate
+    )
+
+
+@dataclass(frozen=True)
+class CostLimits:
+    """Thresholds above which a query is rejected before it runs"""
+    max_cost: float = DEFAULT_MAX_ESTIMATED_COST
+    max_rows: float = DEFAULT_MAX_ESTIMATED_ROWS
+
+    @classmethod
+    def from_env(cls) -> "CostLimits":
+        return cls(
+            max_cost=float(os.getenv("DB_MAX_ESTIMATED_COST", str(DEFAULT_MAX_ESTIMATED_COST))),
+            max_rows=float(os.getenv("DB_MAX_ESTIMATED_ROWS", str(DEFAULT_MAX_ESTIMATED_ROWS)))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_cost > 0 or self.max_rows > 0
+
+    def exceeds_cost(self, estimate: PlanEstimate) -> bool:
+        return self.max_cost > 0 and estimate.subtree_cost > self.max_cost
+
+    def exceeds_rows(self, estimate: PlanEstimate) -> bool:
+        return self.max_rows > 0 and estimate.estimated_rows > self.max_rows
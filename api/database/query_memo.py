@@ -0,0 +1,138 @@
+"""
+Query Memo - Request-scoped SQL -> result map, so a plan runs each query once
+"""
+import re
+import threading
+from dataclasses import replace
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from .query_cache import normalize_sql
+from .sql_validator import tokenize
+
+if TYPE_CHECKING:
+    from .columnar import ColumnarResult
+    from .results import QueryResult
+
+# Leading "SELECT [DISTINCT] TOP n" of a normalized query (not PERCENT / WITH TIES)
+_LEADING_TOP = re.compile(r"^SELECT (DISTINCT )?TOP \(?(\d+)\)? (?!PERCENT\b|WITH TIES\b)")
+
+
+def _split_top(normalized_query: str) -> Tuple[str, Optional[int]]:
+    """Query without its leading TOP, and the TOP value (None if it has none)"""
+    match = _LEADING_TOP.match(normalized_query)
+    if not match:
+        return normalized_query, None
+    base = f"SELECT {match.group(1) or ''}" + normalized_query[match.end():]
+    return base, int(match.group(2))
+
+
+def _has_top_level_order_by(normalized_query: str) -> bool:
+    """True if the query itself is ordered (not only a subquery or an OVER clause)"""
+    try:
+        tokens = tokenize(normalized_query)
+    except ValueError:
+        return False
+    depth = 0
+    for index, (kind, text) in enumerate(tokens):
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word" and text.upper() == "ORDER" \
+                and index + 1 < len(tokens) and tokens[index + 1][1].upper() == "BY":
+            return True
+    return False
+
+
+class QueryMemo:
+    """
+    Successful query results of one request, by normalized SQL.
+
+    A query already run in the request is answered from its result; so is an
+    ordered "SELECT TOP n ... ORDER BY ..." whose rows are a prefix of an
+    earlier result of the same query with a larger or no TOP (without an
+    ORDER BY, SQL Server may return any n rows, not the first ones). Concurrent tasks asking for the same
+    SQL wait for the first one instead of running it again. Failures are not
+    kept, so a retry always reaches the database.
+    """
+
+    def __init__(self, put_table: Callable[["ColumnarResult"], str]):
+        self._put_table = put_table
+        self._results: Dict[str, "QueryResult"] = {}
+        self._by_base: Dict[str, List[Tuple[Optional[int], "QueryResult"]]] = {}
+        self._pending: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.hits = 0
+        self.subsumed_hits = 0
+
+    def run(self, query: str, execute: Callable[[], "QueryResult"]) -> "QueryResult":
+        """Result of query: from the memo if possible, else execute() (once per request)"""
+        key = normalize_sql(query)
+
+        while True:
+            with self._lock:
+                result = self._lookup(key, query)
+                if result is not None:
+                    return result
+                event = self._pending.get(key)
+                if event is None:
+                    event = self._pending[key] = threading.Event()
+                    break
+            # Another task is running the same SQL; use its result when it finishes
+            event.wait()
+
+        try:
+            result = execute()
+            with self._lock:
+                self.executed += 1
+                if result.success:
+                    self._results[key] = result
+                    base, top = _split_top(key)
+                    self._by_base.setdefault(base, []).append((top, result))
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            event.set()
+        return result
+
+    def _lookup(self, key: str, query: str) -> Optional["QueryResult"]:
+        """Memoized result for key, exact or as a prefix of a wider one (lock held)"""
+        result = self._results.get(key)
+        if result is not None:
+            self.hits += 1
+            print("♻️ SQL ya ejecutado en esta solicitud, se reutiliza su resultado")
+            return result
+
+        base, top = _split_top(key)
+        if top is None or not _has_top_level_order_by(base):
+            return None
+
+        for source_top, source in self._by_base.get(base, []):
+            if source_top is not None and source_top < top:
+                continue
+            if source.truncated and source.row_count < top:
+                continue
+            table = source.table.head(top)
+            self.subsumed_hits += 1
+            print(f"♻️ SQL cubierto por una consulta previa, se reutilizan {table.row_count} filas")
+            return replace(
+                source,
+                handle=self._put_table(table),
+                preview=source.preview[:table.row_count],
+                row_count=table.row_count,
+                truncated=False,
+                total_count=None,
+                query_executed=query,
+                message=f"Query answered from an earlier query of this request. Returned {table.row_count} rows."
+            )
+        return None
+
+    def get_stats(self) -> Dict[str, int]:
+        """Queries executed and answered from the memo"""
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "hits": self.hits,
+                "subsumed_hits": self.subsumed_hits
+            }
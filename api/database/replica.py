@@ -0,0 +1,929 @@
+"""
+Analytical Replica - Local SQLite snapshot of the Dir views for read-only queries
+"""
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from datetime import datetime, time as time_of_day
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from .columnar import ColumnarResult, column_converter, column_type, convert_column
+from .sql_validator import tokenize
+
+DEFAULT_REPLICA_PATH = "database/replica.sqlite3"
+DEFAULT_MAX_AGE_HOURS = 26  # Nightly warehouse load plus a margin
+DEFAULT_INDEX_COLUMNS = "NumeroDocumento"
+# Stored in PRAGMA user_version; snapshots of another format are ignored until refreshed
+REPLICA_FORMAT_VERSION = 2
+
+# Views copied into the replica (schema Dir)
+REPLICA_VIEWS = [
+    "V_AUTORIZACION_CTP",
+    "V_AUTORIZACION_DEPOSITO",
+    "V_AUTORIZACION_DESBOSQUE",
+    "V_CAMBIO_USO",
+    "V_TITULOHABILITANTE",
+    "V_PLANTACION",
+    "V_LICENCIA_CAZA",
+    "V_INFRACTOR",
+]
+
+# Collation of the text columns: case-insensitive and accent-sensitive, like the warehouse (CI_AS)
+COLLATION = "CI_AS"
+
+# SQLite column declarations by logical column type
+_COLUMN_DECLARATIONS = {
+    "boolean": "INTEGER",
+    "integer": "INTEGER",
+    "number": "REAL",
+    "string": f"TEXT COLLATE {COLLATION}",
+    "datetime": "TEXT",
+    "date": "TEXT",
+    "time": "TEXT",
+    "binary": "BLOB",
+}
+
+# Words of T-SQL the shim does not translate, or that SQLite would run with other semantics
+_UNSUPPORTED_WORDS = {
+    "TOP", "PERCENT", "TIES", "INTO", "APPLY", "PIVOT", "UNPIVOT", "CONVERT", "TRY_CONVERT",
+    "TRY_CAST", "REPLACE", "COLLATE", "OVER", "ROLLUP", "CUBE", "GROUPING"
+}
+# "+" is string concatenation in T-SQL but addition in SQLite; the others do not exist in SQLite
+_UNSUPPORTED_SYMBOLS = {"+", "^", "!<", "!>", "||", ":", "&", "|", "~"}
+# CAST targets whose result is the same in both engines (DECIMAL rounds, CHAR truncates, dates parse)
+_CAST_TYPES = {"INT", "INTEGER", "BIGINT", "SMALLINT", "TINYINT", "FLOAT", "REAL"}
+_COMPARISONS = {"=", "<>", "!=", "<", ">", "<=", ">="}
+_ARITHMETIC = {"*", "/", "%", "-"}
+_AGGREGATES = {
+    "COUNT", "COUNT_BIG", "SUM", "AVG", "MIN", "MAX", "STDEV", "STDEVP", "VAR", "VARP",
+    "STRING_AGG", "CHECKSUM_AGG"
+}
+# Aggregates whose value is a number whatever their argument (safe to order a TOP by)
+_NUMERIC_AGGREGATES = {"COUNT", "COUNT_BIG", "SUM", "AVG"}
+_EXPRESSION_KEYWORDS = {
+    "AS", "AND", "OR", "NOT", "NULL", "IS", "IN", "LIKE", "BETWEEN", "CASE", "WHEN", "THEN",
+    "ELSE", "END", "DISTINCT", "ASC", "DESC", "ESCAPE", "EXISTS", "ALL", "ANY", "SOME", "SELECT"
+}
+_CLAUSES = {"FROM", "WHERE", "GROUP", "HAVING", "ORDER", "OFFSET", "FETCH", "OPTION", "FOR"}
+_SET_OPERATORS = {"UNION", "EXCEPT", "INTERSECT"}
+
+# ISO date literals (YYYY-MM-DD, YYYYMMDD) with an optional time without fractions
+_DATE_LITERAL = re.compile(
+    r"(\d{4})(?:-(\d{2})-|(\d{2}))(\d{2})(?:[T ](\d{2}):(\d{2})(?::(\d{2}))?)?"
+)
+_DATE_LIKE = re.compile(r"\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}|\d{8}")
+_STORED_DATETIME = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d{6})?")
+
+Token = Tuple[str, str]
+
+
+def normalize_text(value: str) -> str:
+    """Upper case without accents (primary sort key of a text value)"""
+    decomposed = unicodedata.normalize("NFKD", value.upper())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+@lru_cache(maxsize=65536)
+def _collation_key(value: str) -> Tuple[str, str]:
+    # Trailing spaces are ignored and case never counts; accents only break ties
+    value = value.rstrip(" ")
+    return normalize_text(value), value.upper()
+
+
+def compare_ci_as(left: str, right: str) -> int:
+    """CI_AS collation: equal when they differ only in case or trailing spaces"""
+    left_key, right_key = _collation_key(left), _collation_key(right)
+    return (left_key > right_key) - (left_key < right_key)
+
+
+@lru_cache(maxsize=256)
+def _like_pattern(pattern: str, escape: Optional[str]):
+    """Regular expression of a T-SQL LIKE pattern (%, _, [set], [^set], ESCAPE)"""
+    regex = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if escape and char == escape and index + 1 < len(pattern):
+            regex.append(re.escape(pattern[index + 1]))
+            index += 2
+            continue
+        if char == "%":
+            regex.append(".*")
+        elif char == "_":
+            regex.append(".")
+        elif char == "[" and "]" in pattern[index + 1:]:
+            end = pattern.index("]", index + 2 if pattern[index + 1:index + 2] == "]" else index + 1)
+            body = pattern[index + 1:end]
+            negated = body.startswith("^")
+            body = body[1:] if negated else body
+            members = "".join("-" if member == "-" else re.escape(member) for member in body)
+            regex.append(f"[{'^' if negated else ''}{members}]")
+            index = end
+        else:
+            regex.append(re.escape(char))
+        index += 1
+    return re.compile("".join(regex), re.DOTALL | re.IGNORECASE)
+
+
+def tsql_like(pattern: Any, value: Any, escape: Optional[str] = None) -> Optional[int]:
+    """SQLite like() with T-SQL semantics under CI_AS (Unicode case folding, accent-sensitive)"""
+    if pattern is None or value is None:
+        return None
+    return 1 if _like_pattern(str(pattern), escape).fullmatch(str(value)) else 0
+
+
+class _TsqlAvg:
+    """AVG with the T-SQL result type: integer arguments give a truncated integer"""
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+        self.integers = True
+
+    def step(self, value):
+        if value is None:
+            return
+        self.total += value
+        self.count += 1
+        self.integers = self.integers and isinstance(value, int)
+
+    def finalize(self):
+        if not self.count:
+            return None
+        if self.integers:
+            quotient = abs(self.total) // self.count
+            return quotient if self.total >= 0 else -quotient
+        return self.total / self.count
+
+
+def _date_part(start: int, end: int):
+    def part(value: Optional[str]) -> Optional[int]:
+        if value is None:
+            return None
+        try:
+            return int(str(value)[start:end])
+        except ValueError:
+            return None
+    return part
+
+
+def _len(value: Any) -> Optional[int]:
+    # T-SQL LEN ignores trailing spaces
+    return None if value is None else len(str(value).rstrip(" "))
+
+
+def _case_function(convert):
+    return lambda value: None if value is None else convert(str(value))
+
+
+def stored_datetime(value: datetime) -> str:
+    """Text form of a datetime in the replica (sorts and compares like the value)"""
+    return value.isoformat(sep=" ")
+
+
+def _upper(token: Token) -> Optional[str]:
+    return token[1].upper() if token[0] == "word" else None
+
+
+def _word_at(tokens: List[Token], index: int) -> Optional[str]:
+    """Upper-cased word at index (None for other tokens or past the end)"""
+    return _upper(tokens[index]) if 0 <= index < len(tokens) else None
+
+
+def _skip_group(tokens: List[Token], position: int) -> int:
+    """Position after the parenthesized group starting at position"""
+    depth = 0
+    for index in range(position, len(tokens)):
+        if tokens[index] == ("symbol", "("):
+            depth += 1
+        elif tokens[index] == ("symbol", ")"):
+            depth -= 1
+            if depth == 0:
+                return index + 1
+    return len(tokens)
+
+
+def _split_top_level(tokens: List[Token], separator: Token = ("symbol", ",")) -> List[List[Token]]:
+    items, current, depth = [], [], 0
+    for token in tokens:
+        if token == ("symbol", "("):
+            depth += 1
+        elif token == ("symbol", ")"):
+            depth -= 1
+        if token == separator and depth == 0:
+            items.append(current)
+            current = []
+        else:
+            current.append(token)
+    if current:
+        items.append(current)
+    return items
+
+
+def _query_levels(tokens: List[Token]) -> List[Tuple[int, Dict[str, List[Token]]]]:
+    """Nesting depth and clauses (select, from, where, group, having, order) of every SELECT"""
+    levels = []
+    nesting = 0
+    for start, token in enumerate(tokens):
+        if token == ("symbol", "("):
+            nesting += 1
+        elif token == ("symbol", ")"):
+            nesting -= 1
+        if _upper(token) != "SELECT":
+            continue
+        clauses: Dict[str, List[Token]] = {"select": []}
+        clause = "select"
+        depth = 0
+        index = start + 1
+        while index < len(tokens):
+            token = tokens[index]
+            word = _upper(token)
+            if token == ("symbol", "("):
+                depth += 1
+            elif token == ("symbol", ")"):
+                depth -= 1
+                if depth < 0:
+                    break
+            elif depth == 0 and word in _SET_OPERATORS:
+                break
+            elif depth == 0 and word in _CLAUSES:
+                clause = word.lower()
+                clauses[clause] = []
+                if word in ("GROUP", "ORDER") and _word_at(tokens, index + 1) == "BY":
+                    index += 1
+                index += 1
+                continue
+            clauses[clause].append(token)
+            index += 1
+        levels.append((nesting, clauses))
+    return levels
+
+
+def _strip_column_prefixes(tokens: List[Token]) -> List[Token]:
+    """alias.column -> column, identifiers as upper-cased words (to compare expressions)"""
+    stripped = []
+    for index, token in enumerate(tokens):
+        if token == ("symbol", ".") or (
+            token[0] in ("word", "name") and tokens[index + 1:index + 2] == [("symbol", ".")]
+        ):
+            continue
+        stripped.append(("word", token[1].upper()) if token[0] in ("word", "name") else token)
+    return stripped
+
+
+def _select_alias(item: List[Token]) -> Tuple[List[Token], Optional[str]]:
+    """Expression and alias (AS alias, or a trailing bare alias) of a select item"""
+    if len(item) > 2 and _upper(item[-2]) == "AS":
+        return item[:-2], item[-1][1].upper()
+    last = item[-1] if item else None
+    if (len(item) > 1 and last[0] in ("word", "name") and _upper(last) not in _EXPRESSION_KEYWORDS
+            and (item[-2] == ("symbol", ")") or item[-2][0] in ("word", "name", "string", "number"))
+            and _upper(item[-2]) not in _EXPRESSION_KEYWORDS):
+        return item[:-1], last[1].upper()
+    return item, None
+
+
+def _has_ungrouped_column(expression: List[Token], groups: List[List[Token]]) -> bool:
+    """True if a column is used outside an aggregate and outside every GROUP BY expression"""
+    tokens = _strip_column_prefixes(expression)
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token == ("symbol", "(") and _word_at(tokens, index + 1) == "SELECT":
+            index = _skip_group(tokens, index)
+            continue
+        group = next((g for g in groups if g and tokens[index:index + len(g)] == g), None)
+        if group:
+            index += len(group)
+            continue
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+        if token[0] == "word" and following == ("symbol", "("):
+            if token[1] in _AGGREGATES:
+                index = _skip_group(tokens, index + 1)
+                continue
+            index += 1
+            continue
+        if token[0] == "word" and token[1] not in _EXPRESSION_KEYWORDS:
+            if _word_at(tokens, index - 1) == "AS":
+                index += 1  # CAST(x AS INT): a type name
+                continue
+            return True
+        if token == ("symbol", "*"):
+            return True
+        index += 1
+    return False
+
+
+def _has_aggregate(expression: List[Token]) -> bool:
+    for index, token in enumerate(expression[:-1]):
+        if _upper(token) in _AGGREGATES and expression[index + 1] == ("symbol", "("):
+            return True
+    return False
+
+
+def _grouping_error(tokens: List[Token]) -> bool:
+    """
+    A SELECT SQL Server would reject for a column outside GROUP BY / aggregates
+    (SQLite runs it and returns arbitrary values).
+    """
+    for _, level in _query_levels(tokens):
+        items = _split_top_level(level["select"])
+        groups = [_strip_column_prefixes(group) for group in _split_top_level(level.get("group", []))]
+        if "group" not in level and not any(_has_aggregate(item) for item in items):
+            continue
+        aliases = set()
+        for item in items:
+            expression, alias = _select_alias(item)
+            aliases.add(alias)
+            if _has_ungrouped_column(expression, groups):
+                return True
+        if _has_ungrouped_column(level.get("having", []), groups):
+            return True
+        for item in _split_top_level(level.get("order", [])):
+            if item and _upper(item[-1]) in ("ASC", "DESC"):
+                item = item[:-1]
+            if len(item) == 1 and (item[0][0] == "number" or item[0][1].upper() in aliases):
+                continue
+            if _has_ungrouped_column(item, groups):
+                return True
+    return False
+
+
+def _column_before(tokens: List[Token], end: int) -> Optional[str]:
+    """Column whose reference ([alias.]column) ends at end and is a whole operand"""
+    if end < 0 or tokens[end][0] not in ("word", "name"):
+        return None
+    if tokens[end][0] == "word" and tokens[end][1].upper() in _EXPRESSION_KEYWORDS:
+        return None
+    start = end - 2 if end >= 2 and tokens[end - 1] == ("symbol", ".") else end
+    if start > 0 and tokens[start - 1][0] == "symbol" and tokens[start - 1][1] in _ARITHMETIC:
+        return None
+    return tokens[end][1]
+
+
+def _column_after(tokens: List[Token], start: int) -> Optional[str]:
+    """Column whose reference ([alias.]column) starts at start and is a whole operand"""
+    if start >= len(tokens) or tokens[start][0] not in ("word", "name"):
+        return None
+    if tokens[start][0] == "word" and tokens[start][1].upper() in _EXPRESSION_KEYWORDS:
+        return None
+    end = start + 2 if tokens[start + 1:start + 2] == [("symbol", ".")] else start
+    if end >= len(tokens) or tokens[end][0] not in ("word", "name"):
+        return None
+    following = tokens[end + 1] if end + 1 < len(tokens) else None
+    if following is not None and following[0] == "symbol" and (following[1] in _ARITHMETIC or following[1] in "(."):
+        return None
+    return tokens[end][1]
+
+
+def _compared_column(tokens: List[Token], index: int) -> Tuple[bool, Optional[str]]:
+    """
+    Whether the literal at index is compared (=, <>, <, >, IN, BETWEEN) and,
+    if the other operand is a bare column, its name.
+    """
+    previous = tokens[index - 1] if index else ("", "")
+    following = tokens[index + 1] if index + 1 < len(tokens) else ("", "")
+
+    def before_operator(position: int) -> Optional[str]:
+        # Skip a NOT of NOT IN / NOT BETWEEN
+        if position >= 0 and _upper(tokens[position]) == "NOT":
+            position -= 1
+        return _column_before(tokens, position)
+
+    if previous[0] == "symbol" and previous[1] in _COMPARISONS:
+        return True, _column_before(tokens, index - 2)
+    if following[0] == "symbol" and following[1] in _COMPARISONS:
+        return True, _column_after(tokens, index + 2)
+    if _upper(previous) == "BETWEEN":
+        return True, before_operator(index - 2)
+    if _upper(previous) == "AND" and index >= 3 and _upper(tokens[index - 3]) == "BETWEEN":
+        return True, before_operator(index - 4)
+    # IN ('a', 'b', ...): walk back to the opening parenthesis
+    position = index - 1
+    while position >= 1 and tokens[position] == ("symbol", ",") and tokens[position - 1][0] in ("string", "number"):
+        position -= 2
+    if tokens[position:position + 1] == [("symbol", "(")] and position >= 1 and _upper(tokens[position - 1]) == "IN":
+        return True, before_operator(position - 2)
+    return False, None
+
+
+def _literal_text(token: Token) -> str:
+    return token[1][1:-1].replace("''", "'") if token[1][0] == "'" else token[1][2:-1].replace("''", "'")
+
+
+def _date_literal(text: str, kind: str) -> Optional[str]:
+    """Stored form of an ISO date literal compared with a date / datetime column, or None"""
+    match = _DATE_LITERAL.fullmatch(text.strip())
+    if not match:
+        return None
+    year, month_dashed, month, day, hour, minute, second = match.groups()
+    try:
+        value = datetime(int(year), int(month_dashed or month), int(day),
+                         int(hour or 0), int(minute or 0), int(second or 0))
+    except ValueError:
+        return None
+    if kind == "date":
+        # A time against a date column is converted differently by SQL Server
+        return value.date().isoformat() if value.time() == time_of_day() else None
+    return stored_datetime(value)
+
+
+def _translate_literals(tokens: List[Token], column_types: Dict[str, str]) -> Optional[List[Token]]:
+    """
+    Literals compared with columns, checked against the column types: ISO
+    dates become the stored form, anything whose comparison could differ
+    from SQL Server (non-ISO dates, text against an expression or a column of
+    unknown type, numbers against dates) makes the query unsupported.
+    """
+    translated = list(tokens)
+    for index, token in enumerate(tokens):
+        if token[0] not in ("string", "number"):
+            continue
+        compared, column = _compared_column(tokens, index)
+        if not compared:
+            continue
+        kind = column_types.get(column.upper()) if column else None
+        if token[0] == "number":
+            if kind in ("date", "datetime", "time"):
+                return None  # Numbers are days since 1900 in SQL Server
+            continue
+        text = _literal_text(token)
+        if kind in ("date", "datetime"):
+            stored = _date_literal(text, kind)
+            if stored is None:
+                return None
+            translated[index] = ("string", "'" + stored + "'")
+        elif kind == "string":
+            continue
+        elif kind in ("integer", "number", "boolean"):
+            if not re.fullmatch(r"\s*-?\d+(?:\.\d+)?\s*", text):
+                return None
+        elif re.search(r"[^\W\d_]", text) or _DATE_LIKE.search(text):
+            # Case and date conversions of an expression or unknown column are not known here
+            return None
+    return translated
+
+
+def _ordered_by_text(level: Dict[str, List[Token]], column_types: Dict[str, str]) -> bool:
+    """
+    True if an ORDER BY item may be text (or its type is unknown): the local
+    collation approximates the warehouse order, so a TOP / OFFSET over it
+    could pick other rows.
+    """
+    items = {}
+    for item in _split_top_level(level["select"]):
+        expression, alias = _select_alias(item)
+        if alias:
+            items[alias] = expression
+    select_items = [_select_alias(item)[0] for item in _split_top_level(level["select"])]
+
+    for item in _split_top_level(level.get("order", [])):
+        if item and _upper(item[-1]) in ("ASC", "DESC"):
+            item = item[:-1]
+        if len(item) == 1 and item[0][0] == "number":
+            position = int(item[0][1]) - 1
+            item = select_items[position] if 0 <= position < len(select_items) else item
+        elif len(item) == 1 and item[0][1].upper() in items:
+            item = items[item[0][1].upper()]
+        if item and _upper(item[0]) in _NUMERIC_AGGREGATES and item[1:2] == [("symbol", "(")] \
+                and _skip_group(item, 1) == len(item):
+            continue
+        column = _column_after(item, 0) if len(item) in (1, 3) else None
+        if column and column_types.get(column.upper()) in ("integer", "number", "boolean", "date", "datetime", "time"):
+            continue
+        return True
+    return False
+
+
+def _register_tsql_semantics(conn: sqlite3.Connection):
+    """CI_AS collation and the built-ins whose SQLite semantics differ from T-SQL"""
+    conn.create_collation(COLLATION, compare_ci_as)
+    conn.create_function("like", 2, tsql_like, deterministic=True)
+    conn.create_function("like", 3, tsql_like, deterministic=True)
+    conn.create_function("UPPER", 1, _case_function(str.upper), deterministic=True)
+    conn.create_function("LOWER", 1, _case_function(str.lower), deterministic=True)
+    conn.create_aggregate("AVG", 1, _TsqlAvg)
+
+
+def _render(tokens: List[Token]) -> str:
+    """SQL text of the tokens, spaced like hand-written SQL (SQLite names unaliased columns after it)"""
+    parts = []
+    previous = None
+    for kind, text in tokens:
+        if kind == "name":
+            text = '"' + text.replace('"', '""') + '"'
+        elif kind == "string" and text[0] in "Nn":
+            text = text[1:]  # N'...' (Unicode literal) is a plain literal in SQLite
+        glued = previous is not None and (
+            previous in (("symbol", "("), ("symbol", "."))
+            or (kind, text) in (("symbol", ")"), ("symbol", ","), ("symbol", "."))
+            or ((kind, text) == ("symbol", "(") and previous[0] in ("word", "name"))
+        )
+        if parts and not glued:
+            parts.append(" ")
+        parts.append(text)
+        previous = (kind, text)
+    return "".join(parts)
+
+
+def to_sqlite(query: str, column_types: Optional[Dict[str, str]] = None) -> Optional[str]:
+    """
+    SQLite form of a read-only T-SQL query over the Dir views, or None when
+    the query uses T-SQL the shim does not translate, or whose result could
+    differ from SQL Server's.
+
+    Handles Dir. prefixes, [bracket] quoting, N'' literals, a leading TOP n,
+    OFFSET / FETCH, ISNULL and integer / float CASTs; YEAR, MONTH, DAY, LEN,
+    GETDATE, UPPER, LOWER, LIKE and AVG are registered with T-SQL semantics
+    on the replica connection, and text columns use the CI_AS collation.
+    column_types (upper case names -> logical type) is used to check
+    literals: ISO date literals compared with a date column are converted to
+    the stored form. Refused: non-ISO date literals, text literals compared
+    with expressions or columns of unknown type, columns outside GROUP BY and
+    aggregates, and TOP / OFFSET ordered by text.
+    """
+    column_types = column_types or {}
+    try:
+        tokens = tokenize(query)
+    except ValueError:
+        return None
+    while tokens and tokens[-1] == ("symbol", ";"):
+        tokens.pop()
+    while tokens and tokens[0] == ("symbol", ";"):
+        tokens.pop(0)
+    if not tokens or _upper(tokens[0]) not in ("SELECT", "WITH") or ("symbol", ";") in tokens:
+        return None
+
+    # Leading TOP becomes a trailing LIMIT; any other TOP is unsupported
+    limit = None
+    head = 2 if _word_at(tokens, 1) == "DISTINCT" else 1
+    if _word_at(tokens, 0) == "SELECT" and _word_at(tokens, head) == "TOP":
+        parenthesized = tokens[head + 1:head + 2] == [("symbol", "(")]
+        value = tokens[head + (2 if parenthesized else 1):][:1]
+        if not value or value[0][0] != "number" or not value[0][1].isdigit():
+            return None
+        value = value[0]
+        limit = int(value[1])
+        tokens = tokens[:head] + tokens[head + (4 if parenthesized else 2):]
+
+    for index, (kind, text) in enumerate(tokens):
+        upper = text.upper()
+        if kind == "word" and (upper in _UNSUPPORTED_WORDS or text[0] in "@#"):
+            return None
+        if kind == "symbol" and text in _UNSUPPORTED_SYMBOLS:
+            return None
+        if kind == "number" and upper.startswith("0X"):
+            return None
+        if kind == "word" and upper == "CAST":
+            end = _skip_group(tokens, index + 1)
+            if _word_at(tokens, end - 2) not in _CAST_TYPES or _word_at(tokens, end - 3) != "AS":
+                return None
+        if kind == "symbol" and text == "-":
+            neighbours = [_column_before(tokens, index - 1), _column_after(tokens, index + 1)]
+            if any(column_types.get((name or "").upper()) in ("date", "datetime", "time") for name in neighbours):
+                return None  # Date arithmetic
+
+    if _grouping_error(tokens):
+        return None
+    levels = _query_levels(tokens)
+    # The leading TOP limits the outer query (the last SELECT at the top level)
+    outer = [level for depth, level in levels if depth == 0][-1:]
+    for _, level in levels:
+        limited = "offset" in level or (limit is not None and any(level is top for top in outer))
+        if limited and _ordered_by_text(level, column_types):
+            return None
+
+    tokens = _translate_literals(tokens, column_types)
+    if tokens is None:
+        return None
+
+    output: List[Token] = []
+    index = 0
+    while index < len(tokens):
+        kind, text = tokens[index]
+        upper = text.upper() if kind in ("word", "name") else None
+        if upper == "DIR" and tokens[index + 1:index + 2] == [("symbol", ".")]:
+            index += 2
+            continue
+        if kind == "word" and upper == "ISNULL":
+            output.append(("word", "IFNULL"))
+        elif kind == "word" and upper == "OFFSET":
+            # OFFSET n ROWS [FETCH NEXT|FIRST m ROWS ONLY] -> LIMIT m|-1 OFFSET n
+            window = tokens[index:index + 8]
+            words = [_upper(token) for token in window]
+            if len(window) < 3 or window[1][0] != "number" or words[2] not in ("ROW", "ROWS"):
+                return None
+            count = "-1"
+            consumed = 3
+            if words[3:4] == ["FETCH"]:
+                if len(window) < 8 or window[5][0] != "number" or words[6] not in ("ROW", "ROWS") or words[7] != "ONLY":
+                    return None
+                count = window[5][1]
+                consumed = 8
+            if limit is not None:
+                return None
+            output += [("word", "LIMIT"), ("number", count), ("word", "OFFSET"), window[1]]
+            index += consumed
+            continue
+        else:
+            output.append((kind, text))
+        index += 1
+
+    translated = _render(output)
+    if limit is not None:
+        translated += f" LIMIT {limit}"
+    return translated
+
+
+class AnalyticalReplica:
+    """
+    Read-only SQLite copy of the Dir views.
+
+    refresh() snapshots every view from SQL Server into a new file and swaps
+    it in atomically (run it after the nightly load, e.g. with
+    scripts/refresh_replica.py). While the snapshot is younger than
+    max_age_hours, execute() answers read-only queries locally; a query the
+    dialect shim cannot translate (or whose result could differ), or that
+    SQLite rejects, returns None so the caller falls back to SQL Server.
+
+    Text compares case-insensitively and accent-sensitively (CI_AS), with
+    trailing spaces ignored, in =, IN, LIKE, GROUP BY and DISTINCT. Known
+    differences that remain: text is ordered by base letters and then
+    accents, so Ñ, punctuation and other collation-specific orders can differ
+    (only the order; a TOP / OFFSET over a text ORDER BY goes to SQL Server),
+    DECIMAL values are stored as floats, so sums and averages of decimal
+    columns carry float rounding, and ISNULL of a float column with an
+    integer replacement returns that integer as is (SQL Server returns a
+    float). Off unless REPLICA_ENABLED is true (see get_replica); every
+    construct the shim rewrites has a differential case in tests/test_replica.py.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_age_hours: Optional[float] = None):
+        self.path = path or os.getenv("REPLICA_PATH", DEFAULT_REPLICA_PATH)
+        self.max_age_hours = max_age_hours if max_age_hours is not None else float(
+            os.getenv("REPLICA_MAX_AGE_HOURS", str(DEFAULT_MAX_AGE_HOURS))
+        )
+        self.index_columns = [
+            name.strip() for name in os.getenv("REPLICA_INDEX_COLUMNS", DEFAULT_INDEX_COLUMNS).split(",")
+            if name.strip()
+        ]
+        self.hits = 0
+        self.fallbacks = 0
+        # (file mtime, refreshed_at, column types by name) of the current snapshot
+        self._snapshot: Tuple[Optional[float], Optional[float], Dict[str, str]] = (None, None, {})
+
+    def connect(self) -> sqlite3.Connection:
+        """Read-only connection to the current snapshot, with the T-SQL helper functions"""
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True)
+        conn.create_function("YEAR", 1, _date_part(0, 4), deterministic=True)
+        conn.create_function("MONTH", 1, _date_part(5, 7), deterministic=True)
+        conn.create_function("DAY", 1, _date_part(8, 10), deterministic=True)
+        conn.create_function("LEN", 1, _len, deterministic=True)
+        conn.create_function("GETDATE", 0, lambda: stored_datetime(datetime.now()))
+        _register_tsql_semantics(conn)
+        return conn
+
+    def _load_snapshot(self) -> Tuple[Optional[float], Dict[str, str]]:
+        """Refresh time and column types of the snapshot on disk (re-read when the file changes)"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return None, {}
+        if self._snapshot[0] == mtime:
+            return self._snapshot[1], self._snapshot[2]
+
+        try:
+            conn = self.connect()
+            try:
+                if conn.execute("PRAGMA user_version").fetchone()[0] != REPLICA_FORMAT_VERSION:
+                    print("⚠️ Réplica local en un formato anterior, ejecute scripts/refresh_replica.py")
+                    self._snapshot = (mtime, None, {})
+                    return None, {}
+                refreshed_at = conn.execute("SELECT MIN(refreshed_at) FROM replica_views").fetchone()[0]
+                column_types = dict(conn.execute("SELECT column_name, column_type FROM replica_columns"))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Réplica local no disponible: {e}")
+            return None, {}
+        self._snapshot = (mtime, refreshed_at, column_types)
+        return refreshed_at, column_types
+
+    def age_hours(self) -> Optional[float]:
+        """Hours since the snapshot was taken (None if there is none)"""
+        refreshed_at, _ = self._load_snapshot()
+        return None if refreshed_at is None else (time.time() - refreshed_at) / 3600
+
+    def is_fresh(self) -> bool:
+        age = self.age_hours()
+        return age is not None and age <= self.max_age_hours
+
+    def execute(self, query: str, max_rows: Optional[int] = None, timeout: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Run a query (T-SQL) on the replica, with the same result shape as
+        DatabaseConnectionManager.execute_query.
+
+        Returns:
+            The result, or None if the query must go to SQL Server instead
+        """
+        _, column_types = self._load_snapshot()
+        translated = to_sqlite(query, self._column_types(column_types))
+        if translated is None:
+            self.fallbacks += 1
+            return None
+        try:
+            conn = self.connect()
+            try:
+                if timeout:
+                    deadline = time.monotonic() + timeout
+                    conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+                cursor = conn.execute(translated)
+                rows = cursor.fetchmany(max_rows + 1) if max_rows is not None else cursor.fetchall()
+                columns = [column[0] for column in cursor.description or []]
+            finally:
+                conn.close()
+        except sqlite3.OperationalError as e:
+            if str(e) == "interrupted":
+                return {
+                    "success": False,
+                    "error": f"Statement timeout: query cancelled after {timeout}s (local replica)"
+                }
+            print(f"↩️ Réplica local no pudo ejecutar la consulta, se usa SQL Server: {e}")
+            self.fallbacks += 1
+            return None
+        except sqlite3.Error as e:
+            print(f"↩️ Réplica local no pudo ejecutar la consulta, se usa SQL Server: {e}")
+            self.fallbacks += 1
+            return None
+
+        truncated = max_rows is not None and len(rows) > max_rows
+        if truncated:
+            rows = rows[:max_rows]
+        values = [list(column) for column in zip(*rows)] if rows else [[] for _ in columns]
+        types = [
+            column_types.get(name) or self._value_type(column_values)
+            for name, column_values in zip(columns, values)
+        ]
+        for index, kind in enumerate(types):
+            if kind == "boolean":
+                # Stored as 0 / 1
+                values[index] = [None if value is None else bool(value) for value in values[index]]
+            elif kind == "datetime":
+                # Same ISO form as the SQL Server results (datetime.isoformat)
+                values[index] = [
+                    value.replace(" ", "T", 1) if isinstance(value, str) else value for value in values[index]
+                ]
+        table = ColumnarResult(columns, values, types)
+
+        self.hits += 1
+        print(f"🗄️ Consulta respondida por la réplica local ({table.row_count} filas)")
+        return {
+            "success": True,
+            "table": table,
+            "columns": columns,
+            "row_count": table.row_count,
+            "truncated": truncated,
+            "memory_capped": False,
+            "replica": True
+        }
+
+    @staticmethod
+    def _column_types(column_types: Dict[str, str]) -> Dict[str, str]:
+        return {name.upper(): kind for name, kind in column_types.items()}
+
+    @staticmethod
+    def _value_type(values: List[Any]) -> str:
+        """Logical type of a computed column, from its first non-NULL value"""
+        for value in values:
+            if value is not None:
+                if isinstance(value, str) and _STORED_DATETIME.fullmatch(value):
+                    return "datetime"  # e.g. MAX(Fecha)
+                return column_type(type(value))
+        return "unknown"
+
+    def count_rows(self, query: str) -> Optional[int]:
+        """Total rows of a query on the replica, or None if it cannot run there"""
+        _, column_types = self._load_snapshot()
+        translated = to_sqlite(query, self._column_types(column_types))
+        if translated is None:
+            return None
+        try:
+            conn = self.connect()
+            try:
+                return conn.execute(f"SELECT COUNT(*) FROM ({translated}) AS capped_query").fetchone()[0]
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None
+
+    def refresh(self, source_connection, views: Optional[List[str]] = None, batch_size: int = 2000) -> Dict[str, int]:
+        """
+        Snapshot the views from a SQL Server connection into a new replica file.
+
+        The file is written next to the current one and swapped in when
+        complete, so queries keep using the previous snapshot meanwhile.
+
+        Returns:
+            Rows copied, by view
+        """
+        views = views or REPLICA_VIEWS
+        temp_path = f"{self.path}.tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        counts = {}
+        column_types: Dict[str, str] = {}
+        target = sqlite3.connect(temp_path)
+        _register_tsql_semantics(target)
+        try:
+            target.executescript("""
+                CREATE TABLE replica_views (view_name TEXT PRIMARY KEY, row_count INTEGER, refreshed_at REAL);
+                CREATE TABLE replica_columns (column_name TEXT PRIMARY KEY, column_type TEXT);
+            """)
+            for view in views:
+                started = time.time()
+                counts[view] = self._copy_view(source_connection, target, view, batch_size, column_types)
+                target.execute(
+                    "INSERT INTO replica_views (view_name, row_count, refreshed_at) VALUES (?, ?, ?)",
+                    (view, counts[view], started)
+                )
+                print(f"🗄️ {view}: {counts[view]} filas copiadas a la réplica")
+            # A name with different types in different views is left to value inference
+            target.executemany(
+                "INSERT INTO replica_columns (column_name, column_type) VALUES (?, ?)",
+                [(name, kind) for name, kind in column_types.items() if kind]
+            )
+            target.execute(f"PRAGMA user_version = {REPLICA_FORMAT_VERSION}")
+            target.commit()
+            target.execute("ANALYZE")
+        finally:
+            target.close()
+
+        os.replace(temp_path, self.path)
+        return counts
+
+    def _copy_view(self, source_connection, target: sqlite3.Connection, view: str, batch_size: int,
+                   column_types: Dict[str, str]) -> int:
+        cursor = source_connection.cursor()
+        try:
+            cursor.execute(f"SELECT * FROM Dir.[{view}]")
+            description = cursor.description
+            names = [column[0] for column in description]
+            types = [column_type(column[1]) for column in description]
+            # Datetimes as "YYYY-MM-DD HH:MM:SS[.ffffff]", so ISO literals compare like in SQL Server
+            stored_converters = {"datetime": stored_datetime, "time": time_of_day.isoformat}
+            converters = [
+                stored_converters.get(kind) or column_converter(column[1])
+                for column, kind in zip(description, types)
+            ]
+
+            declarations = [
+                f'"{name}" {_COLUMN_DECLARATIONS.get(kind, "")}'.rstrip() for name, kind in zip(names, types)
+            ]
+            target.execute(f'CREATE TABLE "{view}" ({", ".join(declarations)})')
+            insert = f'INSERT INTO "{view}" VALUES ({", ".join("?" for _ in declarations)})'
+
+            copied = 0
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                columns = [convert_column(values, converter) for values, converter in zip(zip(*batch), converters)]
+                target.executemany(insert, zip(*columns))
+                copied += len(batch)
+        finally:
+            cursor.close()
+
+        for name, kind in zip(names, types):
+            if column_types.setdefault(name, kind) != kind:
+                column_types[name] = None
+        for name in self.index_columns:
+            if name in names:
+                target.execute(f'CREATE INDEX "idx_{view}_{name}" ON "{view}" ("{name}")')
+        return copied
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Snapshot age and queries answered / sent back to SQL Server by this process"""
+        age = self.age_hours()
+        return {
+            "age_hours": round(age, 2) if age is not None else None,
+            "fresh": age is not None and age <= self.max_age_hours,
+            "hits": self.hits,
+            "fallbacks": self.fallbacks
+        }
+
+
+# Global replica instance
+_global_replica = None
+
+def get_replica() -> Optional[AnalyticalReplica]:
+    """Get global replica instance (None unless REPLICA_ENABLED is true)"""
+    global _global_replica
+    if os.getenv("REPLICA_ENABLED", "false").lower() not in ("true", "1", "yes"):
+        return None
+    if _global_replica is None:
+        _global_replica = AnalyticalReplica()
+    return _global_replica
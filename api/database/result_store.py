@@ -0,0 +1,135 @@
+"""
+Result Store - Keeps query result sets out of band, referenced by handle
+"""
+import contextvars
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from .columnar import ColumnarResult
+from .query_memo import QueryMemo
+
+# Seconds a store nobody closes (opened outside result_store_scope) is kept
+DEFAULT_STORE_TTL_SECONDS = 3600
+
+
+class ResultStore:
+    """
+    Result sets (columnar) of the queries of one request.
+
+    Skills put the result sets here and hand out only a handle; agents and
+    the API read them back by handle. They are stored by reference, never
+    copied or serialized.
+    """
+
+    def __init__(self, request_id: Optional[str] = None):
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.opened_at = time.monotonic()
+        # True while its request runs inside result_store_scope (never expired then)
+        self.scoped = False
+        self._tables: Dict[str, ColumnarResult] = {}
+        self._lock = threading.Lock()
+        # SQL already run in this request, so identical queries are executed once
+        self.queries = QueryMemo(self.put)
+
+    def put(self, table: ColumnarResult) -> str:
+        """Store a result set and return its handle"""
+        with self._lock:
+            handle = f"{self.request_id}/{len(self._tables) + 1}"
+            self._tables[handle] = table
+        return handle
+
+    def get(self, handle: str) -> Optional[ColumnarResult]:
+        """Result set for a handle, or None if unknown"""
+        return self._tables.get(handle)
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+
+# Store of the request being processed by the current thread / context
+_current_store: contextvars.ContextVar[Optional[ResultStore]] = contextvars.ContextVar(
+    "current_result_store", default=None
+)
+_open_stores: Dict[str, ResultStore] = {}
+_stores_lock = threading.Lock()
+
+
+def _store_ttl() -> float:
+    return float(os.getenv("RESULT_STORE_TTL", str(DEFAULT_STORE_TTL_SECONDS)))
+
+
+def open_result_store() -> ResultStore:
+    """
+    Create the store for a new request and make it current.
+
+    Stores stay open until close_result_store; only stores outside a
+    result_store_scope that are older than RESULT_STORE_TTL are released
+    here, so a running request never loses its result sets.
+    """
+    store = ResultStore()
+    now = time.monotonic()
+    ttl = _store_ttl()
+    with _stores_lock:
+        expired = [
+            request_id for request_id, open_store in _open_stores.items()
+            if not open_store.scoped and now - open_store.opened_at > ttl
+        ]
+        for request_id in expired:
+            del _open_stores[request_id]
+        _open_stores[store.request_id] = store
+    _current_store.set(store)
+    return store
+
+
+def close_result_store(store: Optional[ResultStore]):
+    """Release a request's result sets once its response has been built"""
+    if store is None:
+        return
+    store.scoped = False
+    with _stores_lock:
+        _open_stores.pop(store.request_id, None)
+    if _current_store.get() is store:
+        _current_store.set(None)
+
+
+@contextmanager
+def result_store_scope() -> Iterator[ResultStore]:
+    """Open a request's store for the block (results and response building) and close it after"""
+    previous = _current_store.get()
+    store = open_result_store()
+    store.scoped = True
+    try:
+        yield store
+    finally:
+        close_result_store(store)
+        _current_store.set(previous)
+
+
+def active_result_store() -> Optional[ResultStore]:
+    """Store of the current request, if any"""
+    return _current_store.get()
+
+
+def current_result_store() -> ResultStore:
+    """
+    Store of the current request. Outside a result_store_scope (e.g. the
+    orchestrator run from a script) one is opened and expires after the TTL.
+    """
+    store = _current_store.get()
+    if store is None:
+        store = open_result_store()
+    return store
+
+
+def get_table(handle: Optional[str]) -> Optional[ColumnarResult]:
+    """Resolve a handle from any open store"""
+    if not handle:
+        return None
+    request_id = handle.split("/", 1)[0]
+    with _stores_lock:
+        store = _open_stores.get(request_id)
+    return store.get(handle) if store else None
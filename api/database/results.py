@@ -0,0 +1,219 @@
+"""
+Query Results - Typed result and error protocol shared by skills and agents
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from .columnar import ColumnarResult
+from .result_store import current_result_store, get_table
+
+# Rows shown inline (tool messages, logs); the full result set stays in the result store
+PREVIEW_ROWS = 3
+
+
+class ErrorClass(Enum):
+    """Why a query failed; decides whether an LLM retry can help"""
+    VALIDATION = "validation"                  # Rejected before execution (not a SELECT, dangerous keyword)
+    INVALID_IDENTIFIER = "invalid_identifier"  # Unknown column or view
+    SYNTAX = "syntax"                          # SQL Server could not parse the query
+    TIMEOUT = "timeout"                        # Statement hit its time limit and was cancelled
+    COST = "cost"                              # Estimated plan above the cost limits, not executed
+    CONNECTION = "connection"                  # Server unreachable, login failed
+    PERMISSION = "permission"                  # Permission denied on an object
+    DRIVER = "driver"                          # pyodbc / ODBC driver not available
+    NO_RESULT = "no_result"                    # The LLM answered without running the query
+    UNEXPECTED = "unexpected"                  # Anything else
+
+
+# Failures an LLM rewrite cannot fix
+NON_RETRYABLE_ERRORS = frozenset({ErrorClass.CONNECTION, ErrorClass.PERMISSION, ErrorClass.DRIVER})
+
+# Failures a rewrite rarely fixes: retried at most this many times
+RETRY_LIMITS = {ErrorClass.TIMEOUT: 1}
+
+# (pattern over the driver message, error class); first match wins
+_ERROR_PATTERNS = [
+    (re.compile(r"rejected by plan estimate", re.IGNORECASE), ErrorClass.COST),
+    (re.compile(r"pyodbc not installed|No module named 'pyodbc'|libodbc|Can't open lib|Data source name not found|IM002", re.IGNORECASE), ErrorClass.DRIVER),
+    (re.compile(r"\b42S2[12]\b|\b42S0[12]\b|Invalid (column|object) name", re.IGNORECASE), ErrorClass.INVALID_IDENTIFIER),
+    (re.compile(r"Login timeout expired|Login failed|Connection pool exhausted", re.IGNORECASE), ErrorClass.CONNECTION),
+    (re.compile(r"\bHYT0[01]\b|\bHY008\b|timeout|timed out|Query cancelled|Operation canceled", re.IGNORECASE), ErrorClass.TIMEOUT),
+    (re.compile(r"permission was denied|\b229\b.*permission", re.IGNORECASE), ErrorClass.PERMISSION),
+    (re.compile(r"\b08001\b|\b08S01\b|\b28000\b|Login failed|Communication link failure|TCP Provider", re.IGNORECASE), ErrorClass.CONNECTION),
+    (re.compile(r"\b42000\b|Incorrect syntax|Syntax error|must appear in the GROUP BY|is not contained in either an aggregate", re.IGNORECASE), ErrorClass.SYNTAX),
+]
+
+
+def classify_error(message: str) -> ErrorClass:
+    """Map a driver / SQL Server error message to an ErrorClass"""
+    for pattern, error_class in _ERROR_PATTERNS:
+        if pattern.search(message or ""):
+            return error_class
+    return ErrorClass.UNEXPECTED
+
+
+@dataclass
+class QueryResult:
+    """
+    Outcome of a query skill.
+
+    Agents branch on `success` and `error_class` instead of scanning the
+    response text. The result set (columnar) lives in the request's result
+    store and is referenced by `handle`; str() gives the JSON form used in logs and tool messages,
+    which carries only the handle, counts, columns and a short preview.
+    """
+    success: bool
+    handle: Optional[str] = None
+    preview: List[Dict[str, Any]] = field(default_factory=list)
+    columns: List[str] = field(default_factory=list)
+    row_count: int = 0
+    truncated: bool = False  # Rows were cut at the row cap
+    total_count: Optional[int] = None  # Rows the uncapped query would return (when truncated)
+    query_executed: Optional[str] = None
+    query_attempted: Optional[str] = None
+    query_type: Optional[str] = None
+    message: str = ""
+    error: Optional[str] = None
+    error_class: Optional[ErrorClass] = None
+    original_query: Optional[str] = None
+    repairs: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_table(cls, table: ColumnarResult, **kwargs) -> "QueryResult":
+        """Successful result whose result set goes to the current request's result store"""
+        return cls(
+            success=True,
+            handle=current_result_store().put(table),
+            preview=table.to_rows(stop=PREVIEW_ROWS),
+            columns=table.columns,
+            row_count=table.row_count,
+            **kwargs
+        )
+
+    @property
+    def table(self) -> ColumnarResult:
+        """Full result set (resolved from the result store; empty once the request is closed)"""
+        table = get_table(self.handle)
+        return table if table is not None else ColumnarResult.empty(self.columns)
+
+    @classmethod
+    def failure(cls, error: str, error_class: Optional[ErrorClass] = None, **kwargs) -> "QueryResult":
+        """Failed result; the error class is inferred from the message if not given"""
+        return cls(
+            success=False,
+            error=error,
+            error_class=error_class or classify_error(error),
+            **kwargs
+        )
+
+    @property
+    def status(self) -> str:
+        return "success" if self.success else "error"
+
+    @property
+    def retryable(self) -> bool:
+        """Whether an LLM retry could fix the failure"""
+        return not self.success and self.error_class not in NON_RETRYABLE_ERRORS
+
+    @property
+    def max_retries(self) -> Optional[int]:
+        """Retry limit for this kind of failure (None: the task's own limit)"""
+        return RETRY_LIMITS.get(self.error_class)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-compatible dict (only the fields that are set)"""
+        result: Dict[str, Any] = {"success": self.success, "status": self.status}
+        if self.success:
+            result.update({
+                "handle": self.handle,
+                "row_count": self.row_count,
+                "columns": self.columns,
+                "preview": self.preview,
+                "query_executed": self.query_executed,
+                "message": self.message
+            })
+            if self.truncated:
+                result["truncated"] = True
+                result["total_count"] = self.total_count
+        else:
+            result.update({
+                "error": self.error,
+                "error_class": self.error_class.value if self.error_class else None
+            })
+            if self.query_attempted:
+                result["query_attempted"] = self.query_attempted
+        if self.query_type:
+            result["query_type"] = self.query_type
+        if self.repairs:
+            result["original_query"] = self.original_query
+            result["repairs"] = self.repairs
+        return result
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    def __str__(self) -> str:
+        return self.to_json()
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> "QueryResult":
+        """Rebuild a result from its dict form (inline "data" rows are moved to the store as columns)"""
+        if payload.get("success") and isinstance(payload.get("data"), list):
+            return cls.from_table(
+                ColumnarResult.from_rows(payload["data"], payload.get("columns")),
+                truncated=bool(payload.get("truncated")),
+                total_count=payload.get("total_count"),
+                query_executed=payload.get("query_executed"),
+                query_type=payload.get("query_type"),
+                message=payload.get("message", ""),
+                original_query=payload.get("original_query"),
+                repairs=payload.get("repairs") or []
+            )
+
+        error_class = payload.get("error_class")
+        return cls(
+            success=bool(payload.get("success")),
+            handle=payload.get("handle"),
+            preview=payload.get("preview") or [],
+            columns=payload.get("columns") or [],
+            row_count=payload.get("row_count", 0),
+            truncated=bool(payload.get("truncated")),
+            total_count=payload.get("total_count"),
+            query_executed=payload.get("query_executed"),
+            query_attempted=payload.get("query_attempted"),
+            query_type=payload.get("query_type"),
+            message=payload.get("message", ""),
+            error=payload.get("error"),
+            error_class=ErrorClass(error_class) if error_class else (
+                None if payload.get("success") else classify_error(payload.get("error", ""))
+            ),
+            original_query=payload.get("original_query"),
+            repairs=payload.get("repairs") or []
+        )
+
+    @classmethod
+    def coerce(cls, value: Any) -> Optional["QueryResult"]:
+        """
+        Interpret a skill / agent response as a QueryResult.
+
+        Accepts a QueryResult, its dict or JSON form, or a list of them (the
+        last one wins, as for multiple tool calls). Returns None for anything
+        else, e.g. a plain text answer.
+        """
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, list):
+            results = [cls.coerce(item) for item in value]
+            results = [result for result in results if result is not None]
+            return results[-1] if results else None
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except (ValueError, TypeError):
+                return None
+        if isinstance(value, dict) and "success" in value:
+            return cls.from_dict(value)
+        return None
@@ -1,12 +1,15 @@
 """
 Dynamic Database Schema Mapper - Automatically discovers and maps database schemas
 """
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
+import hashlib
 import json
 import os
 from datetime import datetime
 from dotenv import load_dotenv
+from .connection_pool import get_connection_pool
+from .timeouts import statement_timeout
 
 load_dotenv()
 
@@ -61,6 +64,8 @@ class DynamicSchemaMapper:
         self.cache_file = cache_file
         self.tables: Dict[str, TableInfo] = {}
         self.connection_config = self._load_default_config()
+        self.schema_version: str = ""
+        self._ai_schema_cache: Dict[Tuple[str, Optional[Tuple[str, ...]]], Dict[str, Any]] = {}
         self._load_cache()
 
         # Auto-discover if no cache exists
@@ -114,7 +119,8 @@ class DynamicSchemaMapper:
             else:
                 conn_str = self._build_connection_string()
 
-            with pyodbc.connect(conn_str) as conn:
+            with statement_timeout("schema_discovery") as timeout, get_connection_pool(conn_str, name="schema").connection() as conn:
+                conn.timeout = timeout
                 cursor = conn.cursor()
 
                 # Discover tables and views
@@ -162,6 +168,7 @@ class DynamicSchemaMapper:
         # Update internal tables and cache
         self.tables.update(discovered_tables)
         self._save_cache()
+        self._update_version()
 
         return discovered_tables
 
@@ -369,6 +376,7 @@ class DynamicSchemaMapper:
 
         # Save updated cache
         self._save_cache()
+        self._update_version()
         return enriched_tables
 
     def get_table_info(self, table_name: str) -> Optional[TableInfo]:
@@ -379,12 +387,44 @@ class DynamicSchemaMapper:
         """Get information about all tables"""
         return list(self.tables.values())
 
+    def _update_version(self):
+        """
+        Recompute the schema version id and drop memoized renderings.
+
+        The version is a short hash of the table definitions, so it only
+        changes when the schema (or its descriptions) actually changes.
+        """
+        serialized = json.dumps(
+            {name: asdict(table) for name, table in sorted(self.tables.items())},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        self.schema_version = hashlib.sha1(serialized.encode("utf-8")).hexdigest()[:12]
+        self._ai_schema_cache.clear()
+
     def get_schema_for_ai(self, table_names: List[str] = None) -> Dict[str, Any]:
-        """Get schema information formatted for AI consumption"""
-        tables_to_include = table_names or list(self.tables.keys())
+        """
+        Get schema information formatted for AI consumption.
 
+        Results are memoized per (schema version, table subset); the returned
+        dict is shared between callers and must be treated as read-only.
+        """
+        subset = tuple(sorted(set(table_names))) if table_names else None
+        cache_key = (self.schema_version, subset)
+        cached = self._ai_schema_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        schema_info = self._build_schema_for_ai(list(subset) if subset else list(self.tables.keys()))
+        self._ai_schema_cache[cache_key] = schema_info
+        return schema_info
+
+    def _build_schema_for_ai(self, tables_to_include: List[str]) -> Dict[str, Any]:
+        """Build the AI schema dict for the given tables"""
         schema_info = {
             "database_overview": {
+                "version": self.schema_version,
                 "total_tables": len(self.tables),
                 "last_discovery": max([t.last_updated for t in self.tables.values()]) if self.tables else None
             },
@@ -518,6 +558,8 @@ class DynamicSchemaMapper:
             except Exception as e:
                 print(f"Error loading schema cache: {e}")
 
+        self._update_version()
+
     def _save_cache(self):
         """Save schema information to cache"""
         try:
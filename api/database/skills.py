@@ -2,24 +2,121 @@
 Flexible Database Skills for InstantNeo agents
 """
 from instantneo.skills import skill
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from .connection_manager import DatabaseConnectionManager
 from .schema_mapper import DynamicSchemaMapper
+from .sql_repair import SQLRepairer
+from .results import QueryResult, ErrorClass
+from .result_store import current_result_store
 from utils.logger import get_logger
 import json
 
 # Global instances
 db_manager = DatabaseConnectionManager()
 schema_mapper = DynamicSchemaMapper()
+sql_repairer = SQLRepairer(schema_mapper)
+if schema_mapper.tables:
+    # Generated queries may only read the views the agents are shown
+    db_manager.sql_validator.set_allowed_views(schema_mapper.tables)
 logger = get_logger()
 
+# Local repair rounds before a failed query is handed back to the LLM
+MAX_REPAIR_ATTEMPTS = 2
+
+
+def _execute_with_repair(query: str) -> Tuple[Dict[str, Any], str, List[str]]:
+    """
+    Execute a query; if it fails on an identifier the cached schema can fix
+    (misspelled column, missing schema prefix, reserved word), repair it
+    locally and execute again.
+
+    Returns:
+        Tuple (result, executed_query, fixes)
+    """
+    result = db_manager.execute_query_safely(query)
+    executed_query = query
+    fixes = []
+
+    for _ in range(MAX_REPAIR_ATTEMPTS):
+        if result["success"]:
+            break
+
+        repair = sql_repairer.repair(executed_query, result.get("error", ""))
+        if not repair or not db_manager.validate_query_syntax(repair.query)["valid"]:
+            break
+
+        logger.log_sql_query(executed_query, False, 0, result.get("error"))
+        print(f"🔧 SQL reparado localmente: {'; '.join(repair.fixes)}")
+        executed_query = repair.query
+        fixes.extend(repair.fixes)
+        result = db_manager.execute_query_safely(executed_query)
+
+    return result, executed_query, fixes
+
+
+def _run_once(query: str, execute: Callable[[], QueryResult]) -> QueryResult:
+    """Run a query skill at most once per request for the same (normalized) SQL"""
+    memo = current_result_store().queries
+    return memo.run(db_manager._convert_to_sqlserver_syntax(query), execute)
+
+
+def _execute_select(query: str) -> QueryResult:
+    """Execute a validated SELECT and wrap the outcome in a QueryResult"""
+    # Execute query with safety limits (and local repair of identifier errors)
+    result, query_executed, fixes = _execute_with_repair(query)
+
+    # Log the executed query
+    print(f"🔍 SQL EJECUTADO: {query_executed}")
+    logger.log_sql_query(query_executed, result["success"], result.get("row_count", 0), result.get("error"), result.get("columns"))
+
+    if result["success"]:
+        print(f"✅ Consulta exitosa: {result['row_count']} filas devueltas")
+        return QueryResult.from_table(
+            result["table"],
+            truncated=result.get("truncated", False),
+            total_count=result.get("total_count"),
+            query_executed=query_executed,
+            message=f"Query executed successfully. Returned {result['row_count']} rows.",
+            original_query=query if fixes else None,
+            repairs=fixes
+        )
+    else:
+        print(f"❌ Error en consulta: {result['error']}")
+        return QueryResult.failure(result["error"], query_attempted=query_executed)
+
+
+def _execute_complex(query: str) -> QueryResult:
+    """Execute a validated complex query and wrap the outcome in a QueryResult"""
+    # Execute complex query (with local repair of identifier errors)
+    result, query_executed, fixes = _execute_with_repair(query)
+
+    # Log the executed query
+    print(f"🔍 COMPLEX SQL EJECUTADO: {query_executed}")
+    logger.log_sql_query(query_executed, result["success"], result.get("row_count", 0), result.get("error"), result.get("columns"))
+
+    if result["success"]:
+        print(f"✅ Consulta compleja exitosa: {result['row_count']} filas devueltas")
+        return QueryResult.from_table(
+            result["table"],
+            truncated=result.get("truncated", False),
+            total_count=result.get("total_count"),
+            query_executed=query_executed,
+            query_type="complex_join",
+            message=f"Complex query executed successfully. Returned {result['row_count']} rows.",
+            original_query=query if fixes else None,
+            repairs=fixes
+        )
+    else:
+        print(f"❌ Error en consulta compleja: {result['error']}")
+        return QueryResult.failure(result["error"], query_attempted=query_executed, query_type="complex_join")
+
 @skill(
     description="Execute a safe SQL SELECT query on the SERFOR database",
     parameters={
         "query": "SQL SELECT query to execute"
     }
 )
-def execute_select_query(query: str) -> str:
+def execute_select_query(query: str) -> QueryResult:
     """
     Execute a SELECT query safely on the database
 
@@ -27,48 +124,24 @@ def execute_select_query(query: str) -> str:
         query: SQL SELECT query
         
     Returns:
-        JSON string with query results
+        QueryResult with rows or a classified error
     """
     try:
         # Validate query syntax
         validation = db_manager.validate_query_syntax(query)
         if not validation["valid"]:
-            return json.dumps({
-                "success": False,
-                "error": f"Query validation failed: {validation['error']}"
-            })
+            return QueryResult.failure(
+                f"Query validation failed: {validation['error']}",
+                ErrorClass.VALIDATION,
+                query_attempted=query
+            )
 
-        # Execute query with safety limits
-        result = db_manager.execute_query_safely(query)
-
-        # Log the executed query
-        print(f"🔍 SQL EJECUTADO: {query}")
-        logger.log_sql_query(query, result["success"], result.get("row_count", 0), result.get("error"), result.get("columns"))
-
-        if result["success"]:
-            print(f"✅ Consulta exitosa: {result['row_count']} filas devueltas")
-            return json.dumps({
-                "success": True,
-                "data": result["data"],
-                "columns": result["columns"],
-                "row_count": result["row_count"],
-                "query_executed": query,
-                "message": f"Query executed successfully. Returned {result['row_count']} rows."
-            })
-        else:
-            print(f"❌ Error en consulta: {result['error']}")
-            return json.dumps({
-                "success": False,
-                "error": result["error"],
-                "query_attempted": query
-            })
+        # Identical SQL already run in this request is answered from its result
+        return _run_once(query, lambda: _execute_select(query))
 
     except Exception as e:
         print(f"❌ Error inesperado: {str(e)}")
-        return json.dumps({
-            "success": False,
-            "error": f"Unexpected error: {str(e)}"
-        })
+        return QueryResult.failure(f"Unexpected error: {str(e)}", ErrorClass.UNEXPECTED, query_attempted=query)
 
 @skill(
     description="Get schema information for tables in the database",
@@ -112,7 +185,7 @@ def get_table_schemas(table_names: Optional[str] = None) -> str:
         "query": "Complete SQL query with JOINs, WHERE clauses, etc."
     }
 )
-def execute_complex_query(query: str) -> str:
+def execute_complex_query(query: str) -> QueryResult:
     """
     Execute complex SQL queries that involve JOINs, subqueries, etc.
 
@@ -120,51 +193,31 @@ def execute_complex_query(query: str) -> str:
         query: Complete SQL query string
 
     Returns:
-        JSON string with query results
+        QueryResult with rows or a classified error
     """
     try:
         # Enhanced validation for complex queries
         validation = db_manager.validate_query_syntax(query)
         if not validation["valid"]:
-            return json.dumps({
-                "success": False,
-                "error": f"Query validation failed: {validation['error']}"
-            })
-
-        # Execute complex query
-        result = db_manager.execute_query_safely(query)
-
-        # Log the executed query
-        print(f"🔍 COMPLEX SQL EJECUTADO: {query}")
-        logger.log_sql_query(query, result["success"], result.get("row_count", 0), result.get("error"), result.get("columns"))
+            return QueryResult.failure(
+                f"Query validation failed: {validation['error']}",
+                ErrorClass.VALIDATION,
+                query_attempted=query,
+                query_type="complex_join"
+            )
 
-        if result["success"]:
-            print(f"✅ Consulta compleja exitosa: {result['row_count']} filas devueltas")
-            return json.dumps({
-                "success": True,
-                "data": result["data"],
-                "columns": result["columns"],
-                "row_count": result["row_count"],
-                "query_executed": query,
-                "query_type": "complex_join",
-                "message": f"Complex query executed successfully. Returned {result['row_count']} rows."
-            })
-        else:
-            print(f"❌ Error en consulta compleja: {result['error']}")
-            return json.dumps({
-                "success": False,
-                "error": result["error"],
-                "query_attempted": query,
-                "query_type": "complex_join"
-            })
+        # Identical SQL already run in this request is answered from its result
+        return _run_once(query, lambda: _execute_complex(query))
 
     except Exception as e:
         print(f"❌ Error inesperado en consulta compleja: {str(e)}")
         logger.log_error("complex_query_execution", str(e), {"query": query})
-        return json.dumps({
-            "success": False,
-            "error": f"Unexpected error in complex query: {str(e)}"
-        })
+        return QueryResult.failure(
+            f"Unexpected error in complex query: {str(e)}",
+            ErrorClass.UNEXPECTED,
+            query_attempted=query,
+            query_type="complex_join"
+        )
 
 @skill(
     description="Test database connection",
@@ -204,6 +257,12 @@ def refresh_database_schema() -> str:
 
         # Discover schema
         discovered_tables = schema_mapper.discover_schema()
+        if schema_mapper.tables:
+            db_manager.sql_validator.set_allowed_views(schema_mapper.tables)
+
+        # Cached results may no longer match the refreshed views
+        if db_manager.query_cache:
+            db_manager.query_cache.invalidate()
 
         return json.dumps({
             "success": True,
@@ -0,0 +1,159 @@
+"""
+SQL Repair - Fixes common identifier errors locally using the cached schema
+"""
+import difflib
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .schema_mapper import DynamicSchemaMapper
+
+# SQL Server error messages we know how to repair
+_INVALID_COLUMN = re.compile(r"Invalid column name '([^']+)'", re.IGNORECASE)
+_INVALID_OBJECT = re.compile(r"Invalid object name '([^']+)'", re.IGNORECASE)
+_RESERVED_KEYWORD = re.compile(r"Incorrect syntax near the keyword '([^']+)'", re.IGNORECASE)
+
+# String literals are never modified
+_STRING_LITERAL = re.compile(r"N?'(?:[^']|'')*'")
+
+# Minimum similarity for a fuzzy identifier match
+FUZZY_CUTOFF = 0.8
+
+
+@dataclass
+class RepairResult:
+    """A repaired query and the fixes applied to it"""
+    query: str
+    fixes: List[str] = field(default_factory=list)
+
+
+class SQLRepairer:
+    """
+    Repairs queries that failed with "Invalid column name", "Invalid object
+    name" or a reserved word used as identifier, without calling an LLM.
+
+    Fixes are only applied when they are unambiguous against the cached
+    schema; otherwise repair returns None and the caller falls back to the
+    LLM retry.
+    """
+
+    def __init__(self, schema_mapper: DynamicSchemaMapper):
+        self.schema_mapper = schema_mapper
+
+    def repair(self, query: str, error: str) -> Optional[RepairResult]:
+        """
+        Try to fix the query for the given SQL Server error.
+
+        Args:
+            query: Query that failed
+            error: Error message returned by the driver
+
+        Returns:
+            RepairResult with the new query, or None if nothing could be fixed
+        """
+        if not query or not error:
+            return None
+
+        fixes = []
+        repaired = query
+
+        for name in _INVALID_OBJECT.findall(error):
+            repaired, fix = self._repair_object(repaired, name)
+            if fix:
+                fixes.append(fix)
+
+        for name in _INVALID_COLUMN.findall(error):
+            repaired, fix = self._repair_column(repaired, name)
+            if fix:
+                fixes.append(fix)
+
+        for keyword in _RESERVED_KEYWORD.findall(error):
+            repaired, fix = self._quote_reserved_word(repaired, keyword)
+            if fix:
+                fixes.append(fix)
+
+        if not fixes or repaired == query:
+            return None
+        return RepairResult(query=repaired, fixes=fixes)
+
+    def _repair_object(self, query: str, name: str) -> Tuple[str, Optional[str]]:
+        """Add the missing schema prefix or fix a misspelled view name"""
+        bare_name = name.split(".")[-1].strip("[]")
+        tables = self.schema_mapper.tables
+        match = self._closest(bare_name, list(tables))
+        if not match:
+            return query, None
+
+        qualified = f"{tables[match].schema}.{match}"
+        # Dir.V_X, [Dir].[V_X], dbo.V_X or bare V_X → canonical qualified name
+        pattern = re.compile(
+            r"(?<![\w.\]])(?:\[?\w+\]?\.)?\[?" + re.escape(bare_name) + r"\]?(?![\w\[])",
+            re.IGNORECASE
+        )
+        repaired = _substitute_outside_literals(query, pattern, qualified)
+        if repaired == query:
+            return query, None
+        return repaired, f"objeto '{name}' → {qualified}"
+
+    def _repair_column(self, query: str, name: str) -> Tuple[str, Optional[str]]:
+        """Replace a misspelled column with the closest column of the queried views"""
+        candidates = self._columns_for_query(query)
+        match = self._closest(name, candidates)
+        if not match or match == name:
+            return query, None
+
+        pattern = re.compile(r"(?<![\w\[])\[?" + re.escape(name) + r"\]?(?![\w\]])")
+        repaired = _substitute_outside_literals(query, pattern, match)
+        if repaired == query:
+            return query, None
+        return repaired, f"columna '{name}' → {match}"
+
+    def _quote_reserved_word(self, query: str, keyword: str) -> Tuple[str, Optional[str]]:
+        """Bracket a column name that collides with a reserved word"""
+        columns = {column.lower(): column for column in self._columns_for_query(query)}
+        column = columns.get(keyword.lower())
+        if not column:
+            return query, None
+
+        # Only identifiers used as column references: after '.', ',' or SELECT/BY lists
+        pattern = re.compile(
+            r"(?<=[.,(\s])" + re.escape(column) + r"(?=\s*(?:,|=|<|>|\)|\bFROM\b|\bAS\b|$))",
+            re.IGNORECASE
+        )
+        repaired = _substitute_outside_literals(query, pattern, f"[{column}]")
+        if repaired == query:
+            return query, None
+        return repaired, f"palabra reservada '{column}' entre corchetes"
+
+    def _columns_for_query(self, query: str) -> List[str]:
+        """Columns of the views referenced in the query (all views if none is recognized)"""
+        tables = self.schema_mapper.tables
+        upper_query = query.upper()
+        referenced = [table for name, table in tables.items() if name.upper() in upper_query]
+
+        columns: Dict[str, None] = {}
+        for table in referenced or tables.values():
+            for column in table.columns:
+                columns.setdefault(column.name, None)
+        return list(columns)
+
+    @staticmethod
+    def _closest(name: str, candidates: List[str]) -> Optional[str]:
+        """Single best case-insensitive fuzzy match above FUZZY_CUTOFF"""
+        by_lower = {candidate.lower(): candidate for candidate in candidates}
+        if name.lower() in by_lower:
+            return by_lower[name.lower()]
+        matches = difflib.get_close_matches(name.lower(), list(by_lower), n=1, cutoff=FUZZY_CUTOFF)
+        return by_lower[matches[0]] if matches else None
+
+
+def _substitute_outside_literals(query: str, pattern: re.Pattern, replacement: str) -> str:
+    """Apply a substitution only to the parts of the query outside string literals"""
+    parts = []
+    last = 0
+    for literal in _STRING_LITERAL.finditer(query):
+        parts.append(pattern.sub(lambda _: replacement, query[last:literal.start()]))
+        parts.append(literal.group(0))
+        last = literal.end()
+    parts.append(pattern.sub(lambda _: replacement, query[last:]))
+    return "".join(parts)
@@ -0,0 +1,374 @@
+"""
+SQL Validator - Read-only checks on the tokenized T-SQL of generated queries
+
+The checks run on a T-SQL tokenizer and a scan of FROM / JOIN / APPLY
+clauses, not on a full parser (no new dependency, and the accepted shape is
+small: one SELECT, optionally with CTEs). Its limits, on purpose:
+
+- Anything outside that shape is rejected rather than understood: other
+  statements, the forbidden keywords anywhere outside identifiers and
+  literals, table-valued functions, temporary tables, three-part names.
+- CTE names are visible to the whole statement, without SQL Server's scoping
+  (a CTE used before its definition passes here and fails on the server).
+- Column references are not resolved; only objects are.
+- Object names must be schema-qualified unless they are CTEs of the query:
+  a one-part name resolves in the login's default schema, which the
+  validator cannot see.
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_ALLOWED_SCHEMAS = "Dir"
+DEFAULT_CACHE_SIZE = 1024
+
+_TOKEN = re.compile(
+    r"([Nn]?'(?:[^']|'')*')"              # string literal
+    r"|(0x[0-9A-Fa-f]*|\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)"  # number
+    r"|\[((?:[^\]]|\]\])*)\]"             # [bracketed] identifier
+    r"|\"((?:[^\"]|\"\")*)\""             # "quoted" identifier
+    r"|(@@?\w+|#{1,2}\w+|\w+)"            # word, @variable or #temp table
+    r"|(<>|!=|<=|>=|!<|!>|\|\||[-+*/%=<>(),.;~&|^:!])",
+    re.UNICODE
+)
+
+# Statements and clauses that write, run code or reach outside the allowed views.
+# Reserved words in T-SQL: as bare words they can only be keywords (a column
+# with one of these names has to be bracketed, and is then a name token).
+FORBIDDEN_KEYWORDS = {
+    "INSERT", "UPDATE", "DELETE", "MERGE", "TRUNCATE", "DROP", "ALTER", "CREATE",
+    "INTO", "EXEC", "EXECUTE", "DECLARE", "SET", "USE", "GRANT", "REVOKE", "DENY",
+    "BACKUP", "RESTORE", "DBCC", "BULK", "KILL", "SHUTDOWN", "RECONFIGURE", "CHECKPOINT",
+    "WAITFOR", "BEGIN", "COMMIT", "ROLLBACK", "SAVE", "TRAN", "TRANSACTION", "GOTO",
+    "RAISERROR", "PRINT", "READTEXT", "WRITETEXT", "UPDATETEXT",
+    "OPENROWSET", "OPENQUERY", "OPENDATASOURCE", "OPENXML"
+}
+
+# Keywords that end a FROM clause at their nesting level
+_CLAUSE_KEYWORDS = {
+    "SELECT", "WHERE", "GROUP", "HAVING", "ORDER", "UNION", "EXCEPT", "INTERSECT",
+    "ON", "OPTION", "FOR", "OFFSET", "FETCH", "WINDOW"
+}
+
+
+@dataclass
+class ValidationResult:
+    """Outcome of validating one query"""
+    valid: bool
+    error: Optional[str] = None
+    views: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        if not self.valid:
+            return {"valid": False, "error": self.error}
+        return {"valid": True, "message": "Query syntax appears valid", "views": self.views}
+
+
+def tokenize(query: str) -> List[Tuple[str, str]]:
+    """
+    (kind, text) tokens of a T-SQL batch: "string", "number", "name" (bracketed
+    or quoted), "word", "symbol". Comments and whitespace are dropped; nested
+    block comments are handled like SQL Server does. Raises ValueError on
+    unterminated literals, identifiers or comments.
+    """
+    tokens = []
+    position = 0
+    length = len(query)
+    while position < length:
+        char = query[position]
+        if char.isspace():
+            position += 1
+            continue
+        if query.startswith("--", position):
+            end = query.find("\n", position)
+            position = length if end < 0 else end + 1
+            continue
+        if query.startswith("/*", position):
+            depth = 0
+            while position < length:
+                if query.startswith("/*", position):
+                    depth += 1
+                    position += 2
+                elif query.startswith("*/", position):
+                    depth -= 1
+                    position += 2
+                    if depth == 0:
+                        break
+                else:
+                    position += 1
+            if depth:
+                raise ValueError("Unterminated comment")
+            continue
+
+        match = _TOKEN.match(query, position)
+        if not match:
+            if char in "'[\"" or (char in "Nn" and query.startswith("'", position + 1)):
+                raise ValueError("Unterminated string literal or identifier")
+            raise ValueError(f"Unexpected character '{char}'")
+        string, number, bracketed, quoted, word, symbol = match.groups()
+        if string is not None:
+            tokens.append(("string", string))
+        elif number is not None:
+            tokens.append(("number", number))
+        elif bracketed is not None:
+            tokens.append(("name", bracketed.replace("]]", "]")))
+        elif quoted is not None:
+            tokens.append(("name", quoted.replace('""', '"')))
+        elif word is not None:
+            tokens.append(("word", word))
+        else:
+            tokens.append(("symbol", symbol))
+        position = match.end()
+    return tokens
+
+
+class _Scope:
+    """Parsing state of one parenthesis level"""
+
+    def __init__(self):
+        self.has_select = False
+        self.in_from = False
+        self.expect_table = False
+
+
+class SQLValidator:
+    """
+    Checks that a query is a single read-only SELECT (optionally with CTEs)
+    over the allowed schemas and views.
+
+    The query is tokenized, so keywords inside string literals, comments or
+    identifiers such as FechaUpdate never count, and every object in a FROM,
+    JOIN or APPLY is resolved: it must be a CTE of the query or a view
+    qualified with an allowed schema (and of the allowed views, once they are
+    known). Results are cached by the SHA-1 of the query text, so the retries
+    of a plan do not validate the same SQL again.
+    """
+
+    def __init__(
+        self,
+        allowed_schemas: Optional[Iterable[str]] = None,
+        allowed_views: Optional[Iterable[str]] = None,
+        cache_size: Optional[int] = None
+    ):
+        if allowed_schemas is None:
+            allowed_schemas = os.getenv("SQL_ALLOWED_SCHEMAS", DEFAULT_ALLOWED_SCHEMAS).split(",")
+        if allowed_views is None and os.getenv("SQL_ALLOWED_VIEWS"):
+            allowed_views = os.getenv("SQL_ALLOWED_VIEWS").split(",")
+        schemas = [schema.strip() for schema in allowed_schemas if schema.strip()]
+        self.allowed_schemas = {schema.upper() for schema in schemas}
+        # Suggested in the error for unqualified names
+        self._schema_hint = schemas[0] if schemas else "schema"
+        self.allowed_views = None
+        self.views_fixed = allowed_views is not None
+        if allowed_views is not None:
+            self.allowed_views = {view.strip().upper() for view in allowed_views if view.strip()}
+        self.cache_size = cache_size or int(os.getenv("SQL_VALIDATION_CACHE_SIZE", str(DEFAULT_CACHE_SIZE)))
+        self._cache: "OrderedDict[str, ValidationResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def set_allowed_views(self, views: Iterable[str]):
+        """Views discovered in the schema (ignored when SQL_ALLOWED_VIEWS fixes them)"""
+        if self.views_fixed:
+            return
+        with self._lock:
+            self.allowed_views = {view.upper() for view in views}
+            self._cache.clear()
+
+    def validate(self, query: str) -> ValidationResult:
+        """Validation result of a query (from the cache when it was already checked)"""
+        key = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        try:
+            result = self._validate(tokenize(query))
+        except ValueError as e:
+            result = ValidationResult(False, f"Invalid SQL: {str(e)}")
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _validate(self, tokens: List[Tuple[str, str]]) -> ValidationResult:
+        # Leading ";WITH" and trailing semicolons are allowed, nothing after them
+        while tokens and tokens[0] == ("symbol", ";"):
+            tokens = tokens[1:]
+        while tokens and tokens[-1] == ("symbol", ";"):
+            tokens = tokens[:-1]
+        if not tokens:
+            return ValidationResult(False, "Empty query")
+        if ("symbol", ";") in tokens:
+            return ValidationResult(False, "Only a single statement is allowed")
+
+        for index, (kind, text) in enumerate(tokens):
+            # After a dot a word is a column or object name, not a keyword
+            if index and tokens[index - 1] == ("symbol", "."):
+                continue
+            if kind == "word" and text.upper() in FORBIDDEN_KEYWORDS:
+                return ValidationResult(False, f"Query contains potentially dangerous operation: {text.upper()}")
+            if kind == "word" and text.startswith("#"):
+                return ValidationResult(False, "Temporary tables are not allowed")
+
+        first = tokens[0][1].upper() if tokens[0][0] == "word" else ""
+        if first == "WITH":
+            ctes, position = self._parse_ctes(tokens)
+            if position >= len(tokens) or tokens[position][0] != "word" or tokens[position][1].upper() != "SELECT":
+                return ValidationResult(False, "Only SELECT queries are allowed after WITH")
+        elif first == "SELECT":
+            ctes = set()
+        else:
+            return ValidationResult(False, "Only SELECT queries are allowed")
+
+        error, views = self._check_objects(tokens, ctes)
+        if error:
+            return ValidationResult(False, error)
+        return ValidationResult(True, views=views)
+
+    @staticmethod
+    def _parse_ctes(tokens: List[Tuple[str, str]]) -> Tuple[set, int]:
+        """CTE names of a WITH prefix and the position of the statement after it"""
+        ctes = set()
+        position = 1
+        while position < len(tokens):
+            kind, name = tokens[position]
+            if kind not in ("word", "name"):
+                raise ValueError("expected a CTE name")
+            ctes.add(name.upper())
+            position += 1
+            if tokens[position:position + 1] == [("symbol", "(")]:
+                position = _skip_parentheses(tokens, position)
+            if position >= len(tokens) or tokens[position][1].upper() != "AS":
+                raise ValueError("expected AS in CTE")
+            position += 1
+            if tokens[position:position + 1] != [("symbol", "(")]:
+                raise ValueError("expected ( in CTE")
+            position = _skip_parentheses(tokens, position)
+            if tokens[position:position + 1] != [("symbol", ",")]:
+                return ctes, position
+            position += 1
+        raise ValueError("incomplete WITH clause")
+
+    def _check_objects(self, tokens: List[Tuple[str, str]], ctes: set) -> Tuple[Optional[str], List[str]]:
+        """First disallowed object reference (None if all are allowed) and the views read"""
+        views: Dict[str, None] = {}
+        scopes = [_Scope()]
+        position = 0
+        while position < len(tokens):
+            kind, text = tokens[position]
+            scope = scopes[-1]
+            word = text.upper() if kind == "word" else None
+
+            if (kind, text) == ("symbol", "("):
+                scope.expect_table = False
+                scopes.append(_Scope())
+            elif (kind, text) == ("symbol", ")"):
+                if len(scopes) == 1:
+                    raise ValueError("unbalanced parentheses")
+                scopes.pop()
+            elif word == "SELECT":
+                scope.has_select = True
+                scope.in_from = scope.expect_table = False
+            elif word in ("FROM", "JOIN", "APPLY") and scope.has_select:
+                # FROM inside a function call (e.g. TRIM(' ' FROM x)) has no SELECT in its scope
+                scope.in_from = scope.expect_table = True
+            elif word in _CLAUSE_KEYWORDS:
+                scope.in_from = scope.expect_table = False
+            elif (kind, text) == ("symbol", ",") and scope.in_from:
+                scope.expect_table = True
+            elif scope.expect_table and kind in ("word", "name"):
+                scope.expect_table = False
+                parts, position = _object_name(tokens, position)
+                if tokens[position:position + 1] == [("symbol", "(")]:
+                    return f"Table-valued functions are not allowed: {'.'.join(parts)}", []
+                error = self._check_object(parts, ctes)
+                if error:
+                    return error, []
+                if len(parts) > 1 or parts[0].upper() not in ctes:
+                    views.setdefault(parts[-1].upper(), None)
+                continue
+            position += 1
+
+        if len(scopes) != 1:
+            raise ValueError("unbalanced parentheses")
+        return None, list(views)
+
+    def _check_object(self, parts: List[str], ctes: set) -> Optional[str]:
+        name = ".".join(parts)
+        if len(parts) > 2:
+            return f"Cross-database or linked server references are not allowed: {name}"
+        if len(parts) == 1:
+            if parts[0].upper() in ctes:
+                return None
+            return f"Object '{name}' must be qualified with an allowed schema (e.g. {self._schema_hint}.{name})"
+        if len(parts) == 2 and parts[0].upper() not in self.allowed_schemas:
+            return f"Schema '{parts[0]}' is not allowed"
+        if self.allowed_views is not None and parts[-1].upper() not in self.allowed_views:
+            return f"View '{name}' is not allowed"
+        return None
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+def statement_kind(query: str) -> Optional[str]:
+    """
+    Keyword of the statement a query runs, with "WITH ... SELECT" reported as
+    SELECT; None if the query cannot be tokenized or does not start with a keyword.
+    """
+    try:
+        tokens = tokenize(query)
+        while tokens and tokens[0] == ("symbol", ";"):
+            tokens = tokens[1:]
+        if not tokens or tokens[0][0] != "word":
+            return None
+        position = 0
+        if tokens[0][1].upper() == "WITH":
+            _, position = SQLValidator._parse_ctes(tokens)
+    except ValueError:
+        return None
+    if position >= len(tokens) or tokens[position][0] != "word":
+        return None
+    return tokens[position][1].upper()
+
+
+def _skip_parentheses(tokens: List[Tuple[str, str]], position: int) -> int:
+    """Position after the parenthesized group that starts at position"""
+    depth = 0
+    while position < len(tokens):
+        token = tokens[position]
+        if token == ("symbol", "("):
+            depth += 1
+        elif token == ("symbol", ")"):
+            depth -= 1
+            if depth == 0:
+                return position + 1
+        position += 1
+    raise ValueError("unbalanced parentheses")
+
+
+def _object_name(tokens: List[Tuple[str, str]], position: int) -> Tuple[List[str], int]:
+    """Parts of a dotted object name (db..view keeps an empty schema) and the position after it"""
+    parts = [tokens[position][1]]
+    position += 1
+    while tokens[position:position + 1] == [("symbol", ".")]:
+        position += 1
+        if position < len(tokens) and tokens[position][0] in ("word", "name"):
+            parts.append(tokens[position][1])
+            position += 1
+        else:
+            parts.append("")
+    return parts, position
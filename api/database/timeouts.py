@@ -0,0 +1,69 @@
+"""
+Statement Timeouts - Per-endpoint and per-stage limits for SQL statements
+"""
+import contextvars
+import os
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+# Seconds a statement may run when no scope sets its own limit (0 = no limit)
+DEFAULT_STATEMENT_TIMEOUT = 60
+
+# Default limits of the scopes (endpoints and pipeline stages); override with DB_TIMEOUT_<SCOPE>
+DEFAULT_SCOPE_TIMEOUTS = {
+    "health": 5,
+    "view_counts": 30,
+    "estimate": 15,
+    "count": 30,
+    "schema_discovery": 120,
+    "replica_refresh": 1800,
+}
+
+# Limit of the statements run by the current request / stage
+_current_timeout: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    "statement_timeout", default=None
+)
+
+
+def get_scope_timeout(scope: str) -> Optional[int]:
+    """Configured limit of a scope, or None if the scope has no limit of its own"""
+    value = os.getenv(f"DB_TIMEOUT_{scope.upper()}")
+    if value is not None:
+        return int(value)
+    return DEFAULT_SCOPE_TIMEOUTS.get(scope)
+
+
+def current_statement_timeout() -> int:
+    """Limit in seconds for a statement run now (0 = no limit)"""
+    timeout = _current_timeout.get()
+    if timeout is None:
+        return int(os.getenv("DB_STATEMENT_TIMEOUT", str(DEFAULT_STATEMENT_TIMEOUT)))
+    return timeout
+
+
+@contextmanager
+def statement_timeout(scope: str) -> Iterator[int]:
+    """
+    Run a block under the statement limit of an endpoint or pipeline stage.
+
+    Nested scopes get the tighter of their own limit and the enclosing one;
+    scopes without a limit of their own keep the enclosing one. The limit is
+    a context variable, so threads started with a copied context (executor
+    workers) inherit it.
+    """
+    timeout = _tighter(get_scope_timeout(scope), _current_timeout.get())
+    if timeout is None:
+        timeout = current_statement_timeout()
+    token = _current_timeout.set(timeout)
+    try:
+        yield timeout
+    finally:
+        _current_timeout.reset(token)
+
+
+def _tighter(first: Optional[int], second: Optional[int]) -> Optional[int]:
+    """Smaller of two limits, where None means unset and 0 means no limit"""
+    limits = [limit for limit in (first, second) if limit]
+    if limits:
+        return min(limits)
+    return 0 if 0 in (first, second) else None
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of result value conversion: per-cell isinstance chain vs
+one converter per column picked from the cursor.description type codes
+
+Usage:
+    python scripts/benchmark_column_conversion.py
+    python scripts/benchmark_column_conversion.py --rows 500000 --repeat 3
+"""
+import sys
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.columnar import column_converter, convert_column, serialize_value
+
+# (name, type code) as pyodbc reports them in cursor.description
+DESCRIPTION = [
+    ('id', int),
+    ('titular', str),
+    ('departamento', str),
+    ('superficie', Decimal),
+    ('monto_multa', Decimal),
+    ('fecha_registro', datetime),
+    ('vigente', bool),
+]
+
+
+def make_batch(rows: int):
+    """Synthetic rows shaped like a view result (about 5% NULLs in the nullable columns)"""
+    rng = random.Random(42)
+    start = datetime(2015, 1, 1)
+    batch = []
+    for i in range(rows):
+        batch.append((
+            i,
+            f'TITULAR {i}',
+            rng.choice(['LORETO', 'UCAYALI', 'MADRE DE DIOS', 'SAN MARTIN']),
+            Decimal(f'{rng.uniform(1, 5000):.2f}'),
+            None if rng.random() < 0.05 else Decimal(f'{rng.uniform(0, 100000):.2f}'),
+            None if rng.random() < 0.05 else start + timedelta(minutes=rng.randrange(5_000_000)),
+            rng.random() < 0.5,
+        ))
+    return batch
+
+
+def per_cell(batch):
+    return [[serialize_value(value) for value in values] for values in zip(*batch)]
+
+
+def per_column(batch):
+    converters = [column_converter(type_code) for _, type_code in DESCRIPTION]
+    return [convert_column(values, converter) for values, converter in zip(zip(*batch), converters)]
+
+
+def best_of(fn, batch, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(batch)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark result value conversion')
+    parser.add_argument('--rows', type=int, default=100_000, help='Rows in the synthetic result')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per strategy (best is reported)')
+    args = parser.parse_args()
+
+    batch = make_batch(args.rows)
+    cells = args.rows * len(DESCRIPTION)
+
+    if [list(column) for column in per_column(batch)] != per_cell(batch):
+        sys.exit('Strategies disagree on the converted values')
+
+    print(f'{args.rows:,} rows x {len(DESCRIPTION)} columns ({cells:,} cells), best of {args.repeat}')
+    baseline = best_of(per_cell, batch, args.repeat)
+    for label, seconds in [('per cell', baseline), ('per column', best_of(per_column, batch, args.repeat))]:
+        print(f'  {label:<11} {seconds * 1000:8.1f} ms  {seconds * 1e9 / cells:6.1f} ns/cell  '
+              f'{baseline / seconds:5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
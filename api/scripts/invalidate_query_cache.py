@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Script to invalidate the shared query result cache
+
+Usage:
+    # After reloading one or more views
+    python scripts/invalidate_query_cache.py V_INFRACTOR V_TITULOHABILITANTE
+
+    # Drop every cached result
+    python scripts/invalidate_query_cache.py --all
+"""
+import sys
+import argparse
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.query_cache import QueryCache
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Invalidate cached query results')
+    parser.add_argument('views', nargs='*', help='Views whose results must be dropped (e.g. V_INFRACTOR)')
+    parser.add_argument('--all', action='store_true', help='Drop every cached result')
+    args = parser.parse_args()
+
+    if not args.views and not args.all:
+        parser.error('give at least one view or --all')
+
+    cache = QueryCache()
+    if args.all:
+        print(f'Removed {cache.invalidate()} cached results')
+    else:
+        for view in args.views:
+            print(f'{view}: removed {cache.invalidate(view)} cached results')
+
+
+if __name__ == '__main__':
+    main()
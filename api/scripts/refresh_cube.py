@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Script to recompute the aggregate cube of the Dir views
+
+Run it after the nightly warehouse load (e.g. from cron); the API answers
+matching COUNT / SUM / AVG queries from the cube while it is younger than
+CUBE_MAX_AGE_HOURS.
+
+Usage:
+    python scripts/refresh_cube.py
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.aggregate_cube import AggregateCube
+from database.connection_manager import DatabaseConnectionManager
+from database.timeouts import statement_timeout
+
+
+def main():
+    manager = DatabaseConnectionManager()
+    cube = AggregateCube()
+
+    with statement_timeout('replica_refresh') as timeout, manager.pool.connection() as conn:
+        conn.timeout = timeout
+        counts = cube.refresh(conn)
+
+    print(f'Cube written to {cube.path}: {sum(counts.values())} rows for {len(counts)} views')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Script to snapshot the Dir views into the local analytical replica
+
+Run it after the nightly warehouse load (e.g. from cron); the API answers
+read-only queries from the replica while it is younger than REPLICA_MAX_AGE_HOURS.
+
+Usage:
+    python scripts/refresh_replica.py
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.connection_manager import DatabaseConnectionManager
+from database.replica import AnalyticalReplica
+from database.timeouts import statement_timeout
+
+
+def main():
+    manager = DatabaseConnectionManager()
+    replica = AnalyticalReplica()
+
+    with statement_timeout('replica_refresh') as timeout, manager.pool.connection() as conn:
+        conn.timeout = timeout
+        counts = replica.refresh(conn, batch_size=manager.fetch_batch_size)
+
+    print(f'Replica written to {replica.path}: {sum(counts.values())} rows in {len(counts)} views')
+
+
+if __name__ == '__main__':
+    main()
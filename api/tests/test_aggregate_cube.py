@@ -0,0 +1,148 @@
+"""
+Aggregate cube: the subset of queries it parses and answers, with SQL Server's semantics
+
+SQL Server cannot run here, so each query is paired with the result the
+warehouse (CI_AS collation) returns for the rows behind the cube.
+"""
+import pytest
+
+from database.aggregate_cube import CUBE_VIEWS, AggregateCube, CubeQuery, parse_cube_query
+
+# Cube rows as SQL Server's GROUP BY returns them: dimensions, row_count, then count / sum per measure
+SOURCE = {
+    "V_TITULOHABILITANTE": {
+        "dimensions": [str, str, str, int],
+        "measures": [float],
+        "rows": [
+            ("JUNÍN", "Concesion", "Vigente", 2023, 3, 3, 30.0),
+            ("Junin", "Concesion", "Vigente", 2023, 2, 2, 10.0),
+            ("LIMA", "Permiso", "Vigente", 2022, 4, 4, 8.0),
+            ("lima ", "Concesion", "Caducado", 2023, 1, 0, None),
+        ],
+    },
+    "V_INFRACTOR": {
+        "dimensions": [int],
+        "measures": [int],
+        "rows": [(2022, 3, 3, 10), (2023, 2, 1, 7)],
+    },
+}
+
+
+class _SourceCursor:
+    """The cursor of a SQL Server connection as refresh() reads it"""
+
+    def __init__(self):
+        self.description = None
+        self.rows = []
+
+    def execute(self, query):
+        view = next(name for name in CUBE_VIEWS if f"[{name}]" in query)
+        definition, source = CUBE_VIEWS[view], SOURCE.get(view, {})
+        measure_types = source.get("measures", [float] * len(definition["measures"]))
+        if query.startswith("SELECT TOP 0"):
+            self.description = [(name, python_type) for name, python_type in zip(definition["measures"], measure_types)]
+            return
+        dimension_types = source.get("dimensions", [str] * len(definition["dimensions"]))
+        self.description = [(name, python_type) for name, python_type in zip(definition["dimensions"], dimension_types)]
+        self.rows = list(source.get("rows", []))
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class _Source:
+    def cursor(self):
+        return _SourceCursor()
+
+
+@pytest.fixture(scope="module")
+def cube(tmp_path_factory):
+    cube = AggregateCube(path=str(tmp_path_factory.mktemp("cube") / "cube.sqlite3"), max_age_hours=1)
+    cube.refresh(_Source())
+    assert cube.is_fresh()
+    return cube
+
+
+def test_parse():
+    assert parse_cube_query(
+        "SELECT TOP 5 t.Departamento, SUM(Superficie) AS sup FROM Dir.V_TITULOHABILITANTE t "
+        "WHERE Situacion IN ('Vigente', N'Caducado') AND AnioEmisionTH = 2023 "
+        "GROUP BY t.Departamento ORDER BY sup DESC;"
+    ) == CubeQuery(
+        view="V_TITULOHABILITANTE",
+        items=[("dimension", "Departamento", "Departamento"), ("sum", "Superficie", "sup")],
+        filters=[("Situacion", ["Vigente", "Caducado"]), ("AnioEmisionTH", [2023])],
+        group_by=["Departamento"],
+        order_by=[(1, True)],
+        top=5,
+    )
+    assert parse_cube_query("SELECT YEAR(FechaResolucion) AS anio, COUNT(1) FROM V_INFRACTOR "
+                            "GROUP BY YEAR(FechaResolucion) ORDER BY 1").order_by == [(0, False)]
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT COUNT(DISTINCT Departamento) FROM Dir.V_TITULOHABILITANTE",
+    "SELECT COUNT(*) FROM Dir.V_TITULOHABILITANTE WHERE Departamento LIKE 'L%'",
+    "SELECT COUNT(*) FROM Dir.V_TITULOHABILITANTE t JOIN Dir.V_INFRACTOR i ON t.NumeroDocumento = i.NumeroDocumento",
+    "SELECT Departamento, COUNT(*) FROM Dir.V_TITULOHABILITANTE GROUP BY Departamento HAVING COUNT(*) > 1",
+    "SELECT COUNT(*) FROM Otro.V_TITULOHABILITANTE",
+])
+def test_queries_outside_the_subset_are_not_parsed(query):
+    assert parse_cube_query(query) is None
+
+
+def rows(cube, query):
+    result = cube.answer(query)
+    assert result is not None, f"expected a cube answer for {query}"
+    return result["table"].to_rows()
+
+
+@pytest.mark.parametrize("query, expected", [
+    # CI_AS: case and trailing spaces are ignored, accents are not
+    ("SELECT COUNT(*) AS total FROM Dir.V_TITULOHABILITANTE WHERE Departamento = 'junín'", [{"total": 3}]),
+    ("SELECT COUNT(*) AS total FROM Dir.V_TITULOHABILITANTE WHERE Departamento = N'JUNIN'", [{"total": 2}]),
+    ("SELECT COUNT(*) AS total FROM Dir.V_TITULOHABILITANTE WHERE Departamento IN ('Lima', 'Cusco')", [{"total": 5}]),
+    ("SELECT SUM(Superficie) AS sup, AVG(Superficie) AS promedio FROM Dir.V_TITULOHABILITANTE "
+     "WHERE AnioEmisionTH = '2023'", [{"sup": 40.0, "promedio": 8.0}]),
+    # Integer AVG truncates
+    ("SELECT AVG(Multa) AS promedio, SUM(Multa) AS total FROM Dir.V_INFRACTOR", [{"promedio": 4, "total": 17}]),
+    ("SELECT YEAR(FechaResolucion) AS anio, AVG(Multa) AS promedio FROM Dir.V_INFRACTOR "
+     "GROUP BY YEAR(FechaResolucion) ORDER BY anio", [{"anio": 2022, "promedio": 3}, {"anio": 2023, "promedio": 7}]),
+    ("SELECT TOP 1 YEAR(FechaResolucion) AS anio, COUNT(*) AS total FROM Dir.V_INFRACTOR "
+     "GROUP BY YEAR(FechaResolucion) ORDER BY total DESC", [{"anio": 2022, "total": 3}]),
+])
+def test_answer_matches_the_warehouse(cube, query, expected):
+    assert rows(cube, query) == expected
+
+
+def test_text_groups_use_the_collation(cube):
+    result = rows(cube, "SELECT Departamento, COUNT(*) AS total FROM Dir.V_TITULOHABILITANTE "
+                        "GROUP BY Departamento ORDER BY total DESC")
+    # 'LIMA' and 'lima ' are one group; 'JUNÍN' and 'Junin' are two
+    assert [row["total"] for row in result] == [5, 3, 2]
+    assert result[0]["Departamento"].strip().upper() == "LIMA"
+
+
+def test_answer_types(cube):
+    result = cube.answer("SELECT AVG(Multa), AVG(Multa) FROM Dir.V_INFRACTOR")
+    assert result["table"].types == ["integer", "integer"]
+    result = cube.answer("SELECT Departamento, AVG(Superficie) FROM Dir.V_TITULOHABILITANTE GROUP BY Departamento")
+    assert result["table"].types == ["string", "number"]
+
+
+@pytest.mark.parametrize("query", [
+    # TOP over a text order could keep other groups
+    "SELECT TOP 1 Departamento, COUNT(*) FROM Dir.V_TITULOHABILITANTE GROUP BY Departamento ORDER BY Departamento",
+    # SQL Server would convert the text column to a number
+    "SELECT COUNT(*) FROM Dir.V_TITULOHABILITANTE WHERE Departamento = 15",
+    "SELECT COUNT(*) FROM Dir.V_TITULOHABILITANTE WHERE AnioEmisionTH = 'dos mil'",
+    # Not a dimension / measure of the cube, or not grouped
+    "SELECT COUNT(*) FROM Dir.V_TITULOHABILITANTE WHERE NumeroDocumento = '1'",
+    "SELECT AVG(Multa) FROM Dir.V_TITULOHABILITANTE",
+    "SELECT Departamento, COUNT(*) FROM Dir.V_TITULOHABILITANTE",
+])
+def test_unsafe_queries_go_to_sql_server(cube, query):
+    assert cube.answer(query) is None
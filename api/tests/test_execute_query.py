@@ -0,0 +1,162 @@
+"""
+Query execution through the pool: reads vs writes as the cursor reports them
+
+SQL Server cannot run here: the manager's pool hands out connections whose
+cursors answer from a scripted server, and every statement it sends is kept.
+"""
+import pytest
+
+from database.connection_manager import DatabaseConnectionManager
+from database.connection_pool import ConnectionPool, _PooledConnection
+from database.query_cache import QueryCache
+from database.query_cost import CostLimits
+
+COLUMNS = [("NumeroDocumento", str), ("Multa", int)]
+
+SHOWPLAN = ('<ShowPlanXML xmlns="http://schemas.microsoft.com/sqlserver/2004/07/showplan"><BatchSequence><Batch>'
+            '<Statements><StmtSimple StatementEstRows="{rows}" StatementSubTreeCost="0.5"/></Statements>'
+            '</Batch></BatchSequence></ShowPlanXML>')
+
+SANCIONADOS = ("WITH sancionados AS (SELECT NumeroDocumento, Multa FROM Dir.V_INFRACTOR WHERE Multa > 0) "
+               "SELECT NumeroDocumento, Multa FROM sancionados")
+
+
+class _Server:
+    """Answers statements like SQL Server would for a view of `rows` rows"""
+
+    def __init__(self, rows, estimated_rows=1):
+        self.rows = [(f"DOC{index}", index) for index in range(rows)]
+        self.estimated_rows = estimated_rows
+        self.statements = []
+        self.commits = 0
+        self.showplan = False
+
+    def run(self, statement):
+        """(description, rows) of a read, None for a write"""
+        if statement.startswith("SET SHOWPLAN_XML"):
+            self.showplan = statement.endswith("ON")
+            return None
+        if self.showplan:
+            return [("Microsoft SQL Server 2005 XML Showplan", str)], [(SHOWPLAN.format(rows=self.estimated_rows),)]
+        self.statements.append(statement)
+        if statement.startswith("UPDATE"):
+            return None
+        if "COUNT_BIG(*)" in statement:
+            return [("total_count", int)], [(len(self.rows),)]
+        return COLUMNS, list(self.rows)
+
+
+class _Cursor:
+    def __init__(self, server):
+        self.server = server
+        self.description = None
+        self.rowcount = -1
+        self._rows = []
+
+    def execute(self, statement, *parameters):
+        result = self.server.run(statement)
+        if result is None:
+            self.description, self._rows, self.rowcount = None, [], 2
+        else:
+            self.description, self._rows = result
+
+    def fetchmany(self, size):
+        batch, self._rows = self._rows[:size], self._rows[size:]
+        return batch
+
+    def fetchone(self):
+        batch = self.fetchmany(1)
+        return batch[0] if batch else None
+
+    def cancel(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Connection:
+    def __init__(self, server):
+        self.server = server
+        self.timeout = 0
+
+    def cursor(self):
+        return _Cursor(self.server)
+
+    def commit(self):
+        self.server.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Pool(ConnectionPool):
+    def __init__(self, server):
+        super().__init__("scripted", name="test")
+        self.server = server
+
+    def _open(self):
+        return _PooledConnection(_Connection(self.server))
+
+
+@pytest.fixture
+def server():
+    return _Server(rows=5)
+
+
+@pytest.fixture
+def manager(server, tmp_path, monkeypatch):
+    pool = _Pool(server)
+    monkeypatch.setattr(DatabaseConnectionManager, "pool", property(lambda self: pool))
+    manager = DatabaseConnectionManager()
+    manager.fetch_engine = "pyodbc"
+    manager.cost_limits = CostLimits(max_cost=0, max_rows=0)
+    manager.query_cache = QueryCache(path=str(tmp_path / "query_cache.sqlite3"))
+    manager.replica = manager.cube = None
+    return manager
+
+
+def test_cte_is_read_and_cached(manager, server):
+    result = manager.execute_query_safely(SANCIONADOS, max_rows=10)
+    assert result["success"], result.get("error")
+    assert result["row_count"] == 5 and not result["truncated"]
+    assert result["table"].column("Multa") == [0, 1, 2, 3, 4]
+    assert server.commits == 0
+
+    again = manager.execute_query_safely(SANCIONADOS, max_rows=10)
+    assert again.get("cached") and again["row_count"] == 5
+    assert len(server.statements) == 1
+
+
+def test_write_is_committed(manager, server):
+    result = manager.execute_query("UPDATE Dir.T SET Multa = 0")
+    assert result == {"success": True, "message": "Query executed successfully", "rows_affected": 2}
+    assert server.commits == 1
+
+
+def test_truncated_cte_is_counted(manager, server):
+    result = manager.execute_query_safely(SANCIONADOS + " ORDER BY Multa", max_rows=3)
+    assert result["success"], result.get("error")
+    assert result["truncated"] and result["row_count"] == 3
+    assert result["total_count"] == 5
+
+    count = server.statements[-1]
+    assert count.startswith("WITH sancionados AS (") and "COUNT_BIG(*)" in count
+    assert "ORDER BY" not in count
+    assert server.commits == 0
+
+
+def test_cte_wrapped_by_the_cost_limits_is_read(manager, server):
+    manager.cost_limits = CostLimits(max_cost=0, max_rows=1000)
+    server.estimated_rows = 5_000_000
+    result = manager.execute_query_safely(SANCIONADOS, max_rows=3)
+    assert result["success"], result.get("error")
+    assert result["row_count"] == 3 and result["total_count"] == 5
+
+    wrapped, count = server.statements
+    assert wrapped.startswith("WITH sancionados AS (") and "SELECT TOP 4 * FROM (SELECT NumeroDocumento" in wrapped
+    assert "COUNT_BIG(*)" in count
+    assert server.commits == 0
@@ -0,0 +1,51 @@
+"""
+Executor: concurrent tasks never share an InstantNeo instance
+"""
+import threading
+
+from agents.executor_agent import ExecutorAgent
+
+
+class _Agent:
+    """InstantNeo stand-in that records overlapping runs"""
+
+    def __init__(self, started, release):
+        self.started = started
+        self.release = release
+        self.running = 0
+        self.overlaps = 0
+
+    def run(self, prompt, **kwargs):
+        self.running += 1
+        self.overlaps += self.running > 1
+        self.started.release()
+        self.release.wait(5)
+        self.running -= 1
+        return prompt
+
+
+def test_concurrent_runs_use_separate_agents():
+    started, release = threading.Semaphore(0), threading.Event()
+    executor = ExecutorAgent()
+    created = []
+
+    def new_agent():
+        created.append(_Agent(started, release))
+        return created[-1]
+
+    executor._new_agent = new_agent
+    executor._idle_agents = [new_agent()]
+
+    threads = [threading.Thread(target=executor._run_agent, args=(f"tarea {index}",)) for index in range(3)]
+    for thread in threads:
+        thread.start()
+    for _ in threads:
+        assert started.acquire(timeout=5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(created) == 3
+    assert not any(agent.overlaps for agent in created)
+    # Returned to the pool for the next tasks
+    assert len(executor._idle_agents) == 3
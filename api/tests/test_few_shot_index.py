@@ -0,0 +1,135 @@
+"""
+Few-shot index: BM25 ranking, the shared JSONL file and the lookup budget
+"""
+import json
+import random
+import statistics
+import time
+
+import pytest
+
+from agents.few_shot_index import FewShotIndex, normalize_question, steps_from_task_manager, tokenize
+from agents.task_manager import ExecutionTask, TaskManager
+from database.results import QueryResult
+
+PLAN = [{"step_id": 1, "action_type": "query", "parameters": {"query": "SELECT 1"}}]
+
+
+def lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "few_shot.jsonl")
+
+
+def test_tokenize_drops_accents_stopwords_and_plurals():
+    assert tokenize("¿Cuántas plantaciones hay en Junín?") == ["plantacion", "junin"]
+    assert normalize_question("Multas de los infractores") == normalize_question("multa infractor")
+
+
+def test_search_ranks_the_most_similar_question_first(path):
+    index = FewShotIndex(path=path)
+    index.add("Cuántos títulos habilitantes hay en Loreto", PLAN)
+    index.add("Multa promedio de infractores en Junín", PLAN)
+    index.add("Plantaciones registradas en Cusco", PLAN)
+
+    results = index.search("títulos habilitantes en Loreto por departamento", k=2)
+    assert results[0][0].question == "Cuántos títulos habilitantes hay en Loreto"
+    assert all(score > 0 for _, score in results)
+    assert index.search("especies de fauna", k=3) == []
+
+
+def test_repeated_question_keeps_one_slot_with_the_latest_plan(path):
+    index = FewShotIndex(path=path)
+    index.add("Plantaciones en Cusco", PLAN)
+    index.add("plantaciones  en cusco", [{"step_id": 1, "action_type": "query"}])
+    assert len(index) == 1
+    assert index.search("plantaciones cusco")[0][0].steps == [{"step_id": 1, "action_type": "query"}]
+
+
+def test_file_is_compacted_on_load(path):
+    with open(path, "w", encoding="utf-8") as f:
+        for question in ["Plantaciones en Cusco", "Multas en Lima", "plantaciones en Cusco", "Plantaciones en Cusco"]:
+            f.write(json.dumps({"question": question, "steps": PLAN}) + "\n")
+
+    index = FewShotIndex(path=path)
+    assert len(index) == 2
+    assert [line["question"] for line in lines(path)] == ["Plantaciones en Cusco", "Multas en Lima"]
+
+
+def test_file_is_compacted_once_repeats_outnumber_questions(path):
+    index = FewShotIndex(path=path)
+    index.add("Plantaciones en Cusco", PLAN)
+    index.add("Multas en Lima", PLAN)
+    for _ in range(10):
+        index.add("Plantaciones en Cusco", PLAN)
+    assert len(lines(path)) < 2 * len(index)
+
+
+def test_other_workers_see_new_examples(path):
+    worker, other = FewShotIndex(path=path), FewShotIndex(path=path)
+    worker.add("Licencias de caza vigentes", PLAN)
+    assert other.search("licencias de caza")[0][0].question == "Licencias de caza vigentes"
+
+    # A rewritten file (another worker compacted it) is read again from the start
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"question": "Autorizaciones de desbosque", "steps": PLAN}) + "\n")
+    assert [example.question for example, _ in other.search("licencias autorizaciones desbosque")] == [
+        "Autorizaciones de desbosque"
+    ]
+
+
+def test_partial_line_is_read_once_complete(path):
+    index = FewShotIndex(path=path)
+    line = json.dumps({"question": "Cambios de uso en Ucayali", "steps": PLAN})
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line[:20])
+    assert index.search("cambio de uso ucayali") == []
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line[20:] + "\n")
+    assert len(index.search("cambio de uso ucayali")) == 1
+
+
+def test_lookup_stays_under_5_ms_with_100k_examples(tmp_path):
+    rng = random.Random(0)
+    common = ["titulo", "habilitante", "multa", "infractor", "plantacion", "loreto", "cusco", "junin",
+              "departamento", "superficie", "licencia", "caza", "vigente", "promedio", "total", "anio"]
+    rare = [f"w{i}" for i in range(5000)]
+    index = FewShotIndex(path=str(tmp_path / "large.jsonl"))
+    for i in range(100_000):
+        words = rng.sample(common, 4) + rng.sample(rare, 3) + [f"q{i}"]
+        index.add(" ".join(words), PLAN, persist=False)
+    # Inserts after lookups must not make the next ones slower
+    index.search("titulo habilitante loreto")
+    for i in range(5000):
+        index.add(f"titulo habilitante multa infractor superficie total promedio z{i}", PLAN, persist=False)
+
+    timings = []
+    for question in ["títulos habilitantes en Loreto", "multa promedio de infractores en Junín",
+                     "superficie total por departamento y año", "licencias de caza vigentes en Cusco"]:
+        started = time.perf_counter()
+        index.search(question, k=3)
+        timings.append((time.perf_counter() - started) * 1000)
+    assert statistics.median(timings) < 5, timings
+
+
+def test_steps_keep_the_sql_that_ran():
+    manager = TaskManager()
+    planned = "SELECT Departmento, COUNT(*) FROM V_INFRACTOR GROUP BY Departmento"
+    repaired = "SELECT Departamento, COUNT(*) FROM Dir.V_INFRACTOR GROUP BY Departamento"
+    query_task = ExecutionTask(description="Infracciones por departamento", action_type="query",
+                               parameters={"query": planned, "limit": 10})
+    manager.add_task(query_task)
+    query_task.complete_success(QueryResult(success=True, query_executed=repaired))
+    summary = ExecutionTask(description="Resumir", action_type="calculate", dependencies=[query_task.id])
+    manager.add_task(summary)
+    summary.complete_success("texto")
+
+    assert steps_from_task_manager(manager) == [
+        {"step_id": 1, "action_type": "query", "description": "Infracciones por departamento",
+         "dependencies": [], "parameters": {"query": repaired}},
+        {"step_id": 2, "action_type": "calculate", "description": "Resumir", "dependencies": [1]},
+    ]
@@ -0,0 +1,37 @@
+"""
+Prompt compiler: trimming to the stage budget, memoized counts only for fixed text
+"""
+from agents.prompt_compiler import PromptCompiler, PromptSection, count_static_tokens, count_tokens
+
+
+def test_count_tokens():
+    assert count_tokens("") == 0
+    assert count_tokens("Departamento 2023, ok") == 3 + 2 + 1 + 1
+
+
+def test_only_static_sections_are_memoized():
+    count_static_tokens.cache_clear()
+    sections = [PromptSection("fija", "Reglas fijas del prompt", static=True),
+                PromptSection("consulta", "¿Cuántas multas hay en Loreto?")]
+    for _ in range(3):
+        PromptCompiler("planner", budget=1000).compile(sections, system_prompt="Eres un planificador")
+    info = count_static_tokens.cache_info()
+    # The fixed section and the system prompt, measured once each
+    assert (info.misses, info.currsize) == (2, 2)
+
+
+def test_lowest_priority_is_trimmed_first():
+    def shrink(section):
+        return PromptSection(section.name, section.text[:20], section.priority)
+
+    sections = [
+        PromptSection("pedido", "consulta " * 10, required=True),
+        PromptSection("esquema", "columna " * 5, priority=95),
+        PromptSection("ejemplos", "ejemplo " * 40, priority=60, shrink=shrink),
+        PromptSection("extra", "detalle " * 40, priority=10),
+    ]
+    compiled = PromptCompiler("planner", budget=40).compile(sections)
+    assert compiled.dropped == ["extra"]
+    assert compiled.shrunk == ["ejemplos"]
+    assert compiled.tokens == count_tokens(compiled.text) == 35
+    assert not compiled.over_budget
@@ -0,0 +1,30 @@
+"""
+normalize_sql: the key under which identical queries share a cached result
+"""
+import pytest
+
+from database.query_cache import normalize_sql, referenced_views
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("select  *\n\tfrom Dir.V_INFRACTOR ;", "SELECT * FROM DIR.V_INFRACTOR"),
+    ("SELECT * FROM Dir.V_INFRACTOR WHERE Departamento = 'Lima  Norte'",
+     "SELECT * FROM DIR.V_INFRACTOR WHERE DEPARTAMENTO = 'Lima  Norte'"),
+    ("SELECT 'it''s', N'x' FROM t", "SELECT 'it''s', N'x' FROM T"),
+    ("SELECT a -- columnas\nFROM t /* comentario\nlargo */ WHERE b = '--no es comentario'",
+     "SELECT A FROM T WHERE B = '--no es comentario'"),
+    ("SELECT 1; -- fin", "SELECT 1"),
+])
+def test_normalize_sql(query, expected):
+    assert normalize_sql(query) == expected
+
+
+def test_literals_keep_queries_apart():
+    assert normalize_sql("SELECT * FROM t WHERE a = 'LIMA'") != normalize_sql("SELECT * FROM t WHERE a = 'lima'")
+    # The second FROM is inside the comment: only "SELECT a" runs
+    assert normalize_sql("SELECT a -- x\nFROM t") != normalize_sql("SELECT a -- x FROM t")
+
+
+def test_referenced_views_ignore_literals():
+    normalized = normalize_sql("SELECT * FROM Dir.V_INFRACTOR i JOIN Dir.V_PLANTACION p ON 1 = 1 WHERE x = 'V_CAMBIO_USO'")
+    assert referenced_views(normalized) == ["V_INFRACTOR", "V_PLANTACION"]
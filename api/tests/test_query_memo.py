@@ -0,0 +1,120 @@
+"""
+Query memo: identical SQL runs once per request, ordered TOP n reuses a wider result
+"""
+import contextvars
+import threading
+
+import pytest
+
+from database.columnar import ColumnarResult
+from database.result_store import result_store_scope
+from database.results import QueryResult
+
+
+@pytest.fixture
+def store():
+    with result_store_scope() as store:
+        yield store
+
+
+class _Database:
+    """execute() callables that count the queries that reached the database"""
+
+    def __init__(self, rows=10):
+        self.rows = rows
+        self.executed = []
+
+    def execute(self, query, success=True):
+        def run():
+            self.executed.append(query)
+            if not success:
+                return QueryResult.failure("Timeout expired")
+            table = ColumnarResult(["id"], [list(range(self.rows))])
+            return QueryResult.from_table(table, query_executed=query)
+        return run
+
+
+def test_identical_sql_runs_once(store):
+    database = _Database()
+    first = store.queries.run("SELECT id FROM Dir.V_INFRACTOR", database.execute("SELECT id FROM Dir.V_INFRACTOR"))
+    again = store.queries.run("select  id\nfrom Dir.V_INFRACTOR;", database.execute("select id from Dir.V_INFRACTOR"))
+    assert again is first
+    assert len(database.executed) == 1
+
+
+def test_ordered_top_is_a_prefix_of_a_wider_result(store):
+    database = _Database()
+    wide = "SELECT TOP 10 id FROM Dir.V_INFRACTOR ORDER BY id"
+    narrow = "SELECT TOP 3 id FROM Dir.V_INFRACTOR ORDER BY id"
+    store.queries.run(wide, database.execute(wide))
+    result = store.queries.run(narrow, database.execute(narrow))
+
+    assert database.executed == [wide]
+    assert result.row_count == 3 and result.table.column("id") == [0, 1, 2]
+    assert result.query_executed == narrow
+    assert store.queries.get_stats()["subsumed_hits"] == 1
+
+
+@pytest.mark.parametrize("wide, narrow", [
+    # Without ORDER BY, SQL Server may return any 3 rows
+    ("SELECT TOP 10 id FROM Dir.V_INFRACTOR", "SELECT TOP 3 id FROM Dir.V_INFRACTOR"),
+    ("SELECT id FROM Dir.V_INFRACTOR", "SELECT TOP 3 id FROM Dir.V_INFRACTOR"),
+    # An ORDER BY inside OVER () or a subquery does not order the result
+    ("SELECT TOP 10 id, ROW_NUMBER() OVER (ORDER BY id) AS n FROM Dir.V_INFRACTOR",
+     "SELECT TOP 3 id, ROW_NUMBER() OVER (ORDER BY id) AS n FROM Dir.V_INFRACTOR"),
+    # A smaller earlier TOP cannot answer a larger one
+    ("SELECT TOP 2 id FROM Dir.V_INFRACTOR ORDER BY id", "SELECT TOP 3 id FROM Dir.V_INFRACTOR ORDER BY id"),
+])
+def test_no_prefix_reuse(store, wide, narrow):
+    database = _Database()
+    store.queries.run(wide, database.execute(wide))
+    store.queries.run(narrow, database.execute(narrow))
+    assert database.executed == [wide, narrow]
+
+
+def test_truncated_result_is_not_a_prefix_beyond_its_rows(store):
+    database = _Database(rows=5)
+    wide = "SELECT id FROM Dir.V_INFRACTOR ORDER BY id"
+    store.queries.run(wide, lambda: QueryResult.from_table(ColumnarResult(["id"], [[0, 1]]), truncated=True))
+    narrow = "SELECT TOP 3 id FROM Dir.V_INFRACTOR ORDER BY id"
+    assert store.queries.run(narrow, database.execute(narrow)).row_count == 5
+    assert database.executed == [narrow]
+
+
+def test_failures_are_not_kept(store):
+    database = _Database()
+    query = "SELECT id FROM Dir.V_INFRACTOR"
+    assert not store.queries.run(query, database.execute(query, success=False)).success
+    assert store.queries.run(query, database.execute(query)).success
+    assert len(database.executed) == 2
+
+
+def test_concurrent_tasks_wait_for_the_running_query(store):
+    query = "SELECT id FROM Dir.V_INFRACTOR"
+    started, release = threading.Event(), threading.Event()
+    database = _Database()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return database.execute(query)()
+
+    results = {}
+
+    def task(name, execute):
+        results[name] = store.queries.run(query, execute)
+
+    # Like the executor's task threads, each runs in a copy of the request's context
+    first = threading.Thread(target=contextvars.copy_context().run, args=(task, "first", slow))
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=contextvars.copy_context().run, args=(task, "second", database.execute(query)))
+    second.start()
+    second.join(0.2)
+    assert second.is_alive(), "the second task should wait for the first one"
+
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert results["second"] is results["first"]
+    assert database.executed == [query]
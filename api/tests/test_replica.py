@@ -0,0 +1,232 @@
+"""
+Replica dialect shim: the local answer must be SQL Server's, or there must be none
+
+SQL Server cannot run here, so each query is paired with the result the
+warehouse (CI_AS collation) returns for the same rows.
+"""
+from datetime import datetime
+
+import pytest
+
+from database.replica import AnalyticalReplica, compare_ci_as, to_sqlite, tsql_like
+
+COLUMN_TYPES = {
+    "DEPARTAMENTO": "string",
+    "FECHA": "datetime",
+    "FECHAREGISTRO": "date",
+    "ANIO": "integer",
+    "MULTA": "number",
+}
+
+ROWS = [
+    ("A1", "JUNÍN", "Vigente", datetime(2023, 1, 5), 2023, 10.0),
+    ("A2", "Junin", "vigente", datetime(2023, 1, 5, 10, 30), 2023, 3.0),
+    ("A3", "LIMA", "Caducado", datetime(2022, 12, 31, 23, 59), 2022, 5.0),
+    ("A4", "lima ", "Vigente", datetime(2023, 2, 1), 2024, None),
+]
+
+
+class _SourceCursor:
+    """The cursor of a SQL Server connection as refresh() reads it"""
+
+    description = [
+        ("NumeroDocumento", str), ("Departamento", str), ("Estado", str),
+        ("Fecha", datetime), ("Anio", int), ("Multa", float),
+    ]
+
+    def __init__(self):
+        self.rows = list(ROWS)
+
+    def execute(self, query):
+        pass
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        pass
+
+
+class _Source:
+    def cursor(self):
+        return _SourceCursor()
+
+
+@pytest.fixture(scope="module")
+def replica(tmp_path_factory):
+    replica = AnalyticalReplica(path=str(tmp_path_factory.mktemp("replica") / "replica.sqlite3"), max_age_hours=1)
+    replica.refresh(_Source(), views=["V_INFRACTOR"])
+    return replica
+
+
+def documents(replica, query):
+    result = replica.execute(query)
+    assert result is not None, f"expected a local answer for {query}"
+    return sorted(result["table"].column("NumeroDocumento"))
+
+
+@pytest.mark.parametrize("query, expected", [
+    # CI_AS: case and trailing spaces are ignored, accents are not
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE Departamento IN ('Junín', 'Lima')", ["A1", "A3", "A4"]),
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE 'junín' = Departamento", ["A1"]),
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE Departamento = N'junin'", ["A2"]),
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE Departamento LIKE 'jun%'", ["A1", "A2"]),
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE Departamento LIKE 'JUNÍ_'", ["A1"]),
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE Departamento NOT LIKE '[jl]%'", []),
+    # ISO literals against datetimes: midnight of that day
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE Fecha = '2023-01-05'", ["A1"]),
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE Fecha > '20230105'", ["A2", "A4"]),
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE Fecha BETWEEN '2023-01-01' AND '2023-01-05'", ["A1"]),
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE Fecha < '2023-01-05T10:30:00'", ["A1", "A3"]),
+    ("SELECT TOP 2 NumeroDocumento FROM Dir.V_INFRACTOR ORDER BY Fecha DESC", ["A2", "A4"]),
+])
+def test_local_answer_matches_the_warehouse(replica, query, expected):
+    assert documents(replica, query) == expected
+
+
+def rows(replica, query):
+    result = replica.execute(query)
+    assert result is not None, f"expected a local answer for {query}"
+    return result["table"].to_rows()
+
+
+# One case per construct the shim rewrites or registers, with the rows SQL Server returns
+@pytest.mark.parametrize("query, expected", [
+    # TOP n / TOP (n) -> LIMIT; NULLs sort first, so last in DESC
+    ("SELECT TOP 1 NumeroDocumento FROM Dir.V_INFRACTOR ORDER BY Multa DESC", [{"NumeroDocumento": "A1"}]),
+    ("SELECT TOP (2) NumeroDocumento FROM Dir.V_INFRACTOR ORDER BY Anio, Fecha",
+     [{"NumeroDocumento": "A3"}, {"NumeroDocumento": "A1"}]),
+    # OFFSET / FETCH -> LIMIT ... OFFSET
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR ORDER BY Fecha OFFSET 1 ROWS FETCH NEXT 2 ROWS ONLY",
+     [{"NumeroDocumento": "A1"}, {"NumeroDocumento": "A2"}]),
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR ORDER BY Fecha OFFSET 3 ROWS", [{"NumeroDocumento": "A4"}]),
+    # ISNULL -> IFNULL
+    ("SELECT NumeroDocumento, ISNULL(Multa, 0) AS multa FROM Dir.V_INFRACTOR WHERE ISNULL(Multa, 0) = 0",
+     [{"NumeroDocumento": "A4", "multa": 0}]),
+    # Dir. prefix and [bracketed] names
+    ("SELECT [NumeroDocumento] FROM [Dir].[V_INFRACTOR] AS [i] WHERE [i].[Anio] = 2022", [{"NumeroDocumento": "A3"}]),
+    # LIKE with [set], [^set] and ESCAPE, under CI_AS
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE NumeroDocumento LIKE 'a[1-2]' ORDER BY Fecha",
+     [{"NumeroDocumento": "A1"}, {"NumeroDocumento": "A2"}]),
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE NumeroDocumento LIKE 'A[^12]' ORDER BY Fecha",
+     [{"NumeroDocumento": "A3"}, {"NumeroDocumento": "A4"}]),
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE NumeroDocumento NOT LIKE 'A!1' ESCAPE '!' ORDER BY Fecha",
+     [{"NumeroDocumento": "A3"}, {"NumeroDocumento": "A2"}, {"NumeroDocumento": "A4"}]),
+    # IN / NOT IN with the collation
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE Departamento NOT IN (N'lima') ORDER BY Fecha",
+     [{"NumeroDocumento": "A1"}, {"NumeroDocumento": "A2"}]),
+    # Literals on the left of the comparison
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE 2023 < Anio", [{"NumeroDocumento": "A4"}]),
+    ("SELECT NumeroDocumento FROM Dir.V_INFRACTOR WHERE '2023-01-05' = Fecha", [{"NumeroDocumento": "A1"}]),
+    # UPPER / LOWER fold non-ASCII letters too
+    ("SELECT UPPER(Departamento) AS alto, LOWER(Departamento) AS bajo FROM Dir.V_INFRACTOR WHERE NumeroDocumento = 'A1'",
+     [{"alto": "JUNÍN", "bajo": "junín"}]),
+    # AVG of a float column per group (NULLs ignored, all-NULL group is NULL)
+    ("SELECT Anio, AVG(Multa) AS promedio FROM Dir.V_INFRACTOR GROUP BY Anio ORDER BY Anio",
+     [{"Anio": 2022, "promedio": 5.0}, {"Anio": 2023, "promedio": 6.5}, {"Anio": 2024, "promedio": None}]),
+    # YEAR / MONTH / DAY of a datetime
+    ("SELECT YEAR(Fecha) AS anio, MONTH(Fecha) AS mes, DAY(Fecha) AS dia FROM Dir.V_INFRACTOR WHERE NumeroDocumento = 'A3'",
+     [{"anio": 2022, "mes": 12, "dia": 31}]),
+    # LEN ignores trailing spaces
+    ("SELECT LEN(Departamento) AS largo FROM Dir.V_INFRACTOR WHERE NumeroDocumento IN ('A1', 'A4') ORDER BY largo",
+     [{"largo": 4}, {"largo": 5}]),
+    # Integer / float CASTs
+    ("SELECT CAST(Multa AS INT) AS entero, CAST(Anio AS FLOAT) AS real FROM Dir.V_INFRACTOR "
+     "WHERE NumeroDocumento = 'A2'", [{"entero": 3, "real": 2023.0}]),
+    # GETDATE
+    ("SELECT COUNT(*) AS pasadas FROM Dir.V_INFRACTOR WHERE Fecha < GETDATE()", [{"pasadas": 4}]),
+    # Grouping: qualified GROUP BY column, HAVING on an aggregate
+    ("SELECT COUNT(*) AS total FROM Dir.V_INFRACTOR i GROUP BY i.Departamento HAVING COUNT(*) > 1", [{"total": 2}]),
+])
+def test_rewritten_constructs_match_the_warehouse(replica, query, expected):
+    assert rows(replica, query) == expected
+
+
+def test_group_by_uses_the_collation(replica):
+    result = replica.execute(
+        "SELECT Departamento, COUNT(*) AS total FROM Dir.V_INFRACTOR GROUP BY Departamento ORDER BY total DESC"
+    )
+    counts = sorted(zip(result["table"].column("Departamento"), result["table"].column("total")), key=str)
+    # 'LIMA' and 'lima ' are one group; 'JUNÍN' and 'Junin' are two
+    assert [count for _, count in counts] == [1, 1, 2]
+
+
+def test_integer_average_truncates(replica):
+    result = replica.execute("SELECT AVG(Anio) AS anio, AVG(Multa) AS multa FROM Dir.V_INFRACTOR")
+    assert result["table"].to_rows() == [{"anio": 2023, "multa": 6.0}]
+
+
+def test_datetimes_come_back_in_iso_form(replica):
+    result = replica.execute("SELECT MAX(Fecha) AS ultima FROM Dir.V_INFRACTOR")
+    assert result["table"].to_rows() == [{"ultima": "2023-02-01T00:00:00"}]
+    assert result["table"].types == ["datetime"]
+
+
+@pytest.mark.parametrize("query", [
+    # Non-ISO dates depend on the session language in SQL Server
+    "SELECT * FROM Dir.V_INFRACTOR WHERE Fecha >= '05/01/2023'",
+    # Numbers are days since 1900 for a datetime
+    "SELECT * FROM Dir.V_INFRACTOR WHERE Fecha > 20230101",
+    # SQL Server rejects columns outside GROUP BY / aggregates
+    "SELECT Departamento, Estado, COUNT(*) FROM Dir.V_INFRACTOR GROUP BY Departamento",
+    "SELECT Departamento, COUNT(*) FROM Dir.V_INFRACTOR",
+    "SELECT * FROM Dir.V_INFRACTOR GROUP BY Departamento",
+    "SELECT Departamento, COUNT(*) FROM Dir.V_INFRACTOR GROUP BY Departamento ORDER BY Estado",
+    # Text compared with an expression: its case / collation is not known here
+    "SELECT * FROM Dir.V_INFRACTOR WHERE UPPER(Departamento) = 'Lima'",
+    # TOP / OFFSET over a text order could pick other rows
+    "SELECT TOP 1 Departamento FROM Dir.V_INFRACTOR ORDER BY Departamento",
+    "SELECT Departamento FROM Dir.V_INFRACTOR ORDER BY 1 OFFSET 2 ROWS",
+    # T-SQL the shim does not translate
+    "SELECT Departamento + Estado FROM Dir.V_INFRACTOR",
+    "SELECT CAST(Multa AS DECIMAL(10, 2)) FROM Dir.V_INFRACTOR",
+    "SELECT COUNT(*) OVER () FROM Dir.V_INFRACTOR",
+    "SELECT * INTO #copia FROM Dir.V_INFRACTOR",
+    "SELECT * FROM Dir.V_INFRACTOR; SELECT 1",
+    "SELECT * FROM Dir.V_INFRACTOR WHERE Fecha - 1 > '2023-01-01'",
+    # TOP together with OFFSET, TOP PERCENT, a TOP that is not leading
+    "SELECT TOP 5 Anio FROM Dir.V_INFRACTOR ORDER BY Anio OFFSET 1 ROWS",
+    "SELECT TOP 10 PERCENT Anio FROM Dir.V_INFRACTOR ORDER BY Anio",
+    "SELECT Anio FROM (SELECT TOP 2 Anio FROM Dir.V_INFRACTOR ORDER BY Anio) AS t",
+    # CAST to types that round, truncate text or parse dates differently
+    "SELECT CAST(Fecha AS DATE) FROM Dir.V_INFRACTOR",
+    "SELECT CAST(Departamento AS VARCHAR(3)) FROM Dir.V_INFRACTOR",
+    # A number against a text literal that is not numeric
+    "SELECT * FROM Dir.V_INFRACTOR WHERE Anio = 'dos mil'",
+])
+def test_refused_queries_go_to_sql_server(query):
+    assert to_sqlite(query, COLUMN_TYPES) is None
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT TOP 10 * FROM [Dir].[V_INFRACTOR] WHERE ISNULL(Multa, 0) > 1",
+     'SELECT * FROM "V_INFRACTOR" WHERE IFNULL(Multa, 0) > 1 LIMIT 10'),
+    ("SELECT Anio FROM Dir.V_INFRACTOR ORDER BY Anio OFFSET 5 ROWS FETCH NEXT 10 ROWS ONLY",
+     "SELECT Anio FROM V_INFRACTOR ORDER BY Anio LIMIT 10 OFFSET 5"),
+    ("SELECT * FROM Dir.V_INFRACTOR WHERE FechaRegistro = '20230105' -- 'comentario'",
+     "SELECT * FROM V_INFRACTOR WHERE FechaRegistro = '2023-01-05'"),
+    ("SELECT YEAR(Fecha) AS anio, COUNT(*) FROM Dir.V_INFRACTOR GROUP BY YEAR(Fecha)",
+     "SELECT YEAR(Fecha) AS anio, COUNT(*) FROM V_INFRACTOR GROUP BY YEAR(Fecha)"),
+    ("SELECT DISTINCT TOP (3) Anio FROM [Dir].[V_INFRACTOR] WHERE Departamento = N'Lima' ORDER BY Anio",
+     'SELECT DISTINCT Anio FROM "V_INFRACTOR" WHERE Departamento = \'Lima\' ORDER BY Anio LIMIT 3'),
+    ("SELECT Anio FROM Dir.V_INFRACTOR ORDER BY Anio OFFSET 2 ROWS",
+     "SELECT Anio FROM V_INFRACTOR ORDER BY Anio LIMIT -1 OFFSET 2"),
+    ("SELECT * FROM Dir.V_INFRACTOR WHERE '2023-01-05T10:30' < Fecha",
+     "SELECT * FROM V_INFRACTOR WHERE '2023-01-05 10:30:00' < Fecha"),
+])
+def test_translation(query, expected):
+    assert to_sqlite(query, COLUMN_TYPES) == expected
+
+
+def test_date_literal_with_time_against_a_date_column_is_refused():
+    assert to_sqlite("SELECT * FROM Dir.V_INFRACTOR WHERE FechaRegistro = '2023-01-05 10:00'", COLUMN_TYPES) is None
+
+
+def test_collation_and_like_helpers():
+    assert compare_ci_as("Lima ", "LIMA") == 0
+    assert compare_ci_as("Junin", "JUNÍN") != 0
+    assert compare_ci_as("JUNIN", "JUNÍN") < 0 < compare_ci_as("JUNIO", "JUNÍN")
+    assert tsql_like("[a-c]%", "Bosque") == 1
+    assert tsql_like("10!%%", "10% menos", "!") == 1
+    assert tsql_like("10!%%", "100", "!") == 0
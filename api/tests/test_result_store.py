@@ -0,0 +1,55 @@
+"""
+Result store lifetime: stores live until their request closes them
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from database import result_store
+from database.columnar import ColumnarResult
+from database.result_store import (
+    current_result_store,
+    get_table,
+    open_result_store,
+    result_store_scope,
+)
+
+
+def test_concurrent_requests_keep_their_result_sets():
+    requests = 64  # more than the default threadpool size of /query
+    all_stored = threading.Barrier(requests)
+
+    def run_request(index):
+        with result_store_scope() as store:
+            handle = store.put(ColumnarResult(["n"], [[index]], ["integer"]))
+            # Every request has stored its rows before any of them reads them back
+            all_stored.wait(timeout=10)
+            table = get_table(handle)
+            return table.column("n") if table is not None else None
+
+    with ThreadPoolExecutor(max_workers=requests) as pool:
+        results = list(pool.map(run_request, range(requests)))
+
+    assert results == [[index] for index in range(requests)]
+
+
+def test_scope_releases_the_store_and_restores_the_context():
+    with result_store_scope() as store:
+        assert current_result_store() is store
+        handle = store.put(ColumnarResult(["n"], [[1]], ["integer"]))
+        assert get_table(handle) is not None
+
+    assert get_table(handle) is None
+    assert result_store.active_result_store() is None
+
+
+def test_unscoped_stores_expire_after_the_ttl(monkeypatch):
+    monkeypatch.setenv("RESULT_STORE_TTL", "0")
+    with result_store_scope() as running:
+        running_handle = running.put(ColumnarResult(["n"], [[1]], ["integer"]))
+        orphan = open_result_store()
+        orphan_handle = orphan.put(ColumnarResult(["n"], [[2]], ["integer"]))
+
+        # The next open releases the orphan store, never the scoped one
+        open_result_store()
+        assert get_table(orphan_handle) is None
+        assert get_table(running_handle) is not None
@@ -0,0 +1,67 @@
+"""
+Row cap: the COUNT of a truncated result and the TOP wrapper of the cost limits
+
+SQL Server cannot run here: execute_query / estimate_query_cost are replaced
+on the manager and the statements it would send are checked instead.
+"""
+import pytest
+
+from database.columnar import ColumnarResult
+from database.connection_manager import DatabaseConnectionManager
+from database.query_cost import CostLimits, PlanEstimate
+
+
+@pytest.fixture
+def manager():
+    return DatabaseConnectionManager()
+
+
+def count_statement(manager, query, column_count):
+    sent = []
+
+    def execute_query(statement, **kwargs):
+        sent.append(statement)
+        return {"success": True, "row_count": 1, "table": ColumnarResult(["total_count"], [[42]])}
+
+    manager.execute_query = execute_query
+    assert manager._count_rows(query, column_count) == 42
+    return sent[0]
+
+
+@pytest.mark.parametrize("query, expected", [
+    # Unnamed expressions and repeated names get the derived column list
+    ("SELECT Departamento, COUNT(*) FROM Dir.V_INFRACTOR GROUP BY Departamento ORDER BY 2 DESC",
+     "SELECT COUNT_BIG(*) AS total_count FROM (SELECT Departamento, COUNT(*) FROM Dir.V_INFRACTOR "
+     "GROUP BY Departamento) AS capped_query (c1, c2)"),
+    # CTEs stay in front of the outer SELECT
+    ("WITH sancionados AS (SELECT NumeroDocumento FROM Dir.V_INFRACTOR) "
+     "SELECT p.*, s.* FROM Dir.V_PLANTACION p JOIN sancionados s ON p.NumeroDocumento = s.NumeroDocumento;",
+     "WITH sancionados AS (SELECT NumeroDocumento FROM Dir.V_INFRACTOR) "
+     "SELECT COUNT_BIG(*) AS total_count FROM (SELECT p.*, s.* FROM Dir.V_PLANTACION p JOIN sancionados s "
+     "ON p.NumeroDocumento = s.NumeroDocumento) AS capped_query (c1, c2)"),
+])
+def test_count_names_every_column(manager, query, expected):
+    assert count_statement(manager, query, 2) == expected
+
+
+def test_rows_over_the_limit_fall_back_to_the_fetch_cap(manager):
+    manager.cost_limits = CostLimits(max_cost=0, max_rows=1000)
+    estimate = PlanEstimate(estimated_rows=5_000_000, subtree_cost=1.0)
+    estimated = []
+
+    def estimate_query_cost(statement):
+        estimated.append(statement)
+        # The wrapper of a query with unnamed columns does not compile
+        if len(estimated) > 1:
+            return {"success": False, "error": "No column name was specified for column 1 of 'capped_query'"}
+        return {"success": True, "estimate": estimate}
+
+    manager.estimate_query_cost = estimate_query_cost
+    query = "SELECT YEAR(Fecha) FROM Dir.V_INFRACTOR UNION ALL SELECT YEAR(Fecha) FROM Dir.V_PLANTACION"
+    assert manager._enforce_cost_limits(query, 100) == {"success": True, "query": query}
+
+    # An ORDER BY cannot be wrapped at all
+    estimated.clear()
+    ordered = query + " ORDER BY 1"
+    assert manager._enforce_cost_limits(ordered, 100) == {"success": True, "query": ordered}
+    assert len(estimated) == 1
@@ -0,0 +1,71 @@
+"""
+SQL repair: identifier errors fixed locally against the cached schema
+"""
+import pytest
+
+from database.schema_mapper import ColumnInfo, TableInfo
+from database.sql_repair import SQLRepairer
+
+
+def _table(name, columns):
+    return TableInfo(name=name, schema="Dir", columns=[ColumnInfo(column, "varchar", True) for column in columns])
+
+
+class _Schema:
+    """The part of DynamicSchemaMapper the repairer reads"""
+    tables = {
+        "V_INFRACTOR": _table("V_INFRACTOR", ["NumeroDocumento", "Multa", "Departamento", "FechaResolucion", "Plan"]),
+        "V_PLANTACION": _table("V_PLANTACION", ["NumeroDocumento", "Titular", "Departamento", "Superficie"]),
+    }
+
+
+@pytest.fixture
+def repairer():
+    return SQLRepairer(_Schema())
+
+
+@pytest.mark.parametrize("query, error, repaired, fixes", [
+    # Missing or wrong schema, misspelled view
+    ("SELECT * FROM V_INFRACTOR WHERE Departamento = 'V_INFRACTOR'",
+     "Invalid object name 'V_INFRACTOR'.",
+     "SELECT * FROM Dir.V_INFRACTOR WHERE Departamento = 'V_INFRACTOR'",
+     ["objeto 'V_INFRACTOR' → Dir.V_INFRACTOR"]),
+    ("SELECT * FROM [dbo].[V_PLANTACIONES]",
+     "Invalid object name 'dbo.V_PLANTACIONES'.",
+     "SELECT * FROM Dir.V_PLANTACION",
+     ["objeto 'dbo.V_PLANTACIONES' → Dir.V_PLANTACION"]),
+    # Misspelled column: every reference outside literals
+    ("SELECT Departmento, SUM(Multa) FROM Dir.V_INFRACTOR WHERE Departmento <> 'Departmento' GROUP BY Departmento",
+     "Invalid column name 'Departmento'.",
+     "SELECT Departamento, SUM(Multa) FROM Dir.V_INFRACTOR WHERE Departamento <> 'Departmento' GROUP BY Departamento",
+     ["columna 'Departmento' → Departamento"]),
+    # Column named like a reserved word
+    ("SELECT Plan, Multa FROM Dir.V_INFRACTOR",
+     "Incorrect syntax near the keyword 'Plan'.",
+     "SELECT [Plan], Multa FROM Dir.V_INFRACTOR",
+     ["palabra reservada 'Plan' entre corchetes"]),
+    # Several errors in one message
+    ("SELECT Titulr FROM V_PLANTACION",
+     "Invalid object name 'V_PLANTACION'. Invalid column name 'Titulr'.",
+     "SELECT Titular FROM Dir.V_PLANTACION",
+     ["objeto 'V_PLANTACION' → Dir.V_PLANTACION", "columna 'Titulr' → Titular"]),
+])
+def test_repairs(repairer, query, error, repaired, fixes):
+    result = repairer.repair(query, error)
+    assert result is not None
+    assert result.query == repaired
+    assert result.fixes == fixes
+
+
+@pytest.mark.parametrize("query, error", [
+    # No column close enough: the LLM retry has to fix it
+    ("SELECT Sancion FROM Dir.V_INFRACTOR", "Invalid column name 'Sancion'."),
+    ("SELECT * FROM Dir.V_USUARIOS_SISTEMA", "Invalid object name 'Dir.V_USUARIOS_SISTEMA'."),
+    # A reserved word that is not a column of the view
+    ("SELECT Multa FROM Dir.V_INFRACTOR ORDER", "Incorrect syntax near the keyword 'ORDER'."),
+    # Errors it does not handle
+    ("SELECT * FROM Dir.V_INFRACTOR", "Query timeout expired"),
+    ("", "Invalid column name 'Multa'."),
+])
+def test_no_repair(repairer, query, error):
+    assert repairer.repair(query, error) is None
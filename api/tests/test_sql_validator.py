@@ -0,0 +1,105 @@
+"""
+SQL validator: read-only SELECTs over the allowed views pass, anything else is rejected
+"""
+import pytest
+
+from database.sql_validator import SQLValidator, statement_kind, tokenize
+
+
+@pytest.fixture
+def validator():
+    return SQLValidator(allowed_schemas=["Dir"], allowed_views=["V_INFRACTOR", "V_PLANTACION"])
+
+
+@pytest.mark.parametrize("query, views", [
+    ("SELECT * FROM Dir.V_INFRACTOR", ["V_INFRACTOR"]),
+    ("select p.Titular from [Dir].[V_PLANTACION] p join Dir.V_INFRACTOR i on p.NumeroDocumento = i.NumeroDocumento;",
+     ["V_PLANTACION", "V_INFRACTOR"]),
+    # Keywords inside literals, comments and identifiers do not count
+    ("SELECT 'DROP TABLE x; DELETE' AS texto, FechaUpdate FROM Dir.V_INFRACTOR -- INSERT",
+     ["V_INFRACTOR"]),
+    ("SELECT [Update], i.[Delete] FROM Dir.V_INFRACTOR /* EXEC /* anidado */ sp */ i", ["V_INFRACTOR"]),
+    ("SELECT i.Set FROM Dir.V_INFRACTOR i", ["V_INFRACTOR"]),
+    # CTEs are resolved by name, subqueries and FROM inside functions are not objects
+    (";WITH multas (doc, total) AS (SELECT NumeroDocumento, SUM(Multa) FROM Dir.V_INFRACTOR GROUP BY NumeroDocumento) "
+     "SELECT * FROM multas WHERE total > (SELECT AVG(Multa) FROM Dir.V_INFRACTOR)", ["V_INFRACTOR"]),
+    ("SELECT TRIM(' ' FROM Titular) FROM (SELECT Titular FROM Dir.V_PLANTACION) AS t", ["V_PLANTACION"]),
+    # A CTE named like a view is the CTE when unqualified, the view when qualified
+    ("WITH V_INFRACTOR AS (SELECT Titular FROM Dir.V_PLANTACION) SELECT * FROM V_INFRACTOR", ["V_PLANTACION"]),
+    ("WITH V_USUARIOS AS (SELECT Multa FROM Dir.V_INFRACTOR) "
+     "SELECT * FROM V_USUARIOS u JOIN Dir.V_PLANTACION p ON 1 = 1", ["V_INFRACTOR", "V_PLANTACION"]),
+])
+def test_accepted(validator, query, views):
+    result = validator.validate(query)
+    assert result.valid, result.error
+    assert result.views == views
+
+
+@pytest.mark.parametrize("query, error", [
+    ("", "Empty query"),
+    ("DELETE FROM Dir.V_INFRACTOR", "dangerous operation: DELETE"),
+    ("SELECT * INTO copia FROM Dir.V_INFRACTOR", "dangerous operation: INTO"),
+    ("SELECT * FROM Dir.V_INFRACTOR; DROP TABLE Dir.V_INFRACTOR", "single statement"),
+    ("SELECT * FROM #temporal", "Temporary tables"),
+    ("WITH x AS (SELECT 1 AS a) UPDATE Dir.V_INFRACTOR SET Multa = 0", "dangerous operation: UPDATE"),
+    ("EXEC sp_who", "dangerous operation: EXEC"),
+    ("sp_who", "Only SELECT"),
+    ("SELECT * FROM sys.tables", "Schema 'sys' is not allowed"),
+    ("SELECT * FROM Dir.V_USUARIOS", "View 'Dir.V_USUARIOS' is not allowed"),
+    ("SELECT * FROM otra_bd.Dir.V_INFRACTOR", "Cross-database"),
+    ("SELECT * FROM Dir.V_INFRACTOR i JOIN servidor.bd.Dir.V_PLANTACION p ON 1 = 1", "Cross-database"),
+    ("SELECT * FROM Dir.fn_datos(1)", "Table-valued functions"),
+    ("SELECT * FROM OPENROWSET('SQLNCLI', 'x', 'SELECT 1')", "dangerous operation: OPENROWSET"),
+    ("SELECT 'sin cerrar FROM Dir.V_INFRACTOR", "Invalid SQL"),
+    ("SELECT (1 FROM Dir.V_INFRACTOR", "Invalid SQL"),
+    # One-part names resolve in the login's default schema
+    ("SELECT * FROM V_INFRACTOR", "Object 'V_INFRACTOR' must be qualified with an allowed schema (e.g. Dir.V_INFRACTOR)"),
+    ("SELECT * FROM Dir.V_INFRACTOR i JOIN sysobjects o ON 1 = 1", "Object 'sysobjects' must be qualified"),
+    # A CTE name does not make the qualified view of the same name allowed
+    ("WITH V_USUARIOS AS (SELECT Multa FROM Dir.V_INFRACTOR) SELECT * FROM Dir.V_USUARIOS",
+     "View 'Dir.V_USUARIOS' is not allowed"),
+    ("WITH V_INFRACTOR AS (SELECT 1 AS a) SELECT * FROM sys.V_INFRACTOR", "Schema 'sys' is not allowed"),
+])
+def test_rejected(validator, query, error):
+    result = validator.validate(query)
+    assert not result.valid
+    assert error in result.error
+
+
+def test_discovered_views_apply_unless_fixed_by_configuration():
+    validator = SQLValidator(allowed_schemas=["Dir"])
+    assert validator.validate("SELECT * FROM Dir.V_NUEVA").valid
+    # Before the views are known, schemas are still checked, one-part names included
+    assert not validator.validate("SELECT * FROM V_NUEVA").valid
+    assert not validator.validate("SELECT * FROM dbo.V_NUEVA").valid
+    validator.set_allowed_views(["V_INFRACTOR"])
+    assert not validator.validate("SELECT * FROM Dir.V_NUEVA").valid
+
+    fixed = SQLValidator(allowed_schemas=["Dir"], allowed_views=["V_NUEVA"])
+    fixed.set_allowed_views(["V_INFRACTOR"])
+    assert fixed.validate("SELECT * FROM Dir.V_NUEVA").valid
+
+
+def test_results_are_cached(validator):
+    query = "SELECT * FROM Dir.V_INFRACTOR"
+    assert validator.validate(query) is validator.validate(query)
+    assert validator.get_stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_tokenize():
+    assert tokenize("SELECT N'it''s' /* x /* y */ z */, [a]]b], 1.5e3 -- fin") == [
+        ("word", "SELECT"), ("string", "N'it''s'"), ("symbol", ","), ("name", "a]b"), ("symbol", ","),
+        ("number", "1.5e3"),
+    ]
+
+
+@pytest.mark.parametrize("query, kind", [
+    ("  select 1", "SELECT"),
+    (";WITH x (a) AS (SELECT 1) SELECT a FROM x", "SELECT"),
+    ("WITH x AS (SELECT 1 AS a) UPDATE Dir.T SET a = 0", "UPDATE"),
+    ("-- comentario\nEXEC sp_who", "EXEC"),
+    ("WITH x AS (SELECT 1", None),
+    ("", None),
+])
+def test_statement_kind(query, kind):
+    assert statement_kind(query) == kind
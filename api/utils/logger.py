@@ -21,7 +21,6 @@ class SerforLogger:
 
         # Track timing for performance metrics
         self.query_start_time: float = None
-        self.agent_start_times: Dict[str, float] = {}
         self.current_task_id: str = None
 
         self._write_detailed_log(f"=== SESSION STARTED: {self.session_id} ===")
@@ -88,19 +87,22 @@ class SerforLogger:
     # NEW METHODS: Agent execution logging with prompts
     # =========================================================================
 
-    def log_agent_start(self, agent_name: str, system_prompt: str, run_prompt: str):
-        """Log agent execution start with full prompts"""
-        self.agent_start_times[agent_name] = time.time()
+    def log_agent_start(self, agent_name: str, system_prompt: str, run_prompt: str) -> float:
+        """
+        Log agent execution start with full prompts.
+
+        Returns the start time; pass it to log_agent_end (the same agent may
+        run concurrently for several tasks and requests).
+        """
+        started_at = time.time()
         self._write_detailed_log(f"\n--- AGENT [{agent_name}] START ---")
         self._write_detailed_log(f"SYSTEM PROMPT:\n{system_prompt}")
         self._write_detailed_log(f"\nRUN PROMPT:\n{run_prompt}")
+        return started_at
 
-    def log_agent_end(self, agent_name: str, response: str, error: str = None):
-        """Log agent execution end with full response and timing"""
-        duration = None
-        if agent_name in self.agent_start_times:
-            duration = time.time() - self.agent_start_times[agent_name]
-            del self.agent_start_times[agent_name]
+    def log_agent_end(self, agent_name: str, response: str, error: str = None, started_at: Optional[float] = None):
+        """Log agent execution end with full response and timing (from log_agent_start's start time)"""
+        duration = time.time() - started_at if started_at is not None else None
 
         duration_str = f" ({duration:.2f}s)" if duration else ""
         status = "SUCCESS" if error is None else "ERROR"
@@ -110,6 +112,22 @@ class SerforLogger:
         if error:
             self._write_detailed_log(f"  ERROR: {error}")
 
+    def log_prompt_size(self, agent_name: str, system_tokens: int, prompt_tokens: int):
+        """Log the estimated size of the prompt sent to an agent"""
+        total = system_tokens + prompt_tokens
+        self._write_detailed_log(
+            f"PROMPT SIZE [{agent_name}]: ~{total} tokens (system: {system_tokens}, prompt: {prompt_tokens})"
+        )
+
+    def log_prompt_budget(self, stage: str, tokens: int, budget: int, dropped: List[str] = None, shrunk: List[str] = None):
+        """Log prompt trimming decisions and budget overruns"""
+        status = "OVER BUDGET" if tokens > budget else "TRIMMED"
+        self._write_detailed_log(f"PROMPT BUDGET [{stage}] {status}: ~{tokens}/{budget} tokens")
+        if dropped:
+            self._write_detailed_log(f"  DROPPED: {', '.join(dropped)}")
+        if shrunk:
+            self._write_detailed_log(f"  SHRUNK: {', '.join(shrunk)}")
+
     def log_query_complete(self, success: bool, error: str = None):
         """Log query completion with total time"""
         duration = None
@@ -46,10 +46,36 @@ api.interceptors.response.use(
   }
 );
 
+// Result sets arrive as column arrays; the components work with one object per row
+const columnsToRows = (columns: string[], values: any[][]): Record<string, any>[] => {
+  const rowCount = values.length > 0 ? values[0].length : 0;
+  const rows: Record<string, any>[] = new Array(rowCount);
+  for (let i = 0; i < rowCount; i++) {
+    const row: Record<string, any> = {};
+    for (let c = 0; c < columns.length; c++) {
+      row[columns[c]] = values[c][i];
+    }
+    rows[i] = row;
+  }
+  return rows;
+};
+
+const withRows = (response: QueryResponse): QueryResponse => {
+  response.query_results?.forEach(resultSet => {
+    if (!resultSet.data && resultSet.columns && resultSet.values) {
+      resultSet.data = columnsToRows(resultSet.columns, resultSet.values);
+    }
+  });
+  if (!response.data) {
+    response.data = response.query_results?.find(r => r.is_primary)?.data;
+  }
+  return response;
+};
+
 export const queryApi = {
   processQuery: async (request: QueryRequest): Promise<QueryResponse> => {
     const response = await api.post<QueryResponse>('/query', request);
-    return response.data;
+    return withRows(response.data);
   },
 
   healthCheck: async (): Promise<HealthResponse> => {
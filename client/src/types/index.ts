@@ -1,6 +1,7 @@
 export interface QueryRequest {
   query: string;
   include_workflow?: boolean;
+  result_format?: 'columns' | 'rows';
 }
 
 export interface SQLQuery {
@@ -18,9 +19,14 @@ export interface VisualizationData {
 
 export interface QueryResultSet {
   description: string;
-  data: Record<string, any>[];
+  columns?: string[];
+  types?: string[];
+  values?: any[][];  // One array per column (result_format "columns")
+  data: Record<string, any>[];  // Built from columns/values by the API client if not sent
   row_count: number;
   is_primary: boolean;
+  truncated?: boolean;
+  total_count?: number | null;
 }
 
 export interface QueryResponse {
@@ -52,4 +58,5 @@ export interface ViewCountsResponse {
   success: boolean;
   views: ViewCountInfo[];
   timestamp: string;
+  estimated?: boolean;
 }